@@ -0,0 +1,57 @@
+"""
+Loading a large playlist from the legacy pickle database versus the
+compact memory-mapped format.
+
+Run from the repository root with `python -m bench.dbfile`.
+"""
+import os
+import pickle
+import tempfile
+import time
+import tracemalloc
+from mpvmd.server import dbfile
+from mpvmd.server.blocklist import BlockList
+
+SIZE = 500000
+
+
+def measure(label: str, load) -> None:
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = load()
+    elapsed = time.perf_counter() - start
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert items[SIZE // 2] == make_path(SIZE // 2)
+    print('{:10} {:9.2f} ms {:9.2f} MiB'.format(
+        label, elapsed * 1000, memory / 1024 / 1024))
+
+
+def make_path(index: int) -> str:
+    return '/home/user/music/artist {0}/album {0}/{0:06} track.flac'.format(
+        index)
+
+
+def main():
+    paths = [make_path(i) for i in range(SIZE)]
+    with tempfile.TemporaryDirectory() as root:
+        legacy_path = os.path.join(root, 'legacy.dat')
+        compact_path = os.path.join(root, 'db.dat')
+        with open(legacy_path, 'wb') as handle:
+            pickle.dump({'playlist': paths}, handle)
+        dbfile.write(compact_path, paths, {})
+        del paths
+
+        def load_legacy():
+            with open(legacy_path, 'rb') as handle:
+                return BlockList(pickle.load(handle)['playlist'])
+
+        def load_compact():
+            return BlockList.lazy(dbfile.load(compact_path)[0])
+
+        measure('pickle', load_legacy)
+        measure('compact', load_compact)
+
+
+if __name__ == '__main__':
+    main()
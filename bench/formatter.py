@@ -0,0 +1,47 @@
+"""
+Per-call cost of formatter.format_templates.
+
+Run from the repository root with `python -m bench.formatter`.
+"""
+import timeit
+import parsimonious
+from mpvmd import formatter
+
+FORMAT_STR = (
+    '[[[[[%artist%|%albumartist%] - ]%title%|%name%]' +
+    '[ (%time%[/%duration%])]]|nothing played]')
+
+TEMPLATES = {
+    'artist': 'Artist',
+    'title': 'Title',
+    'time': '01:23',
+    'duration': '04:56',
+    'name': 'file.mp3',
+}
+
+
+def uncached() -> str:
+    grammar = parsimonious.Grammar(formatter.TEMPLATE_GRAMMAR)
+    ast = grammar.parse(FORMAT_STR)
+    return formatter._TemplateCompiler().visit(ast)(TEMPLATES)
+
+
+def cached() -> str:
+    return formatter.format_templates(FORMAT_STR, TEMPLATES)
+
+
+def measure(func, number: int) -> float:
+    return min(timeit.repeat(func, number=number, repeat=5)) / number
+
+
+def main():
+    assert uncached() == cached()
+    before = measure(uncached, 200)
+    after = measure(cached, 20000)
+    print('grammar rebuilt per call: {:10.2f} us'.format(before * 1e6))
+    print('compiled, cached:         {:10.2f} us'.format(after * 1e6))
+    print('speedup:                  {:10.1f}x'.format(before / after))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Request/response round-trip latency over loopback TCP and a Unix domain
+socket, using a blocking client like `mpvmc print`.
+
+Run from the repository root with `python -m bench.latency`.
+"""
+import asyncio
+import os
+import socket
+import tempfile
+import threading
+import time
+from mpvmd import transport
+
+COUNT = 5000
+RESPONSE = {'status': 'ok', 'text': 'Artist - Title (01:23/04:56)'}
+
+
+async def handler(reader, writer):
+    while await transport.read(reader):
+        await transport.write(writer, RESPONSE)
+    writer.close()
+
+
+def serve(loop: asyncio.AbstractEventLoop, started: threading.Event):
+    asyncio.set_event_loop(loop)
+    started.set()
+    loop.run_forever()
+
+
+def measure(sock: socket.socket) -> float:
+    with sock:
+        start = time.perf_counter()
+        for _ in range(COUNT):
+            transport.write_blocking(sock, {'msg': 'info-format'})
+            assert transport.read_blocking(sock) is not None
+        return (time.perf_counter() - start) / COUNT
+
+
+def main():
+    loop = asyncio.new_event_loop()
+    started = threading.Event()
+    thread = threading.Thread(target=serve, args=(loop, started))
+    thread.start()
+    started.wait()
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, 'mpvmd.sock')
+        tcp_server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(handler, '127.0.0.1', 0), loop).result()
+        asyncio.run_coroutine_threadsafe(
+            asyncio.start_unix_server(handler, path), loop).result()
+        port = tcp_server.sockets[0].getsockname()[1]
+
+        for label, sock in [
+                ('tcp', socket.create_connection(('127.0.0.1', port))),
+                ('unix', transport.connect_blocking(path, '', 0))]:
+            print('{:5} {:8.1f} us/round trip'.format(
+                label, measure(sock) * 1e6))
+
+    time.sleep(0.1)
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Latency of `mpvmc pause`, which sends the pause command batched with an
+info request, while other clients flood a running daemon with pipelined
+playlist-info requests.
+
+Start `mpvmd` first, then run from the repository root with
+`python -m bench.load`.
+"""
+import multiprocessing
+import statistics
+import time
+from mpvmd import settings, transport
+
+FLOODERS = 4
+# what mpvmc sends for a pause hotkey (run_with_info)
+PAUSE = {'msg': 'batch', 'requests': [{'msg': 'pause'}, {'msg': 'info'}]}
+WINDOW = settings.MAX_CLIENT_IN_FLIGHT
+SAMPLES = 200
+INTERVAL = 0.01
+
+
+def connect():
+    return transport.connect_blocking(
+        settings.SOCKET_PATH, settings.HOST, settings.PORT)
+
+
+def flood(stop, busy) -> None:
+    sock = connect()
+    with sock:
+        sent = 0
+        outstanding = 0
+        while not stop.is_set():
+            while outstanding < WINDOW:
+                transport.write_blocking(
+                    sock, {'msg': 'playlist-info', 'id': sent})
+                sent += 1
+                outstanding += 1
+            response = transport.read_blocking(sock)
+            if response is None:
+                break
+            outstanding -= 1
+            if response.get('code') == 'Busy':
+                with busy.get_lock():
+                    busy.value += 1
+
+
+def measure() -> list:
+    sock = connect()
+    latencies = []
+    with sock:
+        for _ in range(SAMPLES):
+            start = time.perf_counter()
+            transport.write_blocking(sock, PAUSE)
+            response = transport.read_blocking(sock)
+            assert response is not None and response['status'] == 'ok'
+            latencies.append(time.perf_counter() - start)
+            time.sleep(INTERVAL)
+    return latencies
+
+
+def report(label: str, latencies: list) -> None:
+    latencies = sorted(latencies)
+    print('{:8} p50 {:7.2f} ms  p99 {:7.2f} ms  max {:7.2f} ms'.format(
+        label,
+        statistics.median(latencies) * 1e3,
+        latencies[int(len(latencies) * 0.99)] * 1e3,
+        latencies[-1] * 1e3))
+
+
+def main():
+    report('idle', measure())
+
+    stop = multiprocessing.Event()
+    busy = multiprocessing.Value('i', 0)
+    flooders = [
+        multiprocessing.Process(target=flood, args=(stop, busy))
+        for _ in range(FLOODERS)
+    ]
+    for process in flooders:
+        process.start()
+    time.sleep(1)
+    try:
+        report('flooded', measure())
+    finally:
+        stop.set()
+        for process in flooders:
+            process.join()
+    print('{} busy errors'.format(busy.value))
+
+
+if __name__ == '__main__':
+    main()
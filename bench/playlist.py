@@ -0,0 +1,62 @@
+"""
+Positional playlist operations at 10^6 items, list vs BlockList.
+
+Run from the repository root with `python -m bench.playlist`.
+"""
+import random
+import time
+from mpvmd.server.blocklist import BlockList
+
+SIZE = 10 ** 6
+OPERATIONS = 2000
+
+
+def insert(items, rnd):
+    items.insert(rnd.randrange(len(items)), 'x')
+
+
+def delete(items, rnd):
+    del items[rnd.randrange(len(items))]
+
+
+def insert_many(items, rnd):
+    index = rnd.randrange(len(items))
+    if isinstance(items, BlockList):
+        items.insert_many(index, ['x'] * 100)
+    else:
+        items[index:index] = ['x'] * 100
+
+
+def move(items, rnd):
+    start = rnd.randrange(len(items) - 100)
+    paths = items[start:start + 100]
+    del items[start:start + 100]
+    index = rnd.randrange(len(items))
+    if isinstance(items, BlockList):
+        items.insert_many(index, paths)
+    else:
+        items[index:index] = paths
+
+
+def get(items, rnd):
+    return items[rnd.randrange(len(items))]
+
+
+def main():
+    paths = ['/music/{:07}.flac'.format(i) for i in range(SIZE)]
+    for operation in [insert, delete, insert_many, move, get]:
+        for container in [list, BlockList]:
+            items = container(paths)
+            rnd = random.Random(0)
+            start = time.perf_counter()
+            for _ in range(OPERATIONS):
+                operation(items, rnd)
+            elapsed = time.perf_counter() - start
+            print('{:12} {:10} {:8.2f} us/op'.format(
+                operation.__name__,
+                container.__name__,
+                elapsed / OPERATIONS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
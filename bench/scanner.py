@@ -0,0 +1,51 @@
+"""
+Directory scanning with and without the persistent scan cache.
+
+Run from the repository root with `python -m bench.scanner`.
+"""
+import concurrent.futures
+import os
+import tempfile
+import time
+from mpvmd import settings
+from mpvmd.server import scanner
+
+ARTISTS = 100
+ALBUMS = 10
+TRACKS = 12
+
+
+def make_tree(root: str) -> None:
+    for artist in range(ARTISTS):
+        for album in range(ALBUMS):
+            path = os.path.join(root, str(artist), str(album))
+            os.makedirs(path)
+            for track in range(TRACKS):
+                open(os.path.join(path, '{}.flac'.format(track)), 'w').close()
+            open(os.path.join(path, 'cover.jpg'), 'w').close()
+
+
+def measure(label: str, root: str, cache=None) -> None:
+    with concurrent.futures.ThreadPoolExecutor(
+            settings.SCAN_THREADS) as executor:
+        start = time.perf_counter()
+        count = sum(1 for _ in scanner.Scanner(executor, cache).walk(root))
+        elapsed = time.perf_counter() - start
+    print('{:20} {:6} files {:9.2f} ms'.format(label, count, elapsed * 1000))
+
+
+def main():
+    settings.SCAN_CACHE_MTIME_SLACK = 0
+    with tempfile.TemporaryDirectory() as root:
+        make_tree(root)
+        cache = scanner.ScanCache(os.path.join(root, 'scan.dat'))
+        measure('uncached', root)
+        measure('cold cache', root, cache)
+        cache.save()
+        cache = scanner.ScanCache(cache.path)
+        cache.load()
+        measure('warm cache', root, cache)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""
+Shuffling a 10^6 item playlist versus reseeding the lazy random order,
+and the cost of a random next/prev step afterwards.
+
+Run from the repository root with `python -m bench.shuffle`.
+"""
+import time
+from mpvmd.server.playlist import Playlist
+
+SIZE = 10 ** 6
+STEPS = 10000
+
+
+def timed(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def main():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(SIZE)]
+
+    print('shuffle  {:8.1f} ms'.format(timed(playlist.shuffle) * 1e3))
+    print('reseed   {:8.1f} ms'.format(timed(playlist.reseed) * 1e3))
+
+    playlist.random = True
+
+    def steps():
+        for _ in range(STEPS):
+            playlist.jump_next()
+        for _ in range(STEPS):
+            playlist.jump_prev()
+
+    print('next/prev {:7.2f} us/step'.format(
+        timed(steps) / (2 * STEPS) * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""
+Client start-up cost: modules imported by the fast `mpvmc print` path
+versus the full argparse/asyncio client.
+
+Run from the repository root with `python -m bench.startup`.
+"""
+import subprocess
+import sys
+import time
+
+RUNS = 20
+
+ENTRY_POINTS = [
+    ('fast', 'import mpvmd.client.fast'),
+    ('full', 'import mpvmd.client.__main__'),
+]
+
+
+def import_time(statement: str) -> int:
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True).stderr
+    total = 0
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip().startswith('mpvmd') and name.strip() == name[1:]:
+            total += int(cumulative)
+    return total
+
+
+def wall_time(statement: str) -> float:
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        subprocess.run([sys.executable, '-c', statement], check=True)
+    return (time.perf_counter() - start) / RUNS
+
+
+def main():
+    for label, statement in ENTRY_POINTS:
+        print('{:5} imports {:7.2f} ms   process {:7.2f} ms'.format(
+            label,
+            import_time(statement) / 1000,
+            wall_time(statement) * 1000))
+
+
+if __name__ == '__main__':
+    main()
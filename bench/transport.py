@@ -0,0 +1,77 @@
+"""
+Read throughput of transport framing over a loopback TCP connection.
+
+Run from the repository root with `python -m bench.transport`.
+"""
+import asyncio
+import json
+import struct
+import time
+from mpvmd import transport
+
+SIZES = [
+    ('1 KB', 1024, 2000),
+    ('1 MB', 1024 * 1024, 20),
+    ('50 MB', 50 * 1024 * 1024, 2),
+]
+
+
+async def legacy_read(reader):
+    data_size_raw = await reader.read(4)
+    if not data_size_raw:
+        return None
+    data_size = struct.unpack('<I', data_size_raw)[0]
+    data = b''
+    while len(data) < data_size:
+        chunk = await reader.read(data_size)
+        if not chunk:
+            raise ConnectionResetError()
+        data += chunk
+    return json.loads(data.decode('utf-8'))
+
+
+def make_message(size: int):
+    path = '/music/artist/album/track.flac'
+    count = max(1, size // (len(path) + 4))
+    return {'status': 'ok', 'paths': [path] * count}
+
+
+async def measure(read, message, count: int) -> float:
+    async def handler(reader, writer):
+        while await transport.read(reader):
+            await transport.write(writer, message)
+        writer.close()
+
+    server = await asyncio.start_server(handler, '127.0.0.1', 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    start = time.perf_counter()
+    for _ in range(count):
+        await transport.write(writer, {'msg': 'playlist-info'})
+        assert await read(reader) is not None
+    elapsed = time.perf_counter() - start
+    writer.close()
+    await writer.wait_closed()
+    await asyncio.sleep(0.1)
+    server.close()
+    await server.wait_closed()
+    return elapsed
+
+
+async def main():
+    for label, size, count in SIZES:
+        message = make_message(size)
+        frame_size = len(json.dumps(message))
+        for name, read in [
+                ('legacy', legacy_read),
+                ('exact-length', transport.read)]:
+            elapsed = await measure(read, message, count)
+            print('{:6} {:13} {:9.2f} ms/frame {:9.1f} MB/s'.format(
+                label,
+                name,
+                elapsed / count * 1000,
+                frame_size * count / elapsed / 1024 / 1024))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
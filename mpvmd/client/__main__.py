@@ -1,72 +1,33 @@
-import os
 import argparse
 import asyncio
 from typing import Optional, Dict, List
-from mpvmd import transport, settings, formatter
+from mpvmd import connection, settings, transport
+from mpvmd.client.fast import (
+    DEFAULT_FORMAT, ApiError, assert_status, print_info)
 
 
-class ApiError(RuntimeError):
-    def __init__(self, code: str, text: str) -> None:
-        super().__init__('API error ({}: {})'.format(code, text))
-        self.code = code
-        self.text = text
-
-
-def assert_status(response: Dict) -> None:
-    if response['status'] != 'ok':
-        raise ApiError(response['code'], response['msg'])
-
-
-def normalize_metadata(metadata: Dict) -> Dict:
-    return {
-        key.lower(): value
-        for key, value in (metadata or {}).items()
-    }
+async def show_info(conn: connection.Connection) -> None:
+    await conn.write({'msg': 'info'})
+    info = await conn.read()
+    assert_status(info)
+    print_info(info)
 
 
-async def show_info(reader, writer) -> None:
-    await transport.write(writer, {'msg': 'info'})
-    info = await transport.read(reader)
-    assert_status(info)
-    metadata = normalize_metadata(info['metadata'])
-
-    print('({}/{}) {}'.format(
-        '-' if info['playlist-pos'] is None else info['playlist-pos'],
-        info['playlist-size'] or '-',
-        info['path'] or '-'))
-    print()
-
-    if 'icy-name' in metadata:
-        print('URL:      {}'.format(metadata.get('icy-url') or '?'))
-        print('Name:     {}'.format(metadata.get('icy-name') or '?'))
-        print('Title:    {}'.format(metadata.get('icy-title') or '?'))
-    else:
-        print('Artist:   {}'.format(metadata.get('artist') or '?'))
-        print('Date:     {}'.format(metadata.get('date') or '?'))
-        print('Album:    {}'.format(metadata.get('album') or '?'))
-        if '/' in metadata.get('track', ''):
-            print('Track:    {}'.format(metadata.get('track') or '?'))
-        else:
-            print('Track:    {}/{}'.format(
-                metadata.get('track') or '?',
-                metadata.get('tracktotal') or '?'))
-        print('Title:    {}'.format(metadata.get('title') or '?'))
-    print()
-
-    print('Playback: {}'.format(
-        formatter.format_duration(info['time-pos']) or '-'))
-    print('Duration: {}'.format(
-        formatter.format_duration(info['duration']) or '-'))
-    print('Pause:    {}'.format(info['paused']))
-    print('Loop:     {}'.format(info['loop']))
-    print('Random:   {}'.format(info['random']))
-    print('Volume:   {}'.format(info['volume']))
-    print()
+async def run_with_info(conn: connection.Connection, request: Dict) -> None:
+    await conn.write({'msg': 'batch', 'requests': [request, {'msg': 'info'}]})
+    response = await conn.read()
+    assert_status(response)
+    for sub_response in response['responses']:
+        assert_status(sub_response)
+        if 'job' in sub_response:
+            print('Started job {}'.format(sub_response['job']))
+    print_info(response['responses'][-1])
 
 
 class Command:
     names: List[str] = []
     subclasses: List['Command'] = []
+    negotiate = False
 
     def __init_subclass__(cls, **kwargs):
         Command.subclasses.append(cls())
@@ -74,7 +35,7 @@ class Command:
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         pass
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         raise NotImplementedError()
 
 
@@ -84,58 +45,57 @@ class PlayCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('file', nargs='?')
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         file: Optional[str] = args.file
         request = {'msg': 'play'}
         if file:
             request['file'] = args.file
-        await transport.write(writer, request)
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        await run_with_info(conn, request)
 
 
 class PlayPauseCommand(Command):
     names = ['play-pause']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'info'})
-        info = await transport.read(reader)
-        if info['paused']:
-            await transport.write(writer, {'msg': 'play'})
-        else:
-            await transport.write(writer, {'msg': 'pause'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'play-pause'})
 
 
 class PauseCommand(Command):
     names = ['pause']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'pause'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'pause'})
 
 
 class StopCommand(Command):
     names = ['stop']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'stop'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'stop'})
 
 
 class PlaylistInfoCommand(Command):
     names = ['list']
+    negotiate = True
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        request = {'msg': 'playlist-info'}
-        await transport.write(writer, request)
-        info = await transport.read(reader)
-        assert_status(info)
-        for i, path in enumerate(info['paths']):
-            print('#{}: {}'.format(i, path))
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('-o', '--offset', type=int, default=0)
+        parser.add_argument('-n', '--limit', type=int)
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        offset: int = args.offset
+        limit: Optional[int] = args.limit
+        request = {'msg': 'playlist-info', 'stream': True, 'offset': offset}
+        if limit is not None:
+            request['limit'] = limit
+        await conn.write(request)
+        while True:
+            info = await conn.read()
+            assert_status(info)
+            for i, path in enumerate(info['paths'], info.get('offset', 0)):
+                print('#{}: {}'.format(i, path))
+            if not info.get('more'):
+                break
 
 
 class PlaylistAddCommand(Command):
@@ -144,16 +104,17 @@ class PlaylistAddCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('file', nargs='+')
         parser.add_argument('-i', '--index', type=int)
+        parser.add_argument('-w', '--wait', action='store_true')
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         files: List[str] = args.file
         index: Optional[int] = args.index
         request = {'msg': 'playlist-add', 'files': files}
         if index is not None:
             request['index'] = index
-        await transport.write(writer, request)
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        if args.wait:
+            request['wait'] = True
+        await run_with_info(conn, request)
 
 
 class PlaylistDeleteCommand(Command):
@@ -162,39 +123,47 @@ class PlaylistDeleteCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('index', type=int)
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         index: int = args.index
-        await transport.write(
-            writer, {'msg': 'playlist-remove', 'index': index})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        await run_with_info(conn, {'msg': 'playlist-remove', 'index': index})
+
+
+class PlaylistMoveCommand(Command):
+    names = ['move']
+
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('start', type=int)
+        parser.add_argument('end', type=int)
+        parser.add_argument('index', type=int)
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {
+            'msg': 'playlist-move',
+            'start': args.start,
+            'end': args.end,
+            'index': args.index,
+        })
 
 
 class PlaylistClearCommand(Command):
     names = ['clear']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'playlist-clear'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'playlist-clear'})
 
 
 class PlaylistPrevCommand(Command):
     names = ['prev']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'playlist-prev'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'playlist-prev'})
 
 
 class PlaylistNextCommand(Command):
     names = ['next']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'playlist-next'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'playlist-next'})
 
 
 class PlaylistJumpCommand(Command):
@@ -203,44 +172,30 @@ class PlaylistJumpCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('index', type=int)
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         index: int = args.index
-        await transport.write(writer, {'msg': 'playlist-jump', 'index': index})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        await run_with_info(conn, {'msg': 'playlist-jump', 'index': index})
 
 
 class PlaylistShuffleCommand(Command):
     names = ['shuffle']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'playlist-shuffle'})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'reseed'})
 
 
 class ToggleRandomCommand(Command):
     names = ['toggle-random']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'info'})
-        info = await transport.read(reader)
-        await transport.write(
-            writer, {'msg': 'random', 'random': not info['random']})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'random'})
 
 
 class ToggleLoopCommand(Command):
     names = ['toggle-loop']
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        await transport.write(writer, {'msg': 'info'})
-        info = await transport.read(reader)
-        await transport.write(
-            writer, {'msg': 'loop', 'loop': not info['loop']})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await run_with_info(conn, {'msg': 'loop'})
 
 
 class SeekCommand(Command):
@@ -249,11 +204,9 @@ class SeekCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument('where', type=str)
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         where: str = args.where
-        await transport.write(writer, {'msg': 'seek', 'where': where})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        await run_with_info(conn, {'msg': 'seek', 'where': where})
 
 
 class SetVolumeCommand(Command):
@@ -269,11 +222,73 @@ class SetVolumeCommand(Command):
 
         parser.add_argument('volume', type=check_volume)
 
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
+    async def run(self, args: argparse.Namespace, conn) -> None:
         volume: float = args.volume
-        await transport.write(writer, {'msg': 'volume', 'volume': volume})
-        assert_status(await transport.read(reader))
-        await show_info(reader, writer)
+        await run_with_info(conn, {'msg': 'volume', 'volume': volume})
+
+
+class ScanCacheCommand(Command):
+    names = ['cache']
+
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('action', choices=['clear', 'rebuild'])
+        parser.add_argument('path', nargs='*')
+        parser.add_argument('-w', '--wait', action='store_true')
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        action: str = args.action
+        paths: List[str] = args.path
+        request = {'msg': 'scan-cache-' + action}
+        if paths:
+            request['paths'] = paths
+        if args.wait:
+            request['wait'] = True
+        await conn.write(request)
+        response = await conn.read()
+        assert_status(response)
+        if action == 'clear':
+            print('Invalidated {} directories'.format(
+                response['invalidated']))
+        elif 'job' in response:
+            print('Started job {}'.format(response['job']))
+        else:
+            print('Scanned {} files'.format(response['scanned']))
+
+
+def format_job(job: Dict) -> str:
+    details = dict(job['progress'])
+    if job['result']:
+        details.update(job['result'])
+    if job['error']:
+        details['error'] = job['error']
+    return '{:>4} {:<10} {} ({}){}'.format(
+        job['id'],
+        job['state'],
+        job['name'],
+        job['description'],
+        ''.join(
+            ' {}={}'.format(key, value)
+            for key, value in sorted(details.items())))
+
+
+class JobsCommand(Command):
+    names = ['jobs']
+
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument('-c', '--cancel', type=int, metavar='JOB')
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        if args.cancel is not None:
+            await conn.write({'msg': 'job-cancel', 'job': args.cancel})
+            response = await conn.read()
+            assert_status(response)
+            print(format_job(response['job']))
+            return
+        await conn.write({'msg': 'job-status'})
+        response = await conn.read()
+        assert_status(response)
+        for job in response['jobs']:
+            print(format_job(job))
 
 
 class PrintCommand(Command):
@@ -282,67 +297,123 @@ class PrintCommand(Command):
     def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
         parser.add_argument(
             '-f', '--format',
-            default=
-            '[[[[[%artist%|%albumartist%] - ]%title%|%name%]' +
-            '[ (%time%[/%duration%])]]|nothing played]')
-
-    async def run(self, args: argparse.Namespace, reader, writer) -> None:
-        format_str: str = args.format
-        await transport.write(writer, {'msg': 'info'})
-        info = await transport.read(reader)
-        metadata = normalize_metadata(info['metadata'])
-
-        templates = {
-            'title': metadata.get('title') or metadata.get('icy-title'),
-            'date': metadata.get('date'),
-            'artist': metadata.get('artist'),
-            'album': metadata.get('album'),
-            'albumartist': metadata.get('albumartist'),
-            'composer': metadata.get('composer'),
-            'performer': metadata.get('performer'),
-            'genre': metadata.get('genre'),
-            'disc': metadata.get('disc'),
-            'disctotal': metadata.get('disctotal'),
-            'track': metadata.get('track'),
-            'tracktotal': metadata.get('tracktotal'),
-            'comment': metadata.get('comment'),
-            'time': formatter.format_duration(info['time-pos']),
-            'duration': formatter.format_duration(info['duration']),
-            'file': info['path'],
-            'name': os.path.basename(info['path']) if info['path'] else None,
-        }
-
-        print(formatter.format_templates(format_str, templates))
+            default=DEFAULT_FORMAT)
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        await conn.write({'msg': 'info-format', 'format': args.format})
+        response = await conn.read()
+        assert_status(response)
+        print(response['text'])
+
+
+EVENTS = [
+    'track',
+    'pause',
+    'volume',
+    'random',
+    'loop',
+    'playlist',
+    'time-pos',
+    'scan',
+    'job',
+]
+
+
+def format_event(event: Dict) -> str:
+    return '{}: {}'.format(event['event'], ', '.join(
+        '{}={}'.format(key, value)
+        for key, value in sorted(event.items())
+        if key != 'event'))
+
+
+async def subscribe(conn: connection.Connection, events: List[str]) -> None:
+    request = {'msg': 'subscribe'}
+    if events:
+        request['events'] = events
+    await conn.write(request)
+    assert_status(await conn.read())
+
+
+class WatchCommand(Command):
+    names = ['watch']
+    negotiate = True
+
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            '-e', '--event', action='append', choices=EVENTS, default=[])
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        events: List[str] = args.event
+        await subscribe(conn, events)
+        while True:
+            event = await conn.read()
+            if not event:
+                break
+            print(format_event(event), flush=True)
+
+
+class IdleCommand(Command):
+    names = ['idle']
+
+    def decorate_arg_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            '-e', '--event', action='append', choices=EVENTS, default=[])
+
+    async def run(self, args: argparse.Namespace, conn) -> None:
+        events: List[str] = args.event
+        await subscribe(conn, events)
+        event = await conn.read()
+        if event:
+            print(event['event'])
 
 
 def parse_args() -> Optional[argparse.Namespace]:
     parser = argparse.ArgumentParser(description='MPV music daemon client')
-    parser.set_defaults(run=None)
-    parser.add_argument('--host', default=settings.HOST)
-    parser.add_argument('-p', '--port', type=int, default=settings.PORT)
+    parser.set_defaults(run=None, negotiate=False)
+    parser.add_argument('--host')
+    parser.add_argument('-p', '--port', type=int)
+    parser.add_argument('--socket', default=settings.SOCKET_PATH)
+    parser.add_argument('--codec', choices=sorted(transport.CODECS))
     subparsers = parser.add_subparsers(help='choose the command', dest='cmd')
     for command in Command.subclasses:
         subparser = subparsers.add_parser(
             command.names[0],
             aliases=command.names[1:])
         command.decorate_arg_parser(subparser)
-        subparser.set_defaults(run=command.run)
+        subparser.set_defaults(run=command.run, negotiate=command.negotiate)
     return parser.parse_args()
 
 
+async def connect(
+        socket_path: Optional[str],
+        host: Optional[str],
+        port: Optional[int]) -> connection.Connection:
+    if socket_path and host is None and port is None:
+        try:
+            return connection.Connection(
+                *await asyncio.open_unix_connection(socket_path))
+        except (OSError, AttributeError):
+            pass
+    return connection.Connection(*await asyncio.open_connection(
+        host or settings.HOST, port or settings.PORT))
+
+
 async def run(loop):
     args = parse_args()
-    host: str = args.host
-    port: int = args.port
-    reader, writer = await asyncio.open_connection(host, port, loop=loop)
-    if args.run:
-        try:
-            await args.run(args, reader, writer)
-        except ApiError as error:
-            print(error.text)
-    else:
-        await show_info(reader, writer)
-    writer.close()
+    conn = await connect(args.socket, args.host, args.port)
+    try:
+        if args.negotiate or args.codec:
+            response = await conn.negotiate(
+                [args.codec] if args.codec else None)
+            if response and response.get('code') == 'Busy':
+                assert_status(response)
+        if args.run:
+            await args.run(args, conn)
+        else:
+            await show_info(conn)
+    except ApiError as error:
+        print(error.text)
+    conn.close()
 
 
 def main():
@@ -0,0 +1,101 @@
+import sys
+from typing import Dict, List, Optional
+from mpvmd import settings, transport
+
+
+DEFAULT_FORMAT = (
+    '[[[[[%artist%|%albumartist%] - ]%title%|%name%]' +
+    '[ (%time%[/%duration%])]]|nothing played]')
+
+
+class ApiError(RuntimeError):
+    def __init__(self, code: str, text: str) -> None:
+        super().__init__('API error ({}: {})'.format(code, text))
+        self.code = code
+        self.text = text
+
+
+def assert_status(response: Dict) -> None:
+    if response['status'] != 'ok':
+        raise ApiError(response['code'], response['msg'])
+
+
+def print_info(info: Dict) -> None:
+    from mpvmd import formatter
+
+    metadata = formatter.normalize_metadata(info['metadata'])
+
+    print('({}/{}) {}'.format(
+        '-' if info['playlist-pos'] is None else info['playlist-pos'],
+        info['playlist-size'] or '-',
+        info['path'] or '-'))
+    print()
+
+    if 'icy-name' in metadata:
+        print('URL:      {}'.format(metadata.get('icy-url') or '?'))
+        print('Name:     {}'.format(metadata.get('icy-name') or '?'))
+        print('Title:    {}'.format(metadata.get('icy-title') or '?'))
+    else:
+        print('Artist:   {}'.format(metadata.get('artist') or '?'))
+        print('Date:     {}'.format(metadata.get('date') or '?'))
+        print('Album:    {}'.format(metadata.get('album') or '?'))
+        if '/' in metadata.get('track', ''):
+            print('Track:    {}'.format(metadata.get('track') or '?'))
+        else:
+            print('Track:    {}/{}'.format(
+                metadata.get('track') or '?',
+                metadata.get('tracktotal') or '?'))
+        print('Title:    {}'.format(metadata.get('title') or '?'))
+    print()
+
+    print('Playback: {}'.format(
+        formatter.format_duration(info['time-pos']) or '-'))
+    print('Duration: {}'.format(
+        formatter.format_duration(info['duration']) or '-'))
+    print('Pause:    {}'.format(info['paused']))
+    print('Loop:     {}'.format(info['loop']))
+    print('Random:   {}'.format(info['random']))
+    print('Volume:   {}'.format(info['volume']))
+    print()
+
+
+def parse_fast_args(args: List[str]) -> Optional[Dict]:
+    if not args:
+        return {'msg': 'info'}
+    if args[0] != 'print':
+        return None
+    if len(args) == 1:
+        format_str = DEFAULT_FORMAT
+    elif len(args) == 3 and args[1] in ('-f', '--format'):
+        format_str = args[2]
+    elif len(args) == 2 and args[1].startswith('--format='):
+        format_str = args[1][len('--format='):]
+    else:
+        return None
+    return {'msg': 'info-format', 'format': format_str}
+
+
+def run_fast(request: Dict) -> None:
+    with transport.connect_blocking(
+            settings.SOCKET_PATH, settings.HOST, settings.PORT) as sock:
+        transport.write_blocking(sock, request)
+        response = transport.read_blocking(sock)
+    if response is None:
+        raise ConnectionResetError()
+    assert_status(response)
+    if request['msg'] == 'info':
+        print_info(response)
+    else:
+        print(response['text'])
+
+
+def main():
+    request = parse_fast_args(sys.argv[1:])
+    if request is None:
+        from mpvmd.client import __main__
+        __main__.main()
+        return
+    try:
+        run_fast(request)
+    except ApiError as error:
+        print(error.text)
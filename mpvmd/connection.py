@@ -0,0 +1,37 @@
+import asyncio
+from typing import Dict, List, Optional
+from mpvmd import transport
+
+
+class Connection:
+    def __init__(self, reader, writer) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.codec: transport.Codec = transport.JSON
+        self._drain_lock = asyncio.Lock()
+
+    async def read(self) -> Optional[Dict]:
+        return await transport.read(self.reader, codec=self.codec)
+
+    async def write(self, message: Dict) -> None:
+        await self.write_frame(transport.encode_frame(message, self.codec))
+
+    async def write_frame(self, frame: bytes) -> None:
+        self.writer.write(frame)
+        async with self._drain_lock:
+            await self.writer.drain()
+
+    async def negotiate(
+            self, codecs: Optional[List[str]] = None) -> Optional[Dict]:
+        await self.write({
+            'msg': 'hello',
+            'codecs': codecs or transport.PREFERRED_CODECS,
+        })
+        response = await self.read()
+        if response and response['status'] == 'ok':
+            self.codec = transport.CODECS.get(
+                response['codec'], transport.JSON)
+        return response
+
+    def close(self) -> None:
+        self.writer.close()
@@ -1,6 +1,7 @@
-from enum import Enum
-from typing import Optional, Tuple, Dict
-import parsimonious
+import functools
+import os
+from typing import (
+    Any, Callable, FrozenSet, List, Optional, Set, Tuple, Dict)
 
 
 class SeekMode:
@@ -23,65 +24,175 @@ def flatten(items):
     ]
 
 
-def format_templates(format_str: str, templates: Dict[str, str]) -> str:
-    grammar = r'''
-        expression  = (token/alternative)*
-        token       = group/raw_text/variable
-        group       = group_start (alternative/token)* group_end
-        alternative = token("|"token)+
-        raw_text    = word
-        variable    = "%"word"%"
-
-        word        = ~"[^%\[\]\|]+"i
-        group_start = "["
-        group_end   = "]"
-    '''
-
-    class EntryParser(parsimonious.nodes.NodeVisitor):
-        def __init__(self, templates):
-            self.templates = templates
-
-        def visit_expression(self, _node, visited_children):
-            flattened = flatten(visited_children)
+TEMPLATE_GRAMMAR = r'''
+    expression  = (token/alternative)*
+    token       = group/raw_text/variable
+    group       = group_start (alternative/token)* group_end
+    alternative = token ("|" token)+
+    raw_text    = word
+    variable    = "%" word "%"
+
+    word        = ~"[^%\[\]\|]+"i
+    group_start = "["
+    group_end   = "]"
+'''
+
+TEMPLATE_CACHE_SIZE = 256
+
+Template = Callable[[Dict[str, Optional[str]]], str]
+
+
+TEMPLATE_METADATA: Dict[str, Tuple[str, ...]] = {
+    'title': ('title', 'icy-title'),
+    'date': ('date',),
+    'artist': ('artist',),
+    'album': ('album',),
+    'albumartist': ('albumartist',),
+    'composer': ('composer',),
+    'performer': ('performer',),
+    'genre': ('genre',),
+    'disc': ('disc',),
+    'disctotal': ('disctotal',),
+    'track': ('track',),
+    'tracktotal': ('tracktotal',),
+    'comment': ('comment',),
+}
+
+TEMPLATE_FIELDS: Dict[str, str] = {
+    'time': 'time-pos',
+    'duration': 'duration',
+    'file': 'path',
+    'name': 'path',
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _template_grammar():
+    import parsimonious
+    return parsimonious.Grammar(TEMPLATE_GRAMMAR)
+
+
+class _TemplateCompiler:
+    def __init__(self) -> None:
+        self.variables: Set[str] = set()
+
+    def visit(self, node):
+        method = getattr(
+            self, 'visit_' + node.expr_name, self.generic_visit)
+        return method(node, [self.visit(child) for child in node])
+
+    def visit_expression(self, _node, visited_children) -> Template:
+        children = flatten(visited_children)
+
+        def render(templates):
             return ''.join(
-                child
-                for child in flattened
-                if child)
-
-        def visit_group(self, _node, visited_children):
-            flattened = flatten(visited_children)
-            return (
-                ''.join(flattened)
-                if all(flattened)
-                else '')
-
-        def visit_alternative(self, _node, visited_children):
-            flattened = flatten(visited_children)
-            for child in flattened:
-                if child:
-                    return child
+                value
+                for value in (child(templates) for child in children)
+                if value)
+
+        return render
+
+    def visit_group(self, _node, visited_children) -> Template:
+        children = flatten(visited_children)
+
+        def render(templates):
+            values = [child(templates) for child in children]
+            return ''.join(values) if all(values) else ''
+
+        return render
+
+    def visit_alternative(self, _node, visited_children) -> Template:
+        children = flatten(visited_children)
+
+        def render(templates):
+            for child in children:
+                value = child(templates)
+                if value:
+                    return value
             return ''
 
-        def visit_variable(self, node, _visited_children):
-            var_name = node.children[1].text
-            return self.templates.get(var_name, '')
+        return render
+
+    def visit_variable(self, node, _visited_children) -> Template:
+        var_name = node.children[1].text
+        self.variables.add(var_name)
+        return lambda templates: templates.get(var_name, '')
 
-        def visit_raw_text(self, node, _visited_children):
-            return node.text
+    def visit_raw_text(self, node, _visited_children) -> Template:
+        text = node.text
+        return lambda _templates: text
 
-        def visit_word(self, node, _visited_children):
-            return node.text
+    visit_word = visit_raw_text
 
-        def generic_visit(self, _node, visited_children):
-            return visited_children
+    def generic_visit(self, _node, visited_children):
+        return visited_children
 
+
+@functools.lru_cache(maxsize=TEMPLATE_CACHE_SIZE)
+def _compile(format_str: str) -> Tuple[Template, FrozenSet[str]]:
+    import parsimonious
     try:
-        ast = parsimonious.Grammar(grammar).parse(format_str)
-        return EntryParser(templates).visit(ast)
+        ast = _template_grammar().parse(format_str)
     except (
             parsimonious.exceptions.ParseError,
             parsimonious.exceptions.IncompleteParseError):
         raise FormatError('Bad format string')
+    compiler = _TemplateCompiler()
+    return compiler.visit(ast), frozenset(compiler.variables)
+
+
+def compile_template(format_str: str) -> Template:
+    return _compile(format_str)[0]
+
+
+def template_variables(format_str: str) -> FrozenSet[str]:
+    return _compile(format_str)[1]
+
+
+def normalize_metadata(metadata: Optional[Dict]) -> Dict:
+    return {
+        key.lower(): value
+        for key, value in (metadata or {}).items()
+    }
+
+
+def info_projection(format_str: str) -> Tuple[List[str], List[str]]:
+    variables = template_variables(format_str)
+    fields = {
+        TEMPLATE_FIELDS[name]
+        for name in variables
+        if name in TEMPLATE_FIELDS
+    }
+    metadata_keys = {
+        key
+        for name in variables
+        for key in TEMPLATE_METADATA.get(name, ())
+    }
+    if metadata_keys:
+        fields.add('metadata')
+    return sorted(fields), sorted(metadata_keys)
+
+
+def build_templates(info: Dict[str, Any]) -> Dict[str, Optional[str]]:
+    metadata = normalize_metadata(info.get('metadata'))
+    templates: Dict[str, Optional[str]] = {}
+    for name, keys in TEMPLATE_METADATA.items():
+        value = None
+        for key in keys:
+            value = value or metadata.get(key)
+        templates[name] = value
+    path = info.get('path')
+    templates.update({
+        'time': format_duration(info.get('time-pos')),
+        'duration': format_duration(info.get('duration')),
+        'file': path,
+        'name': os.path.basename(path) if path else None,
+    })
+    return templates
+
+
+def format_templates(format_str: str, templates: Dict[str, str]) -> str:
+    return compile_template(format_str)(templates)
 
 
 def format_duration(seconds: Optional[float]) -> Optional[str]:
@@ -97,70 +208,63 @@ def format_duration(seconds: Optional[float]) -> Optional[str]:
     return '{:02}:{:02}'.format(minutes, seconds)
 
 
+def _scan_integer(text: str, pos: int) -> int:
+    end = pos
+    while end < len(text) and '0' <= text[end] <= '9':
+        end += 1
+    if end == pos:
+        raise FormatError('Bad format string')
+    return end
+
+
 def parse_seek(seek_str: str) -> Tuple[int, SeekMode]:
-    grammar = r'''
-        seek_mode  = sign? (time/fraction/integer) percent?
-        time       = integer colon (integer colon)? (fraction/integer)
-
-        fraction   = integer point integer
-        integer    = ~"[0-9]+"
-        sign       = "+"/"-"
-        point      = "."
-        percent    = "%"
-        colon      = ":"
-    '''
-
-    class EntryParser(parsimonious.nodes.NodeVisitor):
-        def __init__(self):
-            self.mode = None
-            self.value = None
-
-        def visit_seek_mode(self, node, visited_children):
-            is_relative = False
-            is_percent = False
-            multiplier = 1
-            if visited_children[0]:
-                is_relative = True
-                multiplier = visited_children[0][0]
-            value = visited_children[1][0]
-            if visited_children[2]:
-                is_percent = True
-            mode = {
-                (False, False): SeekMode.ABSOLUTE,
-                (True, False): SeekMode.RELATIVE,
-                (False, True): SeekMode.ABSOLUTE_PERCENT,
-                (True, True): SeekMode.RELATIVE_PERCENT,
-            }[is_relative, is_percent]
-            if is_percent and value > 100:
-                raise FormatError('Invalid percentage value')
-            return (value * multiplier, mode)
-
-        def visit_integer(self, node, visited_children):
-            return int(node.text)
-
-        def visit_fraction(self, node, visited_children):
-            return float(node.text)
-
-        def visit_time(self, node, visited_children):
-            parts = node.text.split(':')
-            ret = 0
-            for part in parts:
-                ret *= 60
-                ret += float(part)
-            return ret
-
-        def visit_sign(self, node, visited_children):
-            return int(node.text + '1')
-
-        def generic_visit(self, _node, visited_children):
-            return visited_children
+    pos = 0
+    multiplier = 1
+    is_relative = False
+    if seek_str[:1] in ('+', '-'):
+        is_relative = True
+        multiplier = -1 if seek_str[0] == '-' else 1
+        pos += 1
 
-    try:
-        ast = parsimonious.Grammar(grammar).parse(seek_str)
-        return EntryParser().visit(ast)
-    except parsimonious.VisitationError as error:
-        raise FormatError(str(error))
-    except (
-            parsimonious.exceptions.ParseError,
-            parsimonious.exceptions.IncompleteParseError):
+    parts = []
+    while True:
+        end = _scan_integer(seek_str, pos)
+        parts.append(seek_str[pos:end])
+        pos = end
+        if len(parts) == 3 or seek_str[pos:pos + 1] != ':':
+            break
+        pos += 1
+
+    fraction = None
+    if seek_str[pos:pos + 1] == '.':
+        end = _scan_integer(seek_str, pos + 1)
+        fraction = seek_str[pos:end]
+        pos = end
+
+    is_percent = seek_str[pos:pos + 1] == '%'
+    if is_percent:
+        pos += 1
+    if pos != len(seek_str):
         raise FormatError('Bad format string')
+
+    if fraction is not None:
+        parts[-1] += fraction
+    if len(parts) > 1:
+        value = 0.0
+        for part in parts:
+            value *= 60
+            value += float(part)
+    elif fraction is not None:
+        value = float(parts[0])
+    else:
+        value = int(parts[0])
+
+    if is_percent and value > 100:
+        raise FormatError('Invalid percentage value')
+    mode = {
+        (False, False): SeekMode.ABSOLUTE,
+        (True, False): SeekMode.RELATIVE,
+        (False, True): SeekMode.ABSOLUTE_PERCENT,
+        (True, True): SeekMode.RELATIVE_PERCENT,
+    }[is_relative, is_percent]
+    return (value * multiplier, mode)
@@ -0,0 +1,201 @@
+import struct
+from typing import Any, Callable, Dict, List
+
+
+_UINT8 = struct.Struct('>B')
+_UINT16 = struct.Struct('>H')
+_UINT32 = struct.Struct('>I')
+_UINT64 = struct.Struct('>Q')
+_INT8 = struct.Struct('>b')
+_INT16 = struct.Struct('>h')
+_INT32 = struct.Struct('>i')
+_INT64 = struct.Struct('>q')
+_FLOAT32 = struct.Struct('>f')
+_FLOAT64 = struct.Struct('>d')
+
+
+class UnpackError(ValueError):
+    pass
+
+
+def _pack_int(value: int, out: bytearray) -> None:
+    if 0 <= value < 0x80:
+        out.append(value)
+    elif -0x20 <= value < 0:
+        out.append(value & 0xff)
+    elif value >= 0:
+        if value <= 0xff:
+            out.append(0xcc)
+            out += _UINT8.pack(value)
+        elif value <= 0xffff:
+            out.append(0xcd)
+            out += _UINT16.pack(value)
+        elif value <= 0xffffffff:
+            out.append(0xce)
+            out += _UINT32.pack(value)
+        elif value <= 0xffffffffffffffff:
+            out.append(0xcf)
+            out += _UINT64.pack(value)
+        else:
+            raise TypeError('Integer out of range')
+    else:
+        if value >= -0x80:
+            out.append(0xd0)
+            out += _INT8.pack(value)
+        elif value >= -0x8000:
+            out.append(0xd1)
+            out += _INT16.pack(value)
+        elif value >= -0x80000000:
+            out.append(0xd2)
+            out += _INT32.pack(value)
+        elif value >= -0x8000000000000000:
+            out.append(0xd3)
+            out += _INT64.pack(value)
+        else:
+            raise TypeError('Integer out of range')
+
+
+def _pack_str(value: bytes, out: bytearray) -> None:
+    size = len(value)
+    if size < 0x20:
+        out.append(0xa0 | size)
+    elif size <= 0xff:
+        out.append(0xd9)
+        out += _UINT8.pack(size)
+    elif size <= 0xffff:
+        out.append(0xda)
+        out += _UINT16.pack(size)
+    else:
+        out.append(0xdb)
+        out += _UINT32.pack(size)
+    out += value
+
+
+def _pack_container_header(
+        size: int, fix: int, marker16: int, out: bytearray) -> None:
+    if size < 0x10:
+        out.append(fix | size)
+    elif size <= 0xffff:
+        out.append(marker16)
+        out += _UINT16.pack(size)
+    else:
+        out.append(marker16 + 1)
+        out += _UINT32.pack(size)
+
+
+def _pack(obj: Any, out: bytearray) -> None:
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        _pack_int(obj, out)
+    elif isinstance(obj, float):
+        out.append(0xcb)
+        out += _FLOAT64.pack(obj)
+    elif isinstance(obj, str):
+        _pack_str(obj.encode('utf-8', 'surrogateescape'), out)
+    elif isinstance(obj, bytes):
+        _pack_str(obj, out)
+    elif isinstance(obj, (list, tuple)):
+        _pack_container_header(len(obj), 0x90, 0xdc, out)
+        for item in obj:
+            _pack(item, out)
+    elif isinstance(obj, dict):
+        _pack_container_header(len(obj), 0x80, 0xde, out)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    else:
+        raise TypeError('Type not serializable')
+
+
+def pack(obj: Any) -> bytes:
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+class _Unpacker:
+    def __init__(self, data) -> None:
+        self.data = memoryview(data)
+        self.pos = 0
+
+    def _take(self, size: int) -> memoryview:
+        end = self.pos + size
+        if end > len(self.data):
+            raise UnpackError('Truncated data')
+        ret = self.data[self.pos:end]
+        self.pos = end
+        return ret
+
+    def _unpack_struct(self, fmt: struct.Struct) -> Any:
+        return fmt.unpack(self._take(fmt.size))[0]
+
+    def _unpack_str(self, size: int) -> str:
+        return str(self._take(size), 'utf-8', 'surrogateescape')
+
+    def _unpack_array(self, size: int) -> List:
+        return [self.unpack() for _ in range(size)]
+
+    def _unpack_map(self, size: int) -> Dict:
+        ret = {}
+        for _ in range(size):
+            key = self.unpack()
+            ret[key] = self.unpack()
+        return ret
+
+    def unpack(self) -> Any:
+        marker = self._take(1)[0]
+        if marker < 0x80:
+            return marker
+        if marker >= 0xe0:
+            return marker - 0x100
+        if marker < 0x90:
+            return self._unpack_map(marker & 0x0f)
+        if marker < 0xa0:
+            return self._unpack_array(marker & 0x0f)
+        if marker < 0xc0:
+            return self._unpack_str(marker & 0x1f)
+        try:
+            handler = _HANDLERS[marker]
+        except KeyError:
+            raise UnpackError('Unsupported type 0x{:02x}'.format(marker))
+        return handler(self)
+
+
+_HANDLERS: Dict[int, Callable[[_Unpacker], Any]] = {
+    0xc0: lambda _unpacker: None,
+    0xc2: lambda _unpacker: False,
+    0xc3: lambda _unpacker: True,
+    0xc4: lambda u: bytes(u._take(u._unpack_struct(_UINT8))),
+    0xc5: lambda u: bytes(u._take(u._unpack_struct(_UINT16))),
+    0xc6: lambda u: bytes(u._take(u._unpack_struct(_UINT32))),
+    0xca: lambda u: u._unpack_struct(_FLOAT32),
+    0xcb: lambda u: u._unpack_struct(_FLOAT64),
+    0xcc: lambda u: u._unpack_struct(_UINT8),
+    0xcd: lambda u: u._unpack_struct(_UINT16),
+    0xce: lambda u: u._unpack_struct(_UINT32),
+    0xcf: lambda u: u._unpack_struct(_UINT64),
+    0xd0: lambda u: u._unpack_struct(_INT8),
+    0xd1: lambda u: u._unpack_struct(_INT16),
+    0xd2: lambda u: u._unpack_struct(_INT32),
+    0xd3: lambda u: u._unpack_struct(_INT64),
+    0xd9: lambda u: u._unpack_str(u._unpack_struct(_UINT8)),
+    0xda: lambda u: u._unpack_str(u._unpack_struct(_UINT16)),
+    0xdb: lambda u: u._unpack_str(u._unpack_struct(_UINT32)),
+    0xdc: lambda u: u._unpack_array(u._unpack_struct(_UINT16)),
+    0xdd: lambda u: u._unpack_array(u._unpack_struct(_UINT32)),
+    0xde: lambda u: u._unpack_map(u._unpack_struct(_UINT16)),
+    0xdf: lambda u: u._unpack_map(u._unpack_struct(_UINT32)),
+}
+
+
+def unpack(data) -> Any:
+    unpacker = _Unpacker(data)
+    ret = unpacker.unpack()
+    if unpacker.pos != len(unpacker.data):
+        raise UnpackError('Trailing data')
+    return ret
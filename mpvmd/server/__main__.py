@@ -1,12 +1,22 @@
 import os
 import argparse
+import array
 import asyncio
+import concurrent.futures
 import logging
 import pickle
-from typing import Dict, Generator, List, Optional
-import mpv
-from mpvmd import transport, settings, formatter
-from mpvmd.server.playlist import Playlist
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from mpvmd import connection, transport, settings, formatter
+from mpvmd.server import (
+    dbfile, events, jobs, journal, player, scanner, scheduler, streaming)
+from mpvmd.server.blocklist import BlockList
+from mpvmd.server.playlist import InsertionPoint, Playlist
+
+try:
+    import mpv
+except ImportError:
+    # only the mpv worker needs libmpv; _create_mpv reports it missing
+    mpv = None
 
 
 MPV_END_FILE_REASON_EOF = 0
@@ -14,127 +24,217 @@ MPV_END_FILE_REASON_STOP = 2
 MPV_END_FILE_REASON_QUIT = 3
 MPV_END_FILE_REASON_ERROR = 4
 
+OBSERVED_PROPERTIES = (
+    'path', 'pause', 'volume', 'time-pos', 'duration', 'metadata')
+
+
+def _is_empty_event(event) -> bool:
+    return event.id == mpv.Events.none
+
 
 class State:
-    def __init__(self):
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            scan_cache: Optional[scanner.ScanCache] = None):
+        self._loop = loop
+        self.scan_cache = scan_cache or scanner.ScanCache()
+        self.events = events.EventBus(loop)
+        self._last_time_pos: Optional[int] = None
+        self.journal: Optional[journal.Journal] = None
+        self._waiters: Dict[str, List[asyncio.Future]] = {}
+        self.properties: Dict[str, Any] = dict.fromkeys(OBSERVED_PROPERTIES)
+        self._time_pos_updated = loop.time()
+        self.version = 0
+        self.info_cache: Dict[Tuple, Tuple[int, bytes]] = {}
         self.playlist = Playlist()
-        self._mpv = mpv.Context(ytdl=True)
-        self._mpv.set_option('video', 'no')
-        self._mpv.set_option('pause', True)
-        self._mpv.initialize()
-        self._mpv.set_wakeup_callback(self._event_cb)
-
-    @property
-    def path(self) -> Optional[str]:
+        self.playlist.listeners.append(self._playlist_changed)
+        self.scan_executor = concurrent.futures.ThreadPoolExecutor(
+            settings.SCAN_THREADS)
+        self.jobs = jobs.JobManager()
+        self.scheduler = scheduler.Scheduler()
+        self.jobs.listeners.append(self._job_changed)
+        self._player = player.Player(
+            loop, self._create_mpv, self._event_cb, _is_empty_event)
+        self._player.start()
+
+    def _create_mpv(self) -> Any:
+        if mpv is None:
+            raise ImportError('mpvmd needs pympv and libmpv to play audio')
+        ctx = mpv.Context(ytdl=True)
+        ctx.set_option('video', 'no')
+        ctx.set_option('pause', True)
+        ctx.initialize()
+        for name in OBSERVED_PROPERTIES:
+            ctx.observe_property(name)
+        return ctx
+
+    def close(self) -> None:
+        self._player.stop()
+
+    async def get_property(self, name: str) -> Any:
         try:
-            return self._mpv.get_property('path')
+            return await self._player.call('get_property', name)
         except mpv.MPVError:
             return None
 
-    @property
-    def time_pos(self) -> Optional[int]:
+    async def set_property(self, name: str, value: Any) -> None:
+        await self._player.call('set_property', name, value)
+        if name in self.properties:
+            self.properties[name] = value
+            self.version += 1
+
+    async def get_time_pos(self) -> Optional[float]:
+        if not self.properties['pause'] \
+                and self.properties['path'] is not None \
+                and self._loop.time() - self._time_pos_updated \
+                > settings.TIME_POS_MAX_AGE:
+            self._property_changed(
+                'time-pos', await self.get_property('time-pos'))
+        return self.properties['time-pos']
+
+    async def set_volume(self, value: float) -> None:
+        await self.set_property('volume', value)
+        self._record('volume', (value,))
+
+    async def seek(self, origin: str, mode: Optional[str] = None):
+        future = self._expect('playback-restart')
         try:
-            return self._mpv.get_property('time-pos')
-        except mpv.MPVError:
-            return None
+            await self._player.call('command', 'seek', origin, mode)
+            await self._wait(future, 'seek')
+        finally:
+            self._forget(future)
 
-    @property
-    def duration(self) -> Optional[int]:
+    async def play(self, file: str):
+        future = self._expect('file-loaded', 'load-failed')
         try:
-            return self._mpv.get_property('duration')
-        except mpv.MPVError:
-            return None
-
-    @property
-    def metadata(self) -> Optional[Dict]:
+            await self._player.call('command', 'loadfile', file)
+            await self.set_property('pause', False)
+            await self._wait(future, 'file load')
+        finally:
+            self._forget(future)
+
+    async def stop_playback(self) -> None:
+        if self.properties['path'] is None:
+            await self._player.call('command', 'stop')
+            await self.set_property('pause', True)
+            return
+        future = self._expect('end-file')
         try:
-            return self._mpv.get_property('metadata')
-        except mpv.MPVError:
-            return None
-
-    @property
-    def pause(self) -> bool:
-        return self._mpv.get_property('pause')
-
-    @pause.setter
-    def pause(self, value: bool):
-        self._mpv.set_property('pause', value)
-
-    @property
-    def volume(self) -> float:
-        return self._mpv.get_property('volume')
-
-    @volume.setter
-    def volume(self, value: float):
-        self._mpv.set_property('volume', value)
-
-    def seek(self, origin: str, mode: Optional[str] = None):
-        self._mpv.command('seek', origin, mode)
-
-        def wait_for_seek() -> None:
-            # XXX: super lame
-            import time
-            time.sleep(0.1)
-
-        wait_for_seek()
-
-    def play(self, file: str):
-        self._mpv.command('loadfile', file)
-        self.pause = False
-
-        def wait_for_file_load() -> None:
-            # XXX: super lame
-            import time
-            time.sleep(0.1)
-
-        wait_for_file_load()
-
-    def stop_playback(self) -> None:
-        self._mpv.command('playlist-clear')
-        self.pause = True
-
-        def wait_for_file_end() -> None:
-            # XXX: super lame
-            import time
-            time.sleep(0.1)
-
-        wait_for_file_end()
+            await self._player.call('command', 'stop')
+            await self.set_property('pause', True)
+            await self._wait(future, 'file end')
+        finally:
+            self._forget(future)
+
+    def _expect(self, *events: str) -> asyncio.Future:
+        future = self._loop.create_future()
+        for event in events:
+            self._waiters.setdefault(event, []).append(future)
+        return future
+
+    def _forget(self, future: asyncio.Future) -> None:
+        # a future waits on several events but only the one that fired is
+        # popped, so drop it from the others too, and from all of them when
+        # the wait timed out or failed
+        for event, waiters in list(self._waiters.items()):
+            if future in waiters:
+                waiters.remove(future)
+                if not waiters:
+                    del self._waiters[event]
+
+    async def _wait(self, future: asyncio.Future, description: str) -> None:
+        try:
+            await asyncio.wait_for(future, settings.MPV_EVENT_TIMEOUT)
+        except asyncio.TimeoutError:
+            logging.warning('Timed out waiting for %s', description)
 
-    def _event_cb(self) -> None:
-        while self._mpv:
-            event = self._mpv.wait_event(.01)
-            if event.id == mpv.Events.none:
-                break
+    def _resolve(self, event: str) -> None:
+        for future in self._waiters.pop(event, []):
+            if not future.done():
+                future.set_result(event)
 
-            if event.id == mpv.Events.end_file \
-                    and event.data.reason in (
-                        MPV_END_FILE_REASON_EOF,
-                        MPV_END_FILE_REASON_ERROR):
-                self._next_file()
+    async def save_scan_cache(self) -> None:
+        await self._loop.run_in_executor(None, self.scan_cache.save)
 
-    def _next_file(self) -> None:
+    def _record(self, op: str, args: Tuple[Any, ...]) -> None:
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(op, args)
+        except OSError as error:
+            logging.exception(error)
+
+    def _playlist_changed(self, op: str, args: Tuple[Any, ...]) -> None:
+        self._record(op, args)
+        self.version += 1
+        if op in ('random', 'loop'):
+            self.events.publish({'event': op, op: args[0]})
+            return
+        self.events.publish(events.playlist_event(self.playlist, op))
+
+    def _property_changed(self, name: str, value: Any) -> None:
+        self.properties[name] = value
+        if name != 'time-pos':
+            self.version += 1
+        if name == 'path':
+            self.events.publish({
+                'event': 'track',
+                'path': value,
+                'playlist-pos': self.playlist.current_index,
+            })
+        elif name == 'pause':
+            self.events.publish({'event': 'pause', 'paused': value})
+        elif name == 'volume':
+            self.events.publish({'event': 'volume', 'volume': value})
+        elif name == 'time-pos':
+            self._time_pos_updated = self._loop.time()
+            seconds = None if value is None else int(value)
+            if seconds != self._last_time_pos:
+                self._last_time_pos = seconds
+                self.version += 1
+                self.events.publish({'event': 'time-pos', 'time-pos': value})
+
+    def _job_changed(self, job: jobs.Job) -> None:
+        self.events.publish({'event': 'job', 'job': job.as_dict()})
+
+    def _event_cb(self, event) -> None:
+        if event.id == mpv.Events.property_change:
+            self._property_changed(event.data.name, event.data.data)
+
+        if event.id == mpv.Events.file_loaded:
+            self._resolve('file-loaded')
+
+        if event.id == mpv.Events.playback_restart:
+            self._resolve('playback-restart')
+
+        if event.id == mpv.Events.end_file:
+            self._resolve('end-file')
+            if event.data.reason == MPV_END_FILE_REASON_ERROR:
+                self._resolve('load-failed')
+            if event.data.reason in (
+                    MPV_END_FILE_REASON_EOF,
+                    MPV_END_FILE_REASON_ERROR):
+                asyncio.ensure_future(self._next_file())
+
+    async def _next_file(self) -> None:
         try:
             self.playlist.jump_next()
         except ValueError:
-            self.stop_playback()
+            await self.stop_playback()
             logging.info('No more files to play')
             return
         logging.info('Playing next file (%s)...', self.playlist.current_path)
-        self.play(self.playlist.current_path)
-
-
-def _scan(dir: str) -> Generator[str, None, None]:
-    logging.debug('Traversing %s', dir)
-    for entry in os.scandir(dir):
-        if entry.is_dir(follow_symlinks=False):
-            for path in _scan(entry.path):
-                yield path
-        elif entry.name.lower().endswith(settings.EXTENSIONS):
-            yield entry.path
+        try:
+            await self.play(self.playlist.current_path)
+        except mpv.MPVError as error:
+            logging.exception(error)
 
 
 class Command:
     subclasses: List['Command'] = []
+    mutating = True
+    interactive = False
 
     @property
     def name(self) -> str:
@@ -143,79 +243,247 @@ class Command:
     def __init_subclass__(cls, **kwargs):
         Command.subclasses.append(cls())
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         raise NotImplementedError()
 
 
 class PlayCommand(Command):
     name = 'play'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         if 'file' in request:
             file = str(request['file'])
-            state.play(file)
+            await state.play(file)
             logging.info('Playing %r', file)
         elif state.playlist.current_path is None:
             state.playlist.jump_next()
-            state.play(state.playlist.current_path)
+            await state.play(state.playlist.current_path)
             logging.info('Starting playback: %r', state.playlist.current_path)
+        elif state.properties['path'] is None:
+            await state.play(state.playlist.current_path)
+            logging.info('Resuming playback: %r', state.playlist.current_path)
         else:
-            state.pause = False
+            await state.set_property('pause', False)
             logging.info('Unpausing playback')
         return {'status': 'ok'}
 
 
+class PlayPauseCommand(Command):
+    name = 'play-pause'
+    interactive = True
+
+    async def run(self, state: State, _request) -> Dict:
+        paused = state.properties['pause']
+        return await _get_command('play' if paused else 'pause').run(
+            state, {})
+
+
 class InfoCommand(Command):
     name = 'info'
-
-    def run(self, state: State, _request) -> Dict:
+    mutating = False
+
+    async def run(self, state: State, request) -> Dict:
+        fields, metadata_keys = _info_projection(request)
+        if fields is None or 'time-pos' in fields:
+            await state.get_time_pos()
+        return _info_response(state, fields, metadata_keys)
+
+
+def _time_pos_seconds(state: State) -> Optional[int]:
+    time_pos = state.properties['time-pos']
+    return None if time_pos is None else int(time_pos)
+
+
+def _project_metadata(
+        state: State, metadata_keys: Optional[Tuple[str, ...]]) -> Dict:
+    metadata = state.properties['metadata'] or {}
+    if metadata_keys is None:
+        return metadata
+    return {
+        key: value
+        for key, value in metadata.items()
+        if key.lower() in metadata_keys
+    }
+
+
+INFO_FIELDS: Dict[str, Callable[[State], Any]] = {
+    'playlist-pos': lambda state: state.playlist.current_index,
+    'playlist-size': lambda state: len(state.playlist),
+    'paused': lambda state: state.properties['pause'],
+    'random': lambda state: state.playlist.random,
+    'loop': lambda state: state.playlist.loop,
+    'volume': lambda state: state.properties['volume'],
+    'path': lambda state: state.properties['path'],
+    'time-pos': _time_pos_seconds,
+    'duration': lambda state: state.properties['duration'],
+}
+
+InfoProjection = Tuple[Optional[Tuple[str, ...]], Optional[Tuple[str, ...]]]
+
+
+def _info_projection(request) -> InfoProjection:
+    fields = None
+    metadata_keys = None
+    if request.get('fields') is not None:
+        fields = tuple(str(field) for field in list(request['fields']))
+        for field in fields:
+            if field != 'metadata' and field not in INFO_FIELDS:
+                raise ValueError('Unknown info field {!r}'.format(field))
+    if request.get('metadata-keys') is not None:
+        metadata_keys = tuple(
+            str(key).lower() for key in list(request['metadata-keys']))
+    return fields, metadata_keys
+
+
+def _info_response(
+        state: State,
+        fields: Optional[Tuple[str, ...]] = None,
+        metadata_keys: Optional[Tuple[str, ...]] = None) -> Dict:
+    response = {'status': 'ok'}
+    for field, getter in INFO_FIELDS.items():
+        if fields is None or field in fields:
+            response[field] = getter(state)
+    if fields is None or 'metadata' in fields:
+        response['metadata'] = _project_metadata(state, metadata_keys)
+    return response
+
+
+async def _serve_info(
+        conn: connection.Connection, state: State, request: Dict) -> None:
+    try:
+        fields, metadata_keys = _info_projection(request)
+    except Exception as ex:
+        response = _error_response(ex)
+        if 'id' in request:
+            response['id'] = request['id']
+        await conn.write(response)
+        return
+    if fields is None or 'time-pos' in fields:
+        await state.get_time_pos()
+    key = (conn.codec.name, fields, metadata_keys)
+    cached = state.info_cache.get(key)
+    if cached is None or cached[0] != state.version:
+        if len(state.info_cache) >= settings.INFO_CACHE_SIZE:
+            state.info_cache.clear()
+        frame = _encode_response(
+            conn, request, _info_response(state, fields, metadata_keys))
+        cached = state.info_cache[key] = (state.version, frame)
+    await conn.write_frame(cached[1])
+
+
+class InfoFormatCommand(Command):
+    name = 'info-format'
+    mutating = False
+
+    async def run(self, state: State, request) -> Dict:
+        format_str = str(request['format'])
+        fields, metadata_keys = formatter.info_projection(format_str)
+        if 'time-pos' in fields:
+            await state.get_time_pos()
+        info = _info_response(state, tuple(fields), tuple(metadata_keys))
         return {
             'status': 'ok',
-            'playlist-pos': state.playlist.current_index,
-            'playlist-size': len(state.playlist),
-            'paused': state.pause,
-            'random': state.playlist.random,
-            'loop': state.playlist.loop,
-            'volume': state.volume,
-            'path': state.path,
-            'time-pos': state.time_pos,
-            'duration': state.duration,
-            'metadata': state.metadata or {},
+            'text': formatter.format_templates(
+                format_str, formatter.build_templates(info)),
         }
 
 
 class PauseCommand(Command):
     name = 'pause'
+    interactive = True
 
-    def run(self, state: State, _request) -> Dict:
-        state.pause = True
+    async def run(self, state: State, _request) -> Dict:
+        await state.set_property('pause', True)
         logging.info('Pausing playback')
         return {'status': 'ok'}
 
 
 class StopCommand(Command):
     name = 'stop'
+    interactive = True
 
-    def run(self, state: State, _request) -> Dict:
-        state.stop_playback()
+    async def run(self, state: State, _request) -> Dict:
+        await state.stop_playback()
         logging.info('Stopping playback')
         return {'status': 'ok'}
 
 
+def _get_playlist_range(state: State, request) -> range:
+    offset = int(request.get('offset', 0))
+    limit = request.get('limit')
+    if offset < 0:
+        raise ValueError('Offset must be non-negative')
+    end = len(state.playlist)
+    if limit is not None:
+        if int(limit) < 0:
+            raise ValueError('Limit must be non-negative')
+        end = min(end, offset + int(limit))
+    return range(offset, max(offset, end))
+
+
 class PlaylistInfoCommand(Command):
     name = 'playlist-info'
+    mutating = False
 
-    def run(self, state: State, _request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
+        indexes = _get_playlist_range(state, request)
         return {
             'status': 'ok',
-            'paths': state.playlist.items,
+            'offset': indexes.start,
+            'playlist-size': len(state.playlist),
+            'paths': state.playlist.items[indexes.start:indexes.stop],
         }
 
 
+async def _add_files(
+        state: State,
+        files: List[str],
+        index: Optional[int],
+        job: Optional[jobs.Job] = None) -> Dict:
+    # other clients may edit the playlist while a job is scanning, so the
+    # insertion point follows their changes instead of counting our own
+    point = (
+        None if index is None else InsertionPoint(state.playlist, index))
+    added = 0
+
+    def insert(paths: List[str]) -> None:
+        state.playlist.insert_many(
+            paths, len(state.playlist) if point is None else point.index)
+
+    try:
+        for file in files:
+            if os.path.isdir(file):
+                async for paths in scanner.scan(
+                        file, state.scan_executor, state.scan_cache):
+                    insert(paths)
+                    added += len(paths)
+                    logging.info(
+                        'Scanning %r: %r items so far', file, added)
+                    if job is not None:
+                        job.progress = {'path': file, 'added': added}
+                    state.events.publish({
+                        'event': 'scan',
+                        'path': file,
+                        'added': added,
+                    })
+                    await asyncio.sleep(0)
+            else:
+                insert([file])
+                added += 1
+    finally:
+        if point is not None:
+            point.close()
+
+    await state.save_scan_cache()
+    logging.info('Adding %r items to the playlist', added)
+    return {'added': added}
+
+
 class PlaylistAddCommand(Command):
     name = 'playlist-add'
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         index = int(request['index']) if 'index' in request else None
         files = (
             [str(request['file'])]
@@ -225,41 +493,115 @@ class PlaylistAddCommand(Command):
                 for file in list(request['files'])
             ])
 
-        added = 0
+        if request.get('wait') or not any(map(os.path.isdir, files)):
+            return {'status': 'ok', **await _add_files(state, files, index)}
+
+        job = state.jobs.start(
+            'playlist-add',
+            ', '.join(files),
+            lambda job: _add_files(state, files, index, job))
+        return {'status': 'ok', 'job': job.id}
+
+
+class ScanCacheClearCommand(Command):
+    name = 'scan-cache-clear'
+
+    async def run(self, state: State, request) -> Dict:
+        paths = (
+            [str(path) for path in list(request['paths'])]
+            if 'paths' in request
+            else None)
+        invalidated = state.scan_cache.invalidate(paths)
+        await state.save_scan_cache()
+        logging.info('Invalidating %r cached directories', invalidated)
+        return {'status': 'ok', 'invalidated': invalidated}
+
+
+async def _rebuild_scan_cache(
+        state: State,
+        paths: List[str],
+        job: Optional[jobs.Job] = None) -> Dict:
+    state.scan_cache.invalidate(paths)
+    scanned = 0
+    for path in paths:
+        async for batch in scanner.scan(
+                path, state.scan_executor, state.scan_cache):
+            scanned += len(batch)
+            if job is not None:
+                job.progress = {'path': path, 'scanned': scanned}
+    await state.save_scan_cache()
+    logging.info('Rebuilt scan cache (%r items)', scanned)
+    return {'scanned': scanned}
+
+
+class ScanCacheRebuildCommand(Command):
+    name = 'scan-cache-rebuild'
+
+    async def run(self, state: State, request) -> Dict:
+        paths = (
+            [str(path) for path in list(request['paths'])]
+            if 'paths' in request
+            else sorted(state.scan_cache.roots))
+        if request.get('wait'):
+            return {'status': 'ok', **await _rebuild_scan_cache(state, paths)}
+        job = state.jobs.start(
+            'scan-cache-rebuild',
+            ', '.join(paths),
+            lambda job: _rebuild_scan_cache(state, paths, job))
+        return {'status': 'ok', 'job': job.id}
+
+
+class JobStatusCommand(Command):
+    name = 'job-status'
+    mutating = False
+
+    async def run(self, state: State, request) -> Dict:
+        if 'job' in request:
+            job = state.jobs.get(int(request['job']))
+            return {'status': 'ok', 'job': job.as_dict()}
+        return {
+            'status': 'ok',
+            'jobs': [job.as_dict() for job in state.jobs],
+        }
 
-        for file in files:
-            if os.path.isdir(file):
-                for path in sorted(_scan(file)):
-                    if index is not None:
-                        state.playlist.insert(path, index + added)
-                    else:
-                        state.playlist.add(path)
-                    added += 1
-            else:
-                if index is not None:
-                    state.playlist.insert(file, index)
-                else:
-                    state.playlist.add(file)
-                added += 1
 
-        logging.info('Adding %r items to the playlist', added)
-        return {'status': 'ok', 'added': added}
+class JobCancelCommand(Command):
+    name = 'job-cancel'
+    mutating = False
+    interactive = True
+
+    async def run(self, state: State, request) -> Dict:
+        job = state.jobs.cancel(int(request['job']))
+        logging.info('Cancelling job %r', job.id)
+        return {'status': 'ok', 'job': job.as_dict()}
 
 
 class PlaylistRemoveCommand(Command):
     name = 'playlist-remove'
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         index = int(request['index'])
         state.playlist.delete(index)
         logging.info('Removing %r', index)
         return {'status': 'ok'}
 
 
+class PlaylistMoveCommand(Command):
+    name = 'playlist-move'
+
+    async def run(self, state: State, request) -> Dict:
+        start = int(request['start'])
+        end = int(request['end'])
+        index = int(request['index'])
+        state.playlist.move(start, end, index)
+        logging.info('Moving %r-%r to %r', start, end, index)
+        return {'status': 'ok'}
+
+
 class PlaylistClearCommand(Command):
     name = 'playlist-clear'
 
-    def run(self, state: State, _request) -> Dict:
+    async def run(self, state: State, _request) -> Dict:
         state.playlist.clear()
         logging.info('Clearing the playlist')
         return {'status': 'ok'}
@@ -267,10 +609,11 @@ class PlaylistClearCommand(Command):
 
 class PlaylistPrevCommand(Command):
     name = 'playlist-prev'
+    interactive = True
 
-    def run(self, state: State, _request) -> Dict:
+    async def run(self, state: State, _request) -> Dict:
         state.playlist.jump_prev()
-        state.play(state.playlist.current_path)
+        await state.play(state.playlist.current_path)
         logging.info(
             'Jumping to %r: %r',
             state.playlist.current_index,
@@ -280,10 +623,11 @@ class PlaylistPrevCommand(Command):
 
 class PlaylistNextCommand(Command):
     name = 'playlist-next'
+    interactive = True
 
-    def run(self, state: State, _request) -> Dict:
+    async def run(self, state: State, _request) -> Dict:
         state.playlist.jump_next()
-        state.play(state.playlist.current_path)
+        await state.play(state.playlist.current_path)
         logging.info(
             'Jumping to %r: %r',
             state.playlist.current_index,
@@ -293,10 +637,11 @@ class PlaylistNextCommand(Command):
 
 class PlaylistJumpCommand(Command):
     name = 'playlist-jump'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         state.playlist.jump_to(int(request['index']))
-        state.play(state.playlist.current_path)
+        await state.play(state.playlist.current_path)
         logging.info(
             'Jumping to %r: %r',
             state.playlist.current_index,
@@ -307,53 +652,85 @@ class PlaylistJumpCommand(Command):
 class PlaylistShuffleCommand(Command):
     name = 'shuffle'
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         state.playlist.shuffle()
         logging.info('Shuffling the playlist')
         return {'status': 'ok'}
 
 
+class ReseedCommand(Command):
+    name = 'reseed'
+    interactive = True
+
+    async def run(self, state: State, request) -> Dict:
+        state.playlist.reseed(
+            int(request['seed']) if 'seed' in request else None)
+        state.playlist.random = True
+        logging.info('Reseeding the random order')
+        return {'status': 'ok'}
+
+
 class ToggleRandomCommand(Command):
     name = 'random'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
-        state.playlist.random = bool(request['random'])
+    async def run(self, state: State, request) -> Dict:
+        state.playlist.random = bool(
+            request.get('random', not state.playlist.random))
         logging.info('Setting random flag to %r', state.playlist.random)
         return {'status': 'ok'}
 
 
 class ToggleLoopCommand(Command):
     name = 'loop'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
-        state.playlist.loop = bool(request['loop'])
+    async def run(self, state: State, request) -> Dict:
+        state.playlist.loop = bool(
+            request.get('loop', not state.playlist.loop))
         logging.info('Setting loop flag to %r', state.playlist.loop)
         return {'status': 'ok'}
 
 
 class SetVolumeCommand(Command):
     name = 'volume'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
-        state.volume = float(request['volume'])
-        logging.info('Setting volume to %r', state.volume)
+    async def run(self, state: State, request) -> Dict:
+        await state.set_volume(float(request['volume']))
+        logging.info(
+            'Setting volume to %r', state.properties['volume'])
         return {'status': 'ok'}
 
 
 class SeekCommand(Command):
     name = 'seek'
+    interactive = True
 
-    def run(self, state: State, request) -> Dict:
+    async def run(self, state: State, request) -> Dict:
         where = str(request['where'])
         value, mode = formatter.parse_seek(where)
-        state.seek(str(value), mode)
+        await state.seek(str(value), mode)
         logging.info(
             'Seeking to %r',
-            formatter.format_duration(state.time_pos)
+            formatter.format_duration(await state.get_time_pos())
             or '-')
         return {'status': 'ok'}
 
 
+class BatchCommand(Command):
+    name = 'batch'
+
+    async def run(self, state: State, request) -> Dict:
+        return {
+            'status': 'ok',
+            'responses': [
+                await _dispatch(state, sub_request)
+                for sub_request in list(request['requests'])
+            ],
+        }
+
+
 def _get_command(name: str) -> Command:
     try:
         return next(
@@ -364,97 +741,397 @@ def _get_command(name: str) -> Command:
         raise ValueError('Invalid operation')
 
 
-def load_db(state: State, path: str):
+def _priority(request) -> int:
+    try:
+        if request['msg'] == 'batch':
+            requests = list(request['requests'])
+            # mpvmc follows each command with an info request to show the
+            # result; that read must not demote an interactive command
+            commands = [
+                sub_request for sub_request in requests
+                if sub_request.get('msg') != InfoCommand.name]
+            return max(
+                map(_priority, commands or requests),
+                default=scheduler.BULK)
+        if _get_command(request['msg']).interactive:
+            return scheduler.INTERACTIVE
+    except Exception:
+        pass
+    return scheduler.BULK
+
+
+def _mutating(request) -> bool:
+    try:
+        return _get_command(request['msg']).mutating
+    except Exception:
+        return False
+
+
+def _error_response(ex: Exception) -> Dict:
+    return {
+        'status': 'error',
+        'code': ex.__class__.__name__,
+        'msg': str(ex)
+    }
+
+
+_ENCODE_ERRORS = (TypeError, ValueError, OverflowError)
+
+
+def _encode_error_response(request: Dict, ex: Exception) -> Dict:
+    logging.exception(ex)
+    response = _error_response(ex)
+    # the message may quote the value that could not be encoded
+    response['msg'] = response['msg'].encode(
+        'utf-8', 'backslashreplace').decode('utf-8')
+    if 'id' in request:
+        response['id'] = request['id']
+    return response
+
+
+def _encode_response(
+        conn: connection.Connection, request: Dict, response: Dict) -> bytes:
+    try:
+        return transport.encode_frame(response, conn.codec)
+    except _ENCODE_ERRORS as ex:
+        return transport.encode_frame(
+            _encode_error_response(request, ex), conn.codec)
+
+
+async def _dispatch(state: State, request) -> Dict:
+    try:
+        return await _get_command(request['msg']).run(state, request)
+    except Exception as ex:
+        return _error_response(ex)
+
+
+async def load_db(state: State, path: str) -> int:
     if not os.path.exists(path):
-        return
+        return 0
     try:
-        with open(path, 'rb') as handle:
-            obj = pickle.load(handle)
+        if dbfile.is_compact(path):
+            table, obj = dbfile.load(path)
+            state.playlist.items = BlockList.lazy(table)
+        else:
+            with open(path, 'rb') as handle:
+                obj = pickle.load(handle)
             state.playlist.items = obj['playlist']
-            if obj['index'] is not None:
-                state.playlist.jump_to(obj['index'])
-            state.playlist.random = obj['random']
-            state.playlist.loop = obj['loop']
-            state.volume = obj['volume']
-            if obj['playback']['path'] is not None:
-                state.play(obj['playback']['path'])
-                state.pause = obj['playback']['pause']
-                state.seek(obj['playback']['pos'], 'absolute')
+        if obj['index'] is not None:
+            state.playlist.jump_to(obj['index'])
+        if 'random-state' in obj:
+            try:
+                state.playlist.random_state = obj['random-state']
+            except ValueError as error:
+                logging.warning('Discarding random state: %s', error)
+        state.playlist.random = obj['random']
+        state.playlist.loop = obj['loop']
+        generation = obj.get('journal', 0)
     except Exception as error:
         logging.exception(error)
+        return 0
+    try:
+        await state.set_volume(obj['volume'])
+        if obj['playback']['path'] is not None:
+            await state.play(obj['playback']['path'])
+            await state.set_property('pause', obj['playback']['pause'])
+            await state.seek(obj['playback']['pos'], 'absolute')
+    except Exception as error:
+        logging.exception(error)
+    return generation
+
+
+def _snapshot(state: State) -> Dict:
+    properties = state.properties
+    return {
+        'playlist': state.playlist.items.copy(),
+        'index': state.playlist.current_index,
+        'random-state': state.playlist.random_state,
+        'random': state.playlist.random,
+        'loop': state.playlist.loop,
+        'volume': properties['volume'],
+        'playback': {
+            'path': properties['path'],
+            'pos': properties['time-pos'],
+            'pause': properties['pause'],
+        },
+    }
+
+
+def _write_snapshot(path: str, obj: Dict) -> None:
+    meta = dict(obj)
+    random_state = dict(meta['random-state'])
+    random_state['history'] = array.array('q', random_state['history'])
+    random_state['played'] = array.array('q', random_state['played'])
+    meta['random-state'] = random_state
+    dbfile.write(path, meta.pop('playlist'), meta)
+
+
+async def _apply_record(state: State, op: str, args: Tuple[Any, ...]) -> None:
+    if op == 'volume':
+        await state.set_volume(args[0])
+    elif op in ('random', 'loop'):
+        setattr(state.playlist, op, args[0])
+    elif op == 'jump':
+        state.playlist.jump_to(*args)
+    elif op in (
+            'add', 'insert', 'insert_many', 'move', 'delete', 'clear',
+            'shuffle', 'reseed'):
+        getattr(state.playlist, op)(*args)
+    else:
+        raise ValueError('Unknown journal record {!r}'.format(op))
+
+
+async def open_journal(state: State, db_path: str, generation: int) -> None:
+    journal_path = db_path + '.journal'
+    replayed = 0
+    for op, args in journal.replay(journal_path, generation):
+        try:
+            await _apply_record(state, op, args)
+        except Exception as error:
+            logging.exception(error)
+        replayed += 1
+    if replayed:
+        logging.info('Replayed %r journal records', replayed)
+    state.journal = journal.Journal(
+        journal_path,
+        max([generation] + journal.generations(journal_path)))
+    if replayed or not dbfile.is_compact(db_path):
+        await snapshot_db(state, db_path)
+    else:
+        state.journal.discard(state.journal.rotate())
+
+
+async def snapshot_db(state: State, db_path: str) -> None:
+    assert state.journal is not None
+    obj = _snapshot(state)
+    obj['journal'] = generation = state.journal.rotate()
+    write = asyncio.get_event_loop().run_in_executor(
+        None, _write_snapshot, db_path, obj)
+    try:
+        await asyncio.shield(write)
+    except asyncio.CancelledError:
+        # the executor thread keeps writing, so let it finish first
+        await write
+        state.journal.discard(generation)
+        raise
+    state.journal.discard(generation)
+
+
+async def maintain_db(state: State, db_path: str) -> None:
+    assert state.journal is not None
+    loop = asyncio.get_event_loop()
+    last_snapshot = loop.time()
+    while True:
+        await asyncio.sleep(settings.JOURNAL_SYNC_INTERVAL)
+        try:
+            await loop.run_in_executor(None, state.journal.sync)
+            if state.journal.records >= settings.SNAPSHOT_JOURNAL_RECORDS \
+                    or (state.journal.records and
+                        loop.time() - last_snapshot
+                        >= settings.SNAPSHOT_INTERVAL):
+                await snapshot_db(state, db_path)
+                last_snapshot = loop.time()
+        except OSError as error:
+            logging.exception(error)
+
+
+async def _serve_subscription(
+        conn: connection.Connection, state: State, request: Dict
+) -> Optional[Dict]:
+    queue = state.events.subscribe(request.get('events'))
+    reader = asyncio.ensure_future(conn.read())
+    try:
+        await conn.write({'status': 'ok'})
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _pending = await asyncio.wait(
+                {reader, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter in done:
+                await conn.write(getter.result())
+            else:
+                getter.cancel()
+            if reader in done:
+                return reader.result()
+    finally:
+        state.events.unsubscribe(queue)
+        reader.cancel()
+
+
+async def _stream_playlist(
+        conn: connection.Connection, state: State, request: Dict) -> None:
+    try:
+        indexes = _get_playlist_range(state, request)
+        chunk_size = int(
+            request.get('chunk-size', settings.PLAYLIST_CHUNK_SIZE))
+        if chunk_size <= 0:
+            raise ValueError('Chunk size must be positive')
+    except Exception as ex:
+        response = _error_response(ex)
+        if 'id' in request:
+            response['id'] = request['id']
+        await conn.write(response)
         return
 
+    try:
+        await streaming.stream_playlist(
+            conn, state.playlist, indexes, chunk_size, request.get('id'))
+    except _ENCODE_ERRORS as ex:
+        # a chunk is encoded whole before any of it is sent, so the stream
+        # can end with an error frame in place of that chunk
+        await conn.write(_encode_error_response(request, ex))
 
-def store_db(state: State, path: str):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, 'wb') as handle:
-        pickle.dump({
-            'playlist': state.playlist.items,
-            'index': state.playlist.current_index,
-            'random': state.playlist.random,
-            'loop': state.playlist.loop,
-            'volume': state.volume,
-            'playback': {
-                'path': state.path,
-                'pos': state.time_pos,
-                'pause': state.pause,
-            },
-        }, handle)
 
+def run(host, port, loop, db_path, socket_path=None, tcp=True):
+    scan_cache = scanner.ScanCache(
+        os.path.join(os.path.dirname(db_path), 'scan.dat'))
+    scan_cache.load()
+    state = State(loop, scan_cache)
+    loop.run_until_complete(open_journal(
+        state, db_path, loop.run_until_complete(load_db(state, db_path))))
 
-def run(host, port, loop, db_path):
-    state = State()
-    load_db(state, db_path)
+    clients: Set[connection.Connection] = set()
 
     async def server_handler(reader, writer):
         addr = writer.get_extra_info('peername')
+        conn = connection.Connection(reader, writer)
+        tasks: Set[asyncio.Future] = set()
+
+        async def reply(request: Dict, response: Dict) -> None:
+            if 'id' in request:
+                response['id'] = request['id']
+            logging.debug('%r: send %r', addr, response)
+            try:
+                await conn.write_frame(
+                    _encode_response(conn, request, response))
+            except (ConnectionResetError, BrokenPipeError) as ex:
+                logging.debug('%r: %r', addr, ex)
+
+        async def respond(request: Dict) -> None:
+            await reply(request, await _dispatch(state, request))
+
+        def work(request: Dict) -> scheduler.Work:
+            if request.get('msg') == 'info' and 'id' not in request:
+                return lambda: _serve_info(conn, state, request)
+            if request.get('msg') == 'playlist-info' \
+                    and request.get('stream'):
+                return lambda: _stream_playlist(conn, state, request)
+            return lambda: respond(request)
+
+        if len(clients) >= settings.MAX_CONNECTIONS:
+            logging.warning('%r: refused, too many connections', addr)
+            try:
+                request = await conn.read()
+                if request:
+                    await reply(request, _error_response(
+                        scheduler.Busy('Too many connections')))
+            except (ConnectionResetError, transport.FrameError) as ex:
+                logging.debug('%r: %r', addr, ex)
+            conn.close()
+            return
+
+        clients.add(conn)
         logging.debug('%r: connected', addr)
+
         while True:
             try:
-                request = await transport.read(reader)
+                request = await conn.read()
                 if not request:
                     break
                 logging.debug('%r: receive %r', addr, request)
 
+                if request.get('msg') == 'hello':
+                    codec = transport.select_codec(request.get('codecs', []))
+                    await conn.write({'status': 'ok', 'codec': codec.name})
+                    conn.codec = codec
+                    logging.debug('%r: using %s codec', addr, codec.name)
+                    continue
+
+                if request.get('msg') == 'subscribe':
+                    logging.debug('%r: subscribed', addr)
+                    request = await _serve_subscription(conn, state, request)
+                    logging.debug('%r: unsubscribed', addr)
+                    if not request:
+                        break
+                    if request.get('msg') == 'unsubscribe':
+                        await conn.write({'status': 'ok'})
+                        continue
+
                 try:
-                    cmd = _get_command(request['msg'])
-                    response = cmd.run(state, request)
-                except Exception as ex:
-                    response = {
-                        'status': 'error',
-                        'code': ex.__class__.__name__,
-                        'msg': str(ex)
-                    }
-
-                logging.debug('%r: send %r', addr, response)
-                await transport.write(writer, response)
-            except (ConnectionResetError, BrokenPipeError) as ex:
+                    future = state.scheduler.submit(
+                        conn,
+                        _priority(request),
+                        work(request),
+                        exclusive=_mutating(request))
+                except scheduler.Busy as ex:
+                    await reply(request, _error_response(ex))
+                    continue
+
+                if 'id' in request:
+                    tasks.add(future)
+                    future.add_done_callback(tasks.discard)
+                    continue
+
+                await future
+            except (
+                    ConnectionResetError,
+                    BrokenPipeError,
+                    transport.FrameError) as ex:
                 logging.exception(ex)
                 break
             except Exception as ex:
                 logging.exception(ex)
 
-        writer.close()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        clients.discard(conn)
+        conn.close()
         logging.debug('%r: disconnected', addr)
 
-    server = loop.run_until_complete(
-        asyncio.start_server(server_handler, host, port, loop=loop))
-    logging.info('Serving on %r', server.sockets[0].getsockname())
+    servers = []
+    if tcp:
+        servers.append(loop.run_until_complete(
+            asyncio.start_server(server_handler, host, port)))
+        logging.info('Serving on %r', servers[-1].sockets[0].getsockname())
+    if socket_path:
+        socket_path = transport.prepare_socket_path(socket_path)
+        umask = os.umask(0o177)
+        try:
+            servers.append(loop.run_until_complete(
+                asyncio.start_unix_server(server_handler, socket_path)))
+        finally:
+            os.umask(umask)
+        logging.info('Serving on %r', socket_path)
+    maintenance = loop.create_task(maintain_db(state, db_path))
 
     try:
         loop.run_forever()
     except KeyboardInterrupt:
         pass
-    server.close()
-    loop.run_until_complete(server.wait_closed())
+    maintenance.cancel()
+    loop.run_until_complete(
+        asyncio.gather(maintenance, return_exceptions=True))
+    for server in servers:
+        server.close()
+        loop.run_until_complete(server.wait_closed())
+    if socket_path and os.path.exists(socket_path):
+        os.unlink(socket_path)
+    loop.run_until_complete(state.jobs.shutdown())
+    loop.run_until_complete(snapshot_db(state, db_path))
+    state.journal.close()
+    state.close()
     loop.close()
-    store_db(state, db_path)
+    state.scan_executor.shutdown()
+    state.scan_cache.save()
 
 
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description='MPV music daemon client')
     parser.add_argument('--host', default=settings.HOST)
     parser.add_argument('-p', '--port', type=int, default=settings.PORT)
+    parser.add_argument('--socket', default=settings.SOCKET_PATH)
+    parser.add_argument(
+        '--no-socket', dest='socket', action='store_const', const=None)
+    parser.add_argument('--no-tcp', dest='tcp', action='store_false')
     parser.add_argument(
         '--db-path', type=str, default='~/.local/share/mpvmd/db.dat')
     parser.add_argument('-d', '--debug', action='store_true')
@@ -467,10 +1144,14 @@ def main():
     port: int = args.port
     db_path: str = os.path.expanduser(args.db_path)
     debug: bool = args.debug
+    socket_path: Optional[str] = args.socket
+    tcp: bool = args.tcp
+    if not socket_path and not tcp:
+        raise SystemExit('Nothing to listen on')
 
     logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
     loop = asyncio.get_event_loop()
-    run(host, port, loop, db_path)
+    run(host, port, loop, db_path, socket_path, tcp)
 
 
 if __name__ == '__main__':
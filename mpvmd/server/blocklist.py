@@ -0,0 +1,314 @@
+import array
+import itertools
+from collections.abc import MutableSequence, Sequence
+from typing import Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+
+class _View:
+    def __init__(self, source: Sequence, start: int, stop: int) -> None:
+        self.source = source
+        self.start = start
+        self.stop = stop
+
+    def __len__(self) -> int:
+        return self.stop - self.start
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self.source[i] for i in range(self.start, self.stop))
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return list(self)[index]
+            return list(self.source[
+                self.start + start:self.start + max(start, stop)])
+        if index < 0:
+            index += len(self)
+        if index < 0 or index >= len(self):
+            raise IndexError('list index out of range')
+        return self.source[self.start + index]
+
+
+Block = Union[List[Any], 'array.array[Any]', bytearray, _View]
+
+
+class BlockList(MutableSequence):
+    # with a typecode, blocks are arrays of that type rather than lists of
+    # Python objects; 'B' blocks are bytearrays, which search far faster
+    load = 1000
+
+    def __init__(
+            self,
+            items: Iterable[Any] = (),
+            typecode: Optional[str] = None) -> None:
+        self.typecode = typecode
+        self._blocks: List[Block] = []
+        self._len = 0
+        self._index: Optional[List[int]] = None
+        self.extend(items)
+
+    @classmethod
+    def lazy(
+            cls,
+            source: Sequence,
+            typecode: Optional[str] = None) -> 'BlockList':
+        ret = cls(typecode=typecode)
+        ret._blocks = [
+            _View(source, start, min(len(source), start + cls.load))
+            for start in range(0, len(source), cls.load)
+        ]
+        ret._len = len(source)
+        return ret
+
+    def copy(self) -> 'BlockList':
+        ret = BlockList(typecode=self.typecode)
+        ret._blocks = [
+            block if isinstance(block, _View) else self._new_block(block)
+            for block in self._blocks
+        ]
+        ret._len = self._len
+        return ret
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __iter__(self) -> Iterator[Any]:
+        return itertools.chain.from_iterable(self._blocks)
+
+    def __repr__(self) -> str:
+        return 'BlockList({!r})'.format(list(self))
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, (BlockList, list)):
+            return len(self) == len(other) and all(
+                a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                return list(self)[index]
+            return self._slice(start, stop)
+        block, offset = self._locate(self._normalize(index))
+        return self._blocks[block][offset]
+
+    def __setitem__(self, index, value) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                raise ValueError('Extended slices are not supported')
+            values = list(value)
+            self._delete_range(start, max(start, stop))
+            self.insert_many(start, values)
+            return
+        block, offset = self._locate(self._normalize(index))
+        self._materialize(block)[offset] = value
+
+    def __delitem__(self, index) -> None:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            if step != 1:
+                raise ValueError('Extended slices are not supported')
+            self._delete_range(start, max(start, stop))
+            return
+        block, offset = self._locate(self._normalize(index))
+        del self._materialize(block)[offset]
+        self._len -= 1
+        if not self._blocks[block]:
+            del self._blocks[block]
+            self._index = None
+            return
+        if self._index is not None:
+            self._update_index(block, -1)
+        self._rebalance(block)
+
+    def insert(self, index: int, value: Any) -> None:
+        if index < 0:
+            index += self._len
+        index = max(0, min(self._len, index))
+        if not self._blocks:
+            self._blocks.append(self._new_block([value]))
+            self._len = 1
+            self._index = None
+            return
+        if index == self._len:
+            block = len(self._blocks) - 1
+            self._materialize(block).append(value)
+        else:
+            block, offset = self._locate(index)
+            self._materialize(block).insert(offset, value)
+        self._len += 1
+        if self._index is not None:
+            self._update_index(block, 1)
+        self._rebalance(block)
+
+    def append(self, value: Any) -> None:
+        self.insert(self._len, value)
+
+    def extend(self, values: Iterable[Any]) -> None:
+        self.insert_many(self._len, values)
+
+    def insert_many(self, index: int, values: Iterable[Any]) -> None:
+        values = self._new_block(values)
+        if not values:
+            return
+        if index < 0:
+            index += self._len
+        index = max(0, min(self._len, index))
+        if not self._blocks:
+            self._blocks = self._chunk(values)
+            self._len = len(values)
+            self._index = None
+            return
+        if index == self._len:
+            block = len(self._blocks) - 1
+            offset = len(self._blocks[block])
+        else:
+            block, offset = self._locate(index)
+        items = self._materialize(block)
+        if len(items) + len(values) <= 2 * self.load:
+            items[offset:offset] = values
+            if self._index is not None:
+                self._update_index(block, len(values))
+        else:
+            self._blocks[block:block + 1] = self._chunk(
+                items[:offset] + values + items[offset:])
+            self._index = None
+        self._len += len(values)
+
+    def index(
+            self,
+            value: Any,
+            start: int = 0,
+            stop: Optional[int] = None) -> int:
+        start, stop, _ = slice(start, stop).indices(self._len)
+        if start < stop:
+            block, offset = self._locate(start)
+            base = start - offset
+            while base < stop:
+                items = self._blocks[block]
+                try:
+                    return base + offset + items[
+                        offset:min(len(items), stop - base)].index(value)
+                except ValueError:
+                    pass
+                base += len(items)
+                block += 1
+                offset = 0
+        raise ValueError('{!r} is not in list'.format(value))
+
+    def clear(self) -> None:
+        self._blocks = []
+        self._len = 0
+        self._index = None
+
+    def _new_block(self, items: Iterable[Any]) -> Block:
+        if self.typecode is None:
+            return list(items)
+        if self.typecode == 'B':
+            return bytearray(items)
+        return array.array(self.typecode, items)
+
+    def _materialize(self, block: int) -> Block:
+        items = self._blocks[block]
+        if isinstance(items, _View):
+            items = self._blocks[block] = self._new_block(items[:])
+        return items
+
+    def _normalize(self, index: int) -> int:
+        if index < 0:
+            index += self._len
+        if index < 0 or index >= self._len:
+            raise IndexError('list index out of range')
+        return index
+
+    def _slice(self, start: int, stop: int) -> List[Any]:
+        if start >= stop:
+            return []
+        block, offset = self._locate(start)
+        ret: List[Any] = []
+        remaining = stop - start
+        while remaining > 0:
+            chunk = self._blocks[block][offset:offset + remaining]
+            ret.extend(chunk)
+            remaining -= len(chunk)
+            block += 1
+            offset = 0
+        return ret
+
+    def _delete_range(self, start: int, stop: int) -> None:
+        if start >= stop:
+            return
+        first_block, first_offset = self._locate(start)
+        if stop < self._len:
+            last_block, last_offset = self._locate(stop)
+        else:
+            last_block = len(self._blocks) - 1
+            last_offset = len(self._blocks[last_block])
+        self._len -= stop - start
+        if first_block == last_block:
+            del self._materialize(first_block)[first_offset:last_offset]
+            if self._index is not None:
+                self._update_index(first_block, start - stop)
+            if self._blocks[first_block]:
+                self._rebalance(first_block)
+            else:
+                del self._blocks[first_block]
+                self._index = None
+            return
+        merged = (
+            self._materialize(first_block)[:first_offset] +
+            self._materialize(last_block)[last_offset:])
+        self._blocks[first_block:last_block + 1] = [merged] if merged else []
+        self._index = None
+        if merged:
+            self._rebalance(first_block)
+
+    def _rebalance(self, block: int) -> None:
+        size = len(self._blocks[block])
+        if size < self.load // 4 and len(self._blocks) > 1:
+            if block == len(self._blocks) - 1:
+                block -= 1
+            self._blocks[block:block + 2] = [
+                self._materialize(block) + self._materialize(block + 1)]
+            self._index = None
+            size = len(self._blocks[block])
+        if size > 2 * self.load:
+            self._blocks[block:block + 1] = self._chunk(self._blocks[block])
+            self._index = None
+
+    def _chunk(self, items: Block) -> List[Block]:
+        count = -(-len(items) // self.load)
+        size = -(-len(items) // count)
+        return [items[i:i + size] for i in range(0, len(items), size)]
+
+    def _build_index(self) -> List[int]:
+        prefix = [0]
+        prefix.extend(itertools.accumulate(map(len, self._blocks)))
+        return [0] + [
+            prefix[i] - prefix[i - (i & -i)]
+            for i in range(1, len(prefix))
+        ]
+
+    def _update_index(self, block: int, delta: int) -> None:
+        assert self._index is not None
+        i = block + 1
+        while i < len(self._index):
+            self._index[i] += delta
+            i += i & -i
+
+    def _locate(self, index: int) -> Tuple[int, int]:
+        if self._index is None:
+            self._index = self._build_index()
+        tree = self._index
+        pos = 0
+        bit = 1 << (len(tree) - 1).bit_length()
+        while bit:
+            nxt = pos + bit
+            if nxt < len(tree) and tree[nxt] <= index:
+                pos = nxt
+                index -= tree[nxt]
+            bit >>= 1
+        return pos, index
@@ -0,0 +1,94 @@
+import array
+import mmap
+import pickle
+import struct
+import sys
+from collections.abc import Sequence
+from typing import Any, Dict, Iterable, Tuple
+from mpvmd.server import journal
+
+
+MAGIC = b'MPVMDDB\x02'
+
+_HEADER = struct.Struct('<8sQQQ')
+_OFFSET = struct.Struct('<Q')
+_RANGE = struct.Struct('<QQ')
+
+
+class DatabaseFormatError(ValueError):
+    pass
+
+
+def _decode(data: bytes) -> str:
+    return str(data, 'utf-8', 'surrogateescape')
+
+
+class PathTable(Sequence):
+    def __init__(
+            self, buffer, count: int, offsets_start: int, blob_start: int
+    ) -> None:
+        self._buffer = buffer
+        self._count = count
+        self._offsets_start = offsets_start
+        self._blob_start = blob_start
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._count)
+            return [self._get(i) for i in range(start, stop, step)]
+        if index < 0:
+            index += self._count
+        if index < 0 or index >= self._count:
+            raise IndexError('Path table index out of range')
+        return self._get(index)
+
+    def _get(self, index: int) -> str:
+        start, end = _RANGE.unpack_from(
+            self._buffer, self._offsets_start + index * _OFFSET.size)
+        return _decode(
+            self._buffer[self._blob_start + start:self._blob_start + end])
+
+
+def is_compact(path: str) -> bool:
+    try:
+        with open(path, 'rb') as handle:
+            return handle.read(len(MAGIC)) == MAGIC
+    except FileNotFoundError:
+        return False
+
+
+def write(path: str, paths: Iterable[str], meta: Dict[str, Any]) -> None:
+    offsets = array.array('Q', [0])
+    blob = bytearray()
+    for item in paths:
+        blob += item.encode('utf-8', 'surrogateescape')
+        offsets.append(len(blob))
+    if sys.byteorder != 'little':
+        offsets.byteswap()
+    meta_data = pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL)
+    journal.write_atomically(
+        path,
+        _HEADER.pack(MAGIC, len(offsets) - 1, len(blob), len(meta_data)),
+        offsets.tobytes(),
+        blob,
+        meta_data)
+
+
+def load(path: str) -> Tuple[PathTable, Dict[str, Any]]:
+    with open(path, 'rb') as handle:
+        buffer = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(buffer) < _HEADER.size:
+        raise DatabaseFormatError('Truncated database header')
+    magic, count, blob_size, meta_size = _HEADER.unpack_from(buffer)
+    if magic != MAGIC:
+        raise DatabaseFormatError('Not a compact database')
+    offsets_start = _HEADER.size
+    blob_start = offsets_start + (count + 1) * _OFFSET.size
+    meta_start = blob_start + blob_size
+    if meta_start + meta_size != len(buffer):
+        raise DatabaseFormatError('Database size mismatch')
+    meta = pickle.loads(buffer[meta_start:meta_start + meta_size])
+    return PathTable(buffer, count, offsets_start, blob_start), meta
@@ -0,0 +1,40 @@
+import asyncio
+from typing import Dict, List, Optional, Set
+from mpvmd import settings
+from mpvmd.server.playlist import Playlist
+
+
+class EventBus:
+    def __init__(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+        self._subscribers: Dict[asyncio.Queue, Optional[Set[str]]] = {}
+
+    def subscribe(self, events: Optional[List[str]] = None) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(
+            maxsize=settings.SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[queue] = set(events) if events else None
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.pop(queue, None)
+
+    def publish(self, event: Dict) -> None:
+        if self._subscribers:
+            self._loop.call_soon_threadsafe(self._deliver, event)
+
+    def _deliver(self, event: Dict) -> None:
+        for queue, events in self._subscribers.items():
+            if events is not None and event['event'] not in events:
+                continue
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+
+def playlist_event(playlist: Playlist, op: str) -> Dict:
+    return {
+        'event': 'playlist',
+        'op': op,
+        'playlist-pos': playlist.current_index,
+        'playlist-size': len(playlist),
+    }
@@ -0,0 +1,113 @@
+import asyncio
+import collections
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+from mpvmd import settings
+
+
+class Job:
+    def __init__(self, job_id: int, name: str, description: str) -> None:
+        self.id = job_id
+        self.name = name
+        self.description = description
+        self.state = 'pending'
+        self.progress: Dict[str, Any] = {}
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Future] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.state in ('done', 'failed', 'cancelled')
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'name': self.name,
+            'description': self.description,
+            'state': self.state,
+            'progress': self.progress,
+            'result': self.result,
+            'error': self.error,
+        }
+
+
+JobFunction = Callable[[Job], Awaitable[Dict[str, Any]]]
+
+
+class JobManager:
+    def __init__(
+            self,
+            concurrency: Optional[int] = None,
+            history_size: Optional[int] = None) -> None:
+        self.listeners: List[Callable[[Job], None]] = []
+        self._semaphore = asyncio.Semaphore(
+            concurrency or settings.JOB_CONCURRENCY)
+        self._history_size = history_size or settings.JOB_HISTORY_SIZE
+        self._jobs: Dict[int, Job] = collections.OrderedDict()
+        self._ids = itertools.count(1)
+
+    def __iter__(self) -> Iterator[Job]:
+        return iter(list(self._jobs.values()))
+
+    def start(
+            self,
+            name: str,
+            description: str,
+            function: JobFunction) -> Job:
+        job = Job(next(self._ids), name, description)
+        self._jobs[job.id] = job
+        job.task = asyncio.ensure_future(self._run(job, function))
+        self._prune()
+        self._notify(job)
+        return job
+
+    def get(self, job_id: int) -> Job:
+        try:
+            return self._jobs[job_id]
+        except KeyError:
+            raise ValueError('Unknown job {!r}'.format(job_id))
+
+    def cancel(self, job_id: int) -> Job:
+        job = self.get(job_id)
+        if job.task is not None and not job.finished:
+            job.task.cancel()
+        return job
+
+    async def shutdown(self) -> None:
+        tasks = [
+            job.task
+            for job in self._jobs.values()
+            if job.task is not None and not job.task.done()
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _run(self, job: Job, function: JobFunction) -> None:
+        try:
+            async with self._semaphore:
+                self._update(job, 'running')
+                job.result = await function(job)
+        except asyncio.CancelledError:
+            self._update(job, 'cancelled')
+        except Exception as error:
+            logging.exception(error)
+            job.error = str(error)
+            self._update(job, 'failed')
+        else:
+            self._update(job, 'done')
+
+    def _update(self, job: Job, state: str) -> None:
+        job.state = state
+        self._notify(job)
+
+    def _notify(self, job: Job) -> None:
+        for listener in self.listeners:
+            listener(job)
+
+    def _prune(self) -> None:
+        finished = [job.id for job in self._jobs.values() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self._history_size)]:
+            del self._jobs[job_id]
@@ -0,0 +1,122 @@
+import glob
+import logging
+import os
+import pickle
+import struct
+import threading
+import time
+from typing import Any, Iterator, List, Optional, Tuple
+from mpvmd import settings
+
+
+_HEADER = struct.Struct('<I')
+
+Record = Tuple[str, Tuple[Any, ...]]
+
+
+def _journal_path(base_path: str, generation: int) -> str:
+    return '{}.{}'.format(base_path, generation)
+
+
+def generations(base_path: str) -> List[int]:
+    ret = []
+    for path in glob.glob(glob.escape(base_path) + '.*'):
+        suffix = path[len(base_path) + 1:]
+        if suffix.isdigit():
+            ret.append(int(suffix))
+    return sorted(ret)
+
+
+def _read_records(path: str) -> Iterator[Record]:
+    with open(path, 'rb') as handle:
+        while True:
+            header = handle.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                break
+            size = _HEADER.unpack(header)[0]
+            data = handle.read(size)
+            if len(data) < size:
+                logging.warning('Ignoring truncated record in %s', path)
+                break
+            try:
+                record = pickle.loads(data)
+            except Exception:
+                logging.warning('Ignoring corrupt record in %s', path)
+                break
+            yield record
+
+
+def replay(base_path: str, since: int) -> Iterator[Record]:
+    for generation in generations(base_path):
+        if generation >= since:
+            yield from _read_records(_journal_path(base_path, generation))
+
+
+def write_atomically(path: str, *chunks: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as handle:
+        handle.writelines(chunks)
+        handle.flush()
+        os.fsync(handle.fileno())
+    os.replace(tmp_path, path)
+
+
+class Journal:
+    def __init__(
+            self,
+            base_path: str,
+            generation: int,
+            fsync_interval: Optional[float] = None) -> None:
+        self.base_path = base_path
+        self.generation = generation
+        self.fsync_interval = (
+            settings.JOURNAL_FSYNC_INTERVAL
+            if fsync_interval is None
+            else fsync_interval)
+        self.records = 0
+        self._lock = threading.Lock()
+        self._unsynced = False
+        self._last_sync = time.monotonic()
+        os.makedirs(os.path.dirname(base_path), exist_ok=True)
+        self._handle = open(_journal_path(base_path, generation), 'ab')
+
+    def append(self, op: str, args: Tuple[Any, ...]) -> None:
+        data = pickle.dumps((op, args), protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._handle.write(_HEADER.pack(len(data)) + data)
+            self._handle.flush()
+            self.records += 1
+            self._unsynced = True
+            if time.monotonic() - self._last_sync >= self.fsync_interval:
+                self._sync()
+
+    def sync(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def rotate(self) -> int:
+        with self._lock:
+            self._sync()
+            self._handle.close()
+            self.generation += 1
+            self.records = 0
+            self._handle = open(
+                _journal_path(self.base_path, self.generation), 'ab')
+            return self.generation
+
+    def discard(self, below: int) -> None:
+        for generation in generations(self.base_path):
+            if generation < below:
+                os.remove(_journal_path(self.base_path, generation))
+
+    def close(self) -> None:
+        with self._lock:
+            self._sync()
+            self._handle.close()
+
+    def _sync(self) -> None:
+        if self._unsynced:
+            os.fsync(self._handle.fileno())
+            self._unsynced = False
+        self._last_sync = time.monotonic()
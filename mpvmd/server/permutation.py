@@ -0,0 +1,62 @@
+import random
+from typing import List, Optional
+
+
+_MASK64 = (1 << 64) - 1
+
+
+class Permutation:
+    # a keyed Feistel network is a bijection on [0, 4^k); indexes past the
+    # playlist end are skipped, so appending tracks keeps the existing order
+    # until the size crosses the next power of four
+    rounds = 4
+
+    def __init__(self, seed: int) -> None:
+        self.seed = seed
+        generator = random.Random(seed)
+        self._keys: List[int] = [
+            generator.getrandbits(64) for _ in range(self.rounds)]
+
+    def next(self, index: Optional[int], size: int) -> int:
+        return self._walk(index, size, 1)
+
+    def prev(self, index: Optional[int], size: int) -> int:
+        return self._walk(index, size, -1)
+
+    def _walk(self, index: Optional[int], size: int, delta: int) -> int:
+        if size <= 0:
+            raise ValueError('Playlist is empty')
+        half = self._half_bits(size)
+        domain = 1 << (2 * half)
+        if index is None or index >= size:
+            position = -1 if delta > 0 else 0
+        else:
+            position = self._decrypt(index, half)
+        while True:
+            position = (position + delta) % domain
+            ret = self._encrypt(position, half)
+            if ret < size:
+                return ret
+
+    @staticmethod
+    def _half_bits(size: int) -> int:
+        return max(1, ((size - 1).bit_length() + 1) // 2)
+
+    def _round(self, key: int, value: int, half: int) -> int:
+        value = (value * 0x9E3779B97F4A7C15 + key) & _MASK64
+        value ^= value >> 31
+        value = (value * 0xBF58476D1CE4E5B9) & _MASK64
+        value ^= value >> 29
+        return value & ((1 << half) - 1)
+
+    def _encrypt(self, value: int, half: int) -> int:
+        left, right = value >> half, value & ((1 << half) - 1)
+        for key in self._keys:
+            left, right = right, left ^ self._round(key, right, half)
+        return (left << half) | right
+
+    def _decrypt(self, value: int, half: int) -> int:
+        left, right = value >> half, value & ((1 << half) - 1)
+        for key in reversed(self._keys):
+            left, right = right ^ self._round(key, left, half), left
+        return (left << half) | right
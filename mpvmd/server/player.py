@@ -0,0 +1,95 @@
+import asyncio
+import concurrent.futures
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+
+_WAKEUP = object()
+_STOP = object()
+
+
+def _set_result(future: asyncio.Future, result: Any) -> None:
+    if not future.done():
+        future.set_result(result)
+
+
+def _set_exception(future: asyncio.Future, error: Exception) -> None:
+    if not future.done():
+        future.set_exception(error)
+
+
+class Player:
+    def __init__(
+            self,
+            loop: asyncio.AbstractEventLoop,
+            factory: Callable[[], Any],
+            on_event: Callable[[Any], None],
+            is_empty: Callable[[Any], bool]) -> None:
+        self._loop = loop
+        self._factory = factory
+        self._on_event = on_event
+        self._is_empty = is_empty
+        self._requests: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        started: concurrent.futures.Future = concurrent.futures.Future()
+        self._thread = threading.Thread(
+            target=self._run, args=(started,), name='mpv', daemon=True)
+        self._thread.start()
+        started.result()
+
+    def stop(self) -> None:
+        if self._thread is not None:
+            self._requests.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+    def call(self, name: str, *args: Any) -> asyncio.Future:
+        future = self._loop.create_future()
+        self._requests.put((future, name, args))
+        return future
+
+    def _run(self, started: concurrent.futures.Future) -> None:
+        try:
+            ctx = self._factory()
+            ctx.set_wakeup_callback(self._wakeup)
+        except Exception as error:
+            started.set_exception(error)
+            return
+        started.set_result(None)
+
+        while True:
+            request = self._requests.get()
+            if request is _STOP:
+                break
+            if request is _WAKEUP:
+                try:
+                    self._drain_events(ctx)
+                except Exception as error:
+                    logging.exception(error)
+                continue
+            future, name, args = request
+            try:
+                result = getattr(ctx, name)(*args)
+            except Exception as error:
+                self._loop.call_soon_threadsafe(_set_exception, future, error)
+            else:
+                self._loop.call_soon_threadsafe(_set_result, future, result)
+
+        try:
+            ctx.shutdown()
+        except Exception as error:
+            logging.exception(error)
+
+    def _wakeup(self) -> None:
+        self._requests.put(_WAKEUP)
+
+    def _drain_events(self, ctx: Any) -> None:
+        while True:
+            event = ctx.wait_event(0)
+            if self._is_empty(event):
+                break
+            self._loop.call_soon_threadsafe(self._on_event, event)
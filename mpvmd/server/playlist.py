@@ -1,12 +1,25 @@
+import collections
+import itertools
 import random
-from typing import Optional, List
+from collections.abc import Sequence
+from typing import (
+    Any, Callable, Deque, Dict, Iterable, Optional, List, Tuple)
+from mpvmd import settings
+from mpvmd.server.blocklist import BlockList
+from mpvmd.server.permutation import Permutation
 
 
 class Randomizer:
-    def __init__(self, value_factory):
-        self.list = []
-        self.pos = None
+    def __init__(
+            self,
+            value_factory,
+            size: Optional[int] = None,
+            prev_value_factory=None):
+        self.history: Deque[int] = collections.deque(
+            maxlen=size or settings.RANDOM_HISTORY_SIZE)
+        self.pos: Optional[int] = None
         self._get_value = value_factory
+        self._get_prev_value = prev_value_factory or value_factory
 
     def next(self) -> int:
         return self._jump(1)
@@ -14,34 +27,323 @@ class Randomizer:
     def prev(self) -> int:
         return self._jump(-1)
 
-    def _jump(self, delta: int) -> int:
+    def record(self, delta: int, value_factory: Callable[[], int]) -> None:
+        self._jump(delta, value_factory)
+
+    def load(self, history: Iterable[int], pos: Optional[int]) -> None:
+        self.history.clear()
+        self.history.extend(history)
+        self.pos = (
+            None
+            if pos is None or not self.history
+            else max(0, min(len(self.history) - 1, pos)))
+
+    def reset(self) -> None:
+        self.history.clear()
+        self.pos = None
+
+    def discard(self, delta: int) -> None:
+        # drops the entry just stepped onto, leaving pos where the step began
+        assert self.pos is not None
+        del self.history[self.pos]
+        if not self.history:
+            self.pos = None
+        elif delta > 0 or self.pos == len(self.history):
+            self.pos = max(0, self.pos - 1)
+
+    def _jump(
+            self,
+            delta: int,
+            value_factory: Optional[Callable[[], int]] = None) -> int:
+        if value_factory is None:
+            value_factory = (
+                self._get_value if delta > 0 else self._get_prev_value)
         if self.pos is None:
-            self.list = [self._get_value()]
+            self.history.clear()
+            self.history.append(value_factory())
             self.pos = 0
-            return self.list[0]
+            return self.history[0]
 
-        self.pos += delta
-        if self.pos >= 0 and self.pos < len(self.list):
-            return self.list[self.pos]
+        pos = self.pos + delta
+        if 0 <= pos < len(self.history):
+            self.pos = pos
+            return self.history[pos]
 
-        ret = self._get_value()
-        if self.pos == -1:
+        ret = value_factory()
+        if pos < 0:
+            self.history.appendleft(ret)
             self.pos = 0
-            self.list.insert(0, ret)
-            return ret
-        if self.pos == len(self.list):
-            self.list.append(ret)
-            return ret
+        else:
+            self.history.append(ret)
+            self.pos = len(self.history) - 1
+        return ret
+
+
+class _Repeat(Sequence):
+    def __init__(self, value: Any, length: int) -> None:
+        self.value = value
+        self.length = length
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self.value] * len(range(*index.indices(self.length)))
+        if index < -self.length or index >= self.length:
+            raise IndexError('list index out of range')
+        return self.value
+
+
+class _Above(Sequence):
+    def __init__(self, source: Sequence, threshold: int) -> None:
+        self.source = source
+        self.threshold = threshold
+
+    def __len__(self) -> int:
+        return len(self.source)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [
+                int(value > self.threshold) for value in self.source[index]]
+        return int(self.source[index] > self.threshold)
+
+
+class RandomOrder:
+    # every track carries the sequence number of its last random play and a
+    # heard flag, both kept in step with the playlist in typed blocks, so the
+    # state costs 9 bytes per track; a track is heard when its number is
+    # newer than the start of the round, so edits can reorder the walk but
+    # never make it repeat. once edits have moved the walk, it lands on an
+    # unheard track only every size / unheard steps, so after walk_limit
+    # heard tracks, or at once when fewer than 1 / walk_limit of the tracks
+    # are left, the next unheard track is searched for by position instead.
+    # the history holds sequence numbers too, which need no rewriting on
+    # edits; they are turned back into indexes through a short log of recent
+    # edits, or a search once the log has moved on
+    walk_limit = 16
+
+    def __init__(self, seed: Optional[int] = None) -> None:
+        self.permutation = Permutation(
+            random.getrandbits(64) if seed is None else seed)
+        self.history = Randomizer(
+            lambda: self._draw(1), prev_value_factory=lambda: self._draw(-1))
+        self._played = BlockList(typecode='q')
+        self._heard_map = BlockList(typecode='B')
+        self._seq = 0
+        self._round = 0
+        self._heard = 0
+        self._current: Optional[int] = None
+        self._hints: Dict[int, Tuple[int, int]] = {}
+        self._edits: Deque[Callable[[int], Optional[int]]] = (
+            collections.deque(maxlen=settings.RANDOM_EDIT_LOG_SIZE))
+        self._edit_count = 0
+
+    @property
+    def indexes(self) -> List[Optional[int]]:
+        return [self._resolve(seq) for seq in self.history.history]
+
+    @property
+    def state(self) -> Dict[str, Any]:
+        return {
+            'seed': self.permutation.seed,
+            'history': list(self.history.history),
+            'pos': self.history.pos,
+            'played': self._played.copy(),
+            'seq': self._seq,
+            'round': self._round,
+            'heard': self._heard,
+        }
+
+    @state.setter
+    def state(self, value: Dict[str, Any]) -> None:
+        if len(value['played']) != len(self._played):
+            raise ValueError('Random state does not match the playlist')
+        self.permutation = Permutation(value['seed'])
+        self.history.load(value['history'], value['pos'])
+        self._played = BlockList.lazy(value['played'], 'q')
+        self._seq = value['seq']
+        self._round = value['round']
+        self._heard = value['heard']
+        self._heard_map = BlockList.lazy(
+            _Above(value['played'], self._round), 'B')
+        self._hints.clear()
+
+    def step(self, delta: int, current: Optional[int]) -> int:
+        self._current = current
+        while True:
+            seq = self.history.next() if delta > 0 else self.history.prev()
+            index = self._resolve(seq)
+            if index is not None:
+                return index
+            self.history.discard(delta)
+
+    def record(self, delta: int, index: int) -> None:
+        self.history.record(delta, lambda: self._mark(index))
+
+    def reseed(self, seed: int) -> None:
+        self.permutation = Permutation(seed)
+        self._new_round()
+
+    def reset(self, size: int) -> None:
+        self._played = BlockList.lazy(_Repeat(0, size), 'q')
+        self._new_round()
+        self.history.reset()
+        self._hints.clear()
+
+    def inserted(self, index: int, count: int) -> None:
+        self._played.insert_many(index, _Repeat(0, count))
+        self._heard_map.insert_many(index, _Repeat(0, count))
+        self._edit(lambda i: i + count if i >= index else i)
+
+    def deleted(self, index: int) -> None:
+        if self._is_heard(index):
+            self._heard -= 1
+        del self._played[index]
+        del self._heard_map[index]
+        self._edit(lambda i: None if i == index else i - 1 if i > index else i)
+
+    def moved(
+            self,
+            start: int,
+            end: int,
+            index: int,
+            mapping: Callable[[int], int]) -> None:
+        for items in (self._played, self._heard_map):
+            values = items[start:end]
+            del items[start:end]
+            items.insert_many(index, values)
+        self._edit(mapping)
+
+    def _edit(self, mapping: Callable[[int], Optional[int]]) -> None:
+        self._edits.append(mapping)
+        self._edit_count += 1
+
+    def _is_heard(self, index: int) -> bool:
+        return bool(self._heard_map[index])
+
+    def _new_round(self) -> None:
+        self._round = self._seq
+        self._heard = 0
+        self._heard_map = BlockList.lazy(_Repeat(0, len(self._played)), 'B')
+
+    def _draw(self, delta: int) -> int:
+        size = len(self._played)
+        history = self.history.history
+        anchor = None
+        if history:
+            anchor = self._resolve(history[-1] if delta > 0 else history[0])
+        if anchor is None:
+            anchor = self._current
+        walk = self.permutation.next if delta > 0 else self.permutation.prev
+        if self._heard >= size:
+            self._new_round()
+        index = walk(anchor, size)
+        steps = self.walk_limit
+        if (size - self._heard) * self.walk_limit < size:
+            steps = 1
+        for _ in range(steps):
+            if not self._is_heard(index):
+                return self._mark(index)
+            index = walk(index, size)
+        try:
+            index = self._heard_map.index(0, index)
+        except ValueError:
+            index = self._heard_map.index(0)
+        return self._mark(index)
+
+    def _mark(self, index: int) -> int:
+        if self._heard >= len(self._played):
+            self._new_round()
+        if not self._is_heard(index):
+            self._heard += 1
+        self._seq += 1
+        self._played[index] = self._seq
+        self._heard_map[index] = 1
+        if len(self._hints) > 2 * len(self.history.history) + 1:
+            self._hints = {
+                seq: self._hints[seq]
+                for seq in self.history.history if seq in self._hints}
+        self._hints[self._seq] = (index, self._edit_count)
+        return self._seq
+
+    def _resolve(self, seq: int) -> Optional[int]:
+        hint = self._hints.get(seq)
+        if hint is not None:
+            index, stamp = hint
+            missed = self._edit_count - stamp
+            if missed <= len(self._edits):
+                for mapping in itertools.islice(
+                        self._edits, len(self._edits) - missed, None):
+                    index = mapping(index)
+                    if index is None:
+                        return None
+                if self._played[index] != seq:
+                    return None
+                self._hints[seq] = (index, self._edit_count)
+                return index
+        try:
+            index = self._played.index(seq)
+        except ValueError:
+            return None
+        self._hints[seq] = (index, self._edit_count)
+        return index
 
 
 class Playlist:
     def __init__(self) -> None:
-        self.random = False
-        self.loop = False
-        self.items: List[str] = []
+        self.listeners: List[Callable[[str, Tuple[Any, ...]], None]] = []
+        self._items = BlockList()
         self.current_index: Optional[int] = None
+        self._random = False
+        self._loop = False
         self._deleted: Optional[str] = None
-        self._randomizer = Randomizer(self._get_random_track_number)
+        self._order = RandomOrder()
+
+    @property
+    def items(self) -> BlockList:
+        return self._items
+
+    @items.setter
+    def items(self, value: Iterable[str]) -> None:
+        self._items = (
+            value if isinstance(value, BlockList) else BlockList(value))
+        self._order.reset(len(self._items))
+
+    @property
+    def random(self) -> bool:
+        return self._random
+
+    @random.setter
+    def random(self, value: bool) -> None:
+        self._random = value
+        self._notify('random', value)
+
+    @property
+    def loop(self) -> bool:
+        return self._loop
+
+    @loop.setter
+    def loop(self, value: bool) -> None:
+        self._loop = value
+        self._notify('loop', value)
+
+    @property
+    def random_seed(self) -> int:
+        return self._order.permutation.seed
+
+    @property
+    def random_history(self) -> Tuple[List[Optional[int]], Optional[int]]:
+        return self._order.indexes, self._order.history.pos
+
+    @property
+    def random_state(self) -> Dict[str, Any]:
+        return self._order.state
+
+    @random_state.setter
+    def random_state(self, value: Dict[str, Any]) -> None:
+        self._order.state = value
 
     @property
     def current_path(self) -> Optional[str]:
@@ -56,54 +358,125 @@ class Playlist:
 
     def add(self, path: str) -> None:
         self.items.append(path)
+        self._order.inserted(len(self.items) - 1, 1)
+        self._notify('add', path)
 
     def insert(self, path: str, index: int) -> None:
         if index < 0 or index > len(self.items):
             raise IndexError('Playlist index out of bounds')
         self.items.insert(index, path)
+        self._shift_current(index, 1)
+        self._order.inserted(index, 1)
+        self._notify('insert', path, index)
+
+    def insert_many(self, paths: List[str], index: int) -> None:
+        if index < 0 or index > len(self.items):
+            raise IndexError('Playlist index out of bounds')
+        self.items.insert_many(index, paths)
+        self._shift_current(index, len(paths))
+        self._order.inserted(index, len(paths))
+        self._notify('insert_many', paths, index)
+
+    def move(self, start: int, end: int, index: int) -> None:
+        if start < 0 or end > len(self.items) or start > end:
+            raise IndexError('Playlist range out of bounds')
+        count = end - start
+        if index < 0 or index > len(self.items) - count:
+            raise IndexError('Playlist index out of bounds')
+        paths = self.items[start:end]
+        del self.items[start:end]
+        self.items.insert_many(index, paths)
+
+        def moved(i: int) -> int:
+            if start <= i < end:
+                return i + index - start
+            if i >= end:
+                i -= count
+            if i >= index:
+                i += count
+            return i
+
+        if self.current_index is not None:
+            self.current_index = moved(self.current_index)
+        self._order.moved(start, end, index, moved)
+        self._notify('move', start, end, index)
 
     def delete(self, index: int) -> None:
         if index < 0 or index >= len(self.items):
             raise IndexError('Playlist index out of bounds')
         current_path = self.current_path
         self.items.pop(index)
-        if self.current_index is None:
-            return
-        if not self.items:
-            self.current_index = None
-        if index == self.current_index:
-            self._deleted = current_path
-        elif index < self.current_index:
-            self.current_index -= 1
+        self._order.deleted(index)
+        if self.current_index is not None:
+            if not self.items:
+                self.current_index = None
+            elif index == self.current_index:
+                self._deleted = current_path
+            elif index < self.current_index:
+                self.current_index -= 1
+        self._notify('delete', index)
 
     def clear(self) -> None:
-        self.items = []
+        self.items.clear()
         self.current_index = None
+        self._order.reset(0)
+        self._notify('clear')
 
     def jump_prev(self) -> None:
-        self.current_index = self._jump_relative(-1)
+        self._jump(-1)
 
     def jump_next(self) -> None:
-        self.current_index = self._jump_relative(1)
+        self._jump(1)
 
-    def jump_to(self, index: int) -> None:
+    def jump_to(self, index: int, random_delta: Optional[int] = None) -> None:
         if index < 0 or index >= len(self.items):
             raise IndexError('Playlist index out of bounds')
+        if random_delta is not None:
+            self._order.record(random_delta, index)
         self.current_index = index
         self._deleted = None
+        self._notify('jump', index)
 
-    def shuffle(self) -> None:
-        random.shuffle(self.items)
+    def shuffle(self, seed: Optional[int] = None) -> None:
+        if seed is None:
+            seed = random.getrandbits(64)
+        paths = list(self.items)
+        random.Random(seed).shuffle(paths)
+        self.items = paths
         self.current_index = None
+        self._notify('shuffle', seed)
+
+    def reseed(self, seed: Optional[int] = None) -> None:
+        if seed is None:
+            seed = random.getrandbits(64)
+        self._order.reseed(seed)
+        self._notify('reseed', seed)
+
+    def _shift_current(self, index: int, count: int) -> None:
+        if self.current_index is None:
+            return
+        if index < self.current_index or (
+                index == self.current_index and not self._deleted):
+            self.current_index += count
+
+    def _notify(self, op: str, *args: Any) -> None:
+        for listener in self.listeners:
+            listener(op, args)
+
+    def _jump(self, delta: int) -> None:
+        self.current_index = self._jump_relative(delta)
+        if self.random:
+            self._notify('jump', self.current_index, delta)
+        else:
+            self._notify('jump', self.current_index)
 
     def _jump_relative(self, delta: int) -> int:
         if not self.items:
             raise ValueError('Playlist is empty')
 
         if self.random:
-            if delta < 0:
-                return self._randomizer.prev()
-            return self._randomizer.next()
+            self._deleted = None
+            return self._order.step(delta, self.current_index)
         elif self.current_index is None:
             if delta < 0:
                 ret = len(self.items) - 1
@@ -119,5 +492,38 @@ class Playlist:
             ret = self.current_index + delta
         return ret % len(self.items)
 
-    def _get_random_track_number(self):
-        return random.randint(0, len(self.items) - 1)
+
+class InsertionPoint:
+    def __init__(self, playlist: 'Playlist', index: int) -> None:
+        if index < 0 or index > len(playlist):
+            raise IndexError('Playlist index out of bounds')
+        self._playlist = playlist
+        self._index = index
+        playlist.listeners.append(self._changed)
+
+    @property
+    def index(self) -> int:
+        return min(self._index, len(self._playlist))
+
+    def close(self) -> None:
+        self._playlist.listeners.remove(self._changed)
+
+    def _changed(self, op: str, args: Tuple[Any, ...]) -> None:
+        if op == 'add':
+            if self._index >= len(self._playlist) - 1:
+                self._index += 1
+        elif op in ('insert', 'insert_many'):
+            count = 1 if op == 'insert' else len(args[0])
+            if args[1] <= self._index:
+                self._index += count
+        elif op == 'delete':
+            if args[0] < self._index:
+                self._index -= 1
+        elif op == 'move':
+            start, end, index = args
+            if self._index > start:
+                self._index -= min(self._index, end) - start
+            if index <= self._index:
+                self._index += end - start
+        elif op == 'clear':
+            self._index = 0
@@ -0,0 +1,166 @@
+import asyncio
+import concurrent.futures
+import itertools
+import logging
+import os
+import pickle
+import threading
+import time
+from typing import (
+    AsyncGenerator, Dict, Generator, Iterable, Iterator, List, Optional, Set,
+    Tuple)
+from mpvmd import settings
+
+
+Entry = Tuple[str, str, bool]
+
+
+def _list_dir(path: str) -> List[Entry]:
+    logging.debug('Traversing %s', path)
+    entries: List[Entry] = []
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            # sorting names of directories with a trailing slash keeps the
+            # depth-first order identical to sorting the full paths
+            entries.append((entry.name + '/', entry.path, True))
+        elif entry.name.lower().endswith(settings.EXTENSIONS):
+            entries.append((entry.name, entry.path, False))
+    entries.sort()
+    return entries
+
+
+class ScanCache:
+    version = 1
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self.roots: Set[str] = set()
+        self._dirs: Dict[str, Tuple[int, List[Entry]]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __len__(self) -> int:
+        return len(self._dirs)
+
+    def list_dir(self, path: str) -> List[Entry]:
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._dirs.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        entries = _list_dir(path)
+        # a directory modified within the mtime granularity could change
+        # again without its mtime changing, so don't trust it yet
+        if time.time_ns() - mtime > settings.SCAN_CACHE_MTIME_SLACK:
+            with self._lock:
+                self._dirs[path] = (mtime, entries)
+                self._dirty = True
+        return entries
+
+    def add_root(self, path: str) -> None:
+        with self._lock:
+            if path not in self.roots:
+                self.roots.add(path)
+                self._dirty = True
+
+    def invalidate(self, paths: Optional[Iterable[str]] = None) -> int:
+        with self._lock:
+            if paths is None:
+                stale = list(self._dirs)
+            else:
+                prefixes = [path.rstrip(os.sep) for path in paths]
+                stale = [
+                    dir
+                    for dir in self._dirs
+                    if any(
+                        dir == prefix or dir.startswith(prefix + os.sep)
+                        for prefix in prefixes)
+                ]
+            for dir in stale:
+                del self._dirs[dir]
+            self._dirty = self._dirty or bool(stale)
+            return len(stale)
+
+    def load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'rb') as handle:
+                obj = pickle.load(handle)
+            if obj['version'] != self.version \
+                    or tuple(obj['extensions']) != settings.EXTENSIONS:
+                logging.info('Discarding outdated scan cache')
+                return
+            with self._lock:
+                self.roots = set(obj['roots'])
+                self._dirs = obj['dirs']
+                self._dirty = False
+        except Exception as error:
+            logging.exception(error)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            obj = {
+                'version': self.version,
+                'extensions': settings.EXTENSIONS,
+                'roots': sorted(self.roots),
+                'dirs': dict(self._dirs),
+            }
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as handle:
+            pickle.dump(obj, handle)
+        os.replace(tmp_path, self.path)
+
+
+class Scanner:
+    def __init__(
+            self,
+            executor: concurrent.futures.Executor,
+            cache: Optional[ScanCache] = None) -> None:
+        self._executor = executor
+        self._list_dir = _list_dir if cache is None else cache.list_dir
+
+    def walk(self, path: str) -> Generator[str, None, None]:
+        yield from self._walk(self._executor.submit(self._list_dir, path))
+
+    def _walk(
+            self,
+            future: 'concurrent.futures.Future[List[Entry]]'
+    ) -> Generator[str, None, None]:
+        entries = future.result()
+        subdirs = {
+            path: self._executor.submit(self._list_dir, path)
+            for _name, path, is_dir in entries
+            if is_dir
+        }
+        for _name, path, is_dir in entries:
+            if is_dir:
+                yield from self._walk(subdirs.pop(path))
+            else:
+                yield path
+
+
+def _take(iterator: Iterator[str], count: int) -> List[str]:
+    return list(itertools.islice(iterator, count))
+
+
+async def scan(
+        path: str,
+        executor: concurrent.futures.Executor,
+        cache: Optional[ScanCache] = None,
+        batch_size: int = settings.SCAN_BATCH_SIZE
+) -> AsyncGenerator[List[str], None]:
+    loop = asyncio.get_event_loop()
+    if cache is not None:
+        cache.add_root(path)
+    walker = Scanner(executor, cache).walk(path)
+    while True:
+        batch = await loop.run_in_executor(None, _take, walker, batch_size)
+        if not batch:
+            break
+        yield batch
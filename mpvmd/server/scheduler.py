@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import functools
+import itertools
+from typing import (
+    Any, Awaitable, Callable, Deque, Dict, Hashable, List, Optional, Tuple)
+from mpvmd import settings
+
+
+INTERACTIVE = 0
+BULK = 1
+
+Work = Callable[[], Awaitable[Any]]
+Item = Tuple[int, Work, asyncio.Future, bool]
+
+
+class Busy(RuntimeError):
+    pass
+
+
+class Scheduler:
+    def __init__(
+            self,
+            concurrency: Optional[int] = None,
+            reserved: Optional[int] = None,
+            max_in_flight: Optional[int] = None,
+            max_client_in_flight: Optional[int] = None) -> None:
+        self.concurrency = concurrency or settings.SCHEDULER_CONCURRENCY
+        self.reserved = (
+            settings.SCHEDULER_RESERVED if reserved is None else reserved)
+        self.max_in_flight = max_in_flight or settings.MAX_IN_FLIGHT
+        self.max_client_in_flight = (
+            max_client_in_flight or settings.MAX_CLIENT_IN_FLIGHT)
+        self.running = 0
+        self.in_flight = 0
+        self._queues: List[Dict[Hashable, Deque[Item]]] = [
+            collections.OrderedDict(), collections.OrderedDict()]
+        self._client_in_flight: Dict[Hashable, int] = {}
+        self._sequence = itertools.count()
+        # sequence numbers of each client's queued or running exclusive
+        # items, oldest first
+        self._exclusive: Dict[Hashable, Deque[int]] = {}
+
+    def submit(
+            self,
+            client: Hashable,
+            priority: int,
+            work: Work,
+            exclusive: bool = False) -> asyncio.Future:
+        client_in_flight = self._client_in_flight.get(client, 0)
+        if client_in_flight >= self.max_client_in_flight:
+            raise Busy('Too many requests in flight for this client')
+        if priority != INTERACTIVE and self.in_flight >= self.max_in_flight:
+            raise Busy('Too many requests in flight')
+        future = asyncio.get_event_loop().create_future()
+        sequence = next(self._sequence)
+        if exclusive:
+            self._exclusive.setdefault(
+                client, collections.deque()).append(sequence)
+        self._queues[priority].setdefault(
+            client, collections.deque()).append(
+                (sequence, work, future, exclusive))
+        self._client_in_flight[client] = client_in_flight + 1
+        self.in_flight += 1
+        self._pump()
+        return future
+
+    def _next(self) -> Optional[Tuple[Hashable, Item]]:
+        for priority, queues in enumerate(self._queues):
+            if priority != INTERACTIVE \
+                    and self.running >= self.concurrency - self.reserved:
+                return None
+            for client, queue in queues.items():
+                # nothing a client submitted after an exclusive item may run
+                # before that item finishes, whichever class it was queued
+                # in, so skip the client rather than park a slot on it
+                exclusive = self._exclusive.get(client)
+                if exclusive and exclusive[0] < queue[0][0]:
+                    continue
+                item = queue.popleft()
+                if queue:
+                    queues.move_to_end(client)
+                else:
+                    del queues[client]
+                return client, item
+        return None
+
+    def _pump(self) -> None:
+        while self.running < self.concurrency:
+            entry = self._next()
+            if entry is None:
+                break
+            client, (_, work, future, exclusive) = entry
+            self.running += 1
+            task = asyncio.ensure_future(work())
+            task.add_done_callback(
+                functools.partial(self._finished, client, future, exclusive))
+
+    def _finished(
+            self,
+            client: Hashable,
+            future: asyncio.Future,
+            exclusive: bool,
+            task: asyncio.Future) -> None:
+        self.running -= 1
+        if exclusive:
+            pending = self._exclusive[client]
+            pending.popleft()
+            if not pending:
+                del self._exclusive[client]
+        self.in_flight -= 1
+        self._client_in_flight[client] -= 1
+        if not self._client_in_flight[client]:
+            del self._client_in_flight[client]
+        if not future.done():
+            if task.cancelled():
+                future.cancel()
+            elif task.exception() is not None:
+                future.set_exception(task.exception())
+            else:
+                future.set_result(task.result())
+        self._pump()
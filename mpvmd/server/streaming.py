@@ -0,0 +1,29 @@
+import asyncio
+from typing import Any, Dict, Optional
+from mpvmd.server.playlist import Playlist
+
+
+async def stream_playlist(
+        conn,
+        playlist: Playlist,
+        indexes: range,
+        chunk_size: int,
+        request_id: Optional[Any] = None) -> None:
+    offset = indexes.start
+    while True:
+        stop = min(indexes.stop, len(playlist))
+        end = min(stop, offset + chunk_size)
+        chunk: Dict[str, Any] = {
+            'status': 'ok',
+            'offset': offset,
+            'playlist-size': len(playlist),
+            'paths': playlist.items[offset:end],
+            'more': end < stop,
+        }
+        if request_id is not None:
+            chunk['id'] = request_id
+        await conn.write(chunk)
+        if end >= stop:
+            break
+        offset = end
+        await asyncio.sleep(0)
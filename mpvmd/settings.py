@@ -1,3 +1,35 @@
+import os
+
 HOST = '127.0.0.1'
 PORT = 36934
+SOCKET_DIR = (
+    os.path.join(os.environ['XDG_RUNTIME_DIR'], 'mpvmd')
+    if os.environ.get('XDG_RUNTIME_DIR')
+    else None)
+SOCKET_PATH = (
+    os.path.join(SOCKET_DIR, 'mpvmd.sock') if SOCKET_DIR else None)
 EXTENSIONS = ('.mp3', '.flac', '.ogg', '.wav', '.m4a', '.opus')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+SUBSCRIBER_QUEUE_SIZE = 1000
+MAX_CONNECTIONS = 64
+MAX_IN_FLIGHT = 256
+MAX_CLIENT_IN_FLIGHT = 32
+SCHEDULER_CONCURRENCY = 8
+SCHEDULER_RESERVED = 2
+PLAYLIST_CHUNK_SIZE = 1000
+RANDOM_HISTORY_SIZE = 10000
+RANDOM_EDIT_LOG_SIZE = 256
+SCAN_THREADS = 8
+SCAN_BATCH_SIZE = 1000
+SCAN_CACHE_MTIME_SLACK = 2 * 10 ** 9
+JOB_CONCURRENCY = 2
+JOB_HISTORY_SIZE = 100
+JOURNAL_FSYNC_INTERVAL = 1.0
+JOURNAL_SYNC_INTERVAL = 1.0
+SNAPSHOT_INTERVAL = 300
+SNAPSHOT_JOURNAL_RECORDS = 10000
+MPV_EVENT_TIMEOUT = 5.0
+# info serves time-pos from the observed-property snapshot; while playing,
+# a value older than this many seconds is refreshed from mpv first.
+TIME_POS_MAX_AGE = 0.5
+INFO_CACHE_SIZE = 64
@@ -0,0 +1,126 @@
+import array
+import random
+from mpvmd.server.blocklist import BlockList
+import pytest
+
+
+@pytest.fixture(params=[1, 2, 3, 8])
+def small_load(request, monkeypatch):
+    monkeypatch.setattr(BlockList, 'load', request.param)
+
+
+def test_basic():
+    items = BlockList(range(10))
+    assert len(items) == 10
+    assert items[0] == 0
+    assert items[-1] == 9
+    assert items[2:5] == [2, 3, 4]
+    assert list(items) == list(range(10))
+    with pytest.raises(IndexError):
+        items[10]
+    with pytest.raises(IndexError):
+        items[-11]
+
+
+@pytest.mark.usefixtures('small_load')
+@pytest.mark.parametrize('typecode', [None, 'd'])
+@pytest.mark.parametrize('lazy', [False, True])
+@pytest.mark.parametrize('seed', range(20))
+def test_matches_list(seed, lazy, typecode):
+    rnd = random.Random(seed)
+    expected = []
+    actual = BlockList(typecode=typecode)
+    if lazy:
+        expected = [rnd.random() for _ in range(rnd.randint(0, 50))]
+        actual = BlockList.lazy(tuple(expected), typecode)
+    for _ in range(300):
+        size = len(expected)
+        op = rnd.randrange(8)
+        if op == 0:
+            index = rnd.randint(-size - 2, size + 2)
+            value = rnd.random()
+            expected.insert(index, value)
+            actual.insert(index, value)
+        elif op == 1 and size:
+            index = rnd.randint(-size, size - 1)
+            assert actual.pop(index) == expected.pop(index)
+        elif op == 2:
+            index = rnd.randint(0, size)
+            values = [rnd.random() for _ in range(rnd.randint(0, 20))]
+            expected[index:index] = values
+            actual.insert_many(index, values)
+        elif op == 3:
+            start = rnd.randint(-size - 1, size + 1)
+            stop = rnd.randint(-size - 1, size + 1)
+            del expected[start:stop]
+            del actual[start:stop]
+        elif op == 4:
+            values = [rnd.random() for _ in range(rnd.randint(0, 5))]
+            expected.extend(values)
+            actual.extend(values)
+        elif op == 5 and size:
+            index = rnd.randint(-size, size - 1)
+            expected[index] = actual[index] = rnd.random()
+        elif op == 6:
+            start = rnd.randint(-size - 1, size + 1)
+            stop = rnd.randint(-size - 1, size + 1)
+            assert actual[start:stop] == expected[start:stop]
+        elif op == 7 and size:
+            value = expected[rnd.randrange(size)]
+            start = rnd.randint(-size - 1, size + 1)
+            stop = rnd.randint(-size - 1, size + 1)
+            try:
+                index = expected.index(value, start, stop)
+            except ValueError:
+                with pytest.raises(ValueError):
+                    actual.index(value, start, stop)
+            else:
+                assert actual.index(value, start, stop) == index
+        assert len(actual) == len(expected)
+        assert list(actual) == expected
+        assert [actual[i] for i in range(len(expected))] == expected
+
+
+@pytest.mark.usefixtures('small_load')
+def test_lazy_reads_on_demand():
+    reads = []
+
+    class Source(tuple):
+        def __getitem__(self, index):
+            reads.append(index)
+            return super().__getitem__(index)
+
+    items = BlockList.lazy(Source(range(20)))
+    assert len(items) == 20
+    assert reads == []
+    assert items[7] == 7
+    assert reads == [7]
+    items[7] = 'x'
+    assert items[6:9] == [6, 'x', 8]
+    assert list(items) == list(range(7)) + ['x'] + list(range(8, 20))
+
+
+def test_copy_is_independent():
+    items = BlockList.lazy(tuple(range(3000)))
+    items.insert(10, 'x')
+    copy = items.copy()
+    items[0] = 'y'
+    del items[2000:2500]
+    assert copy == [*range(10), 'x', *range(10, 3000)]
+    assert items == [
+        'y', *range(1, 10), 'x', *range(10, 1999), *range(2499, 3000)]
+
+
+def test_typed_blocks():
+    items = BlockList.lazy(tuple(range(3000)), 'q')
+    items.insert(10, -1)
+    del items[2000:2500]
+    copy = items.copy()
+    items[0] = 7
+    assert copy.typecode == 'q'
+    assert copy[:3] == [0, 1, 2]
+    assert items.index(7, 1) == 7
+    assert items.index(2499) == 2000
+    assert isinstance(items._blocks[0], array.array)
+    with pytest.raises(TypeError):
+        items.append('x')
@@ -0,0 +1,77 @@
+import json
+import socket
+import subprocess
+import sys
+import threading
+from mpvmd import settings, transport
+from mpvmd.client import fast
+import pytest
+
+
+@pytest.mark.parametrize('args,expected', [
+    ([], {'msg': 'info'}),
+    (['print'], {'msg': 'info-format', 'format': fast.DEFAULT_FORMAT}),
+    (['print', '-f', '%title%'], {'msg': 'info-format', 'format': '%title%'}),
+    (['print', '--format', '%a%'], {'msg': 'info-format', 'format': '%a%'}),
+    (['print', '--format=%a%'], {'msg': 'info-format', 'format': '%a%'}),
+    (['print', '-h'], None),
+    (['print', '-f'], None),
+    (['--host', 'example.com', 'print'], None),
+    (['play'], None),
+])
+def test_parse_fast_args(args, expected):
+    assert fast.parse_fast_args(args) == expected
+
+
+def test_fast_path_skips_heavy_imports():
+    modules = json.loads(subprocess.check_output([
+        sys.executable, '-c',
+        'import json, sys; import mpvmd.client.fast; '
+        'print(json.dumps(sorted(sys.modules)))',
+    ]))
+    for name in [
+            'asyncio', 'argparse', 'parsimonious', 'mpvmd.formatter',
+            'mpvmd.packer']:
+        assert name not in modules
+
+
+@pytest.fixture
+def server(monkeypatch):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    monkeypatch.setattr(settings, 'HOST', '127.0.0.1')
+    monkeypatch.setattr(settings, 'PORT', listener.getsockname()[1])
+    monkeypatch.setattr(settings, 'SOCKET_PATH', None)
+    requests = []
+
+    def serve(response):
+        conn, _addr = listener.accept()
+        with conn:
+            requests.append(transport.read_blocking(conn))
+            transport.write_blocking(conn, response)
+
+    def start(response):
+        thread = threading.Thread(target=serve, args=(response,))
+        thread.start()
+        return thread
+
+    yield start, requests
+    listener.close()
+
+
+def test_run_fast_print(server, capsys):
+    start, requests = server
+    thread = start({'status': 'ok', 'text': 'artist - title'})
+    fast.run_fast({'msg': 'info-format', 'format': '%title%'})
+    thread.join()
+    assert requests == [{'msg': 'info-format', 'format': '%title%'}]
+    assert capsys.readouterr().out == 'artist - title\n'
+
+
+def test_run_fast_error(server):
+    start, _requests = server
+    thread = start({'status': 'error', 'code': 'FormatError', 'msg': 'Bad'})
+    with pytest.raises(fast.ApiError):
+        fast.run_fast({'msg': 'info-format', 'format': '['})
+    thread.join()
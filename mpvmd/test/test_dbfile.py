@@ -0,0 +1,48 @@
+import os
+import pickle
+from mpvmd.server import dbfile
+import pytest
+
+
+META = {'index': 1, 'random': False, 'journal': 3}
+
+
+def test_roundtrip(tmp_path):
+    path = str(tmp_path / 'db.dat')
+    paths = ['/music/a.mp3', '', '/music/żółw.flac', '/music/\udcff.ogg']
+    dbfile.write(path, paths, META)
+    assert dbfile.is_compact(path)
+    table, meta = dbfile.load(path)
+    assert meta == META
+    assert len(table) == 4
+    assert list(table) == paths
+    assert table[-1] == paths[-1]
+    assert table[1:3] == paths[1:3]
+    with pytest.raises(IndexError):
+        table[4]
+
+
+def test_empty(tmp_path):
+    path = str(tmp_path / 'db.dat')
+    dbfile.write(path, [], {})
+    table, meta = dbfile.load(path)
+    assert list(table) == []
+    assert meta == {}
+
+
+def test_legacy_database_is_not_compact(tmp_path):
+    path = str(tmp_path / 'db.dat')
+    with open(path, 'wb') as handle:
+        pickle.dump({'playlist': []}, handle)
+    assert not dbfile.is_compact(path)
+    assert not dbfile.is_compact(str(tmp_path / 'missing.dat'))
+    with pytest.raises(dbfile.DatabaseFormatError):
+        dbfile.load(path)
+
+
+def test_truncated(tmp_path):
+    path = str(tmp_path / 'db.dat')
+    dbfile.write(path, ['a', 'b'], META)
+    os.truncate(path, os.path.getsize(path) - 1)
+    with pytest.raises(dbfile.DatabaseFormatError):
+        dbfile.load(path)
@@ -0,0 +1,69 @@
+import asyncio
+from mpvmd.server import events
+from mpvmd.server.playlist import Playlist
+
+
+def _watch(playlist, bus):
+    playlist.listeners.append(
+        lambda op, args: bus.publish(events.playlist_event(playlist, op)))
+
+
+def test_delete_pushes_updated_position():
+    async def run():
+        bus = events.EventBus(asyncio.get_running_loop())
+        playlist = Playlist()
+        playlist.items = ['a', 'b', 'c']
+        playlist.jump_to(2)
+        _watch(playlist, bus)
+        queue = bus.subscribe()
+        playlist.delete(0)
+        first = await queue.get()
+        playlist.delete(0)
+        playlist.delete(0)
+        await queue.get()
+        last = await queue.get()
+        return first, last
+
+    first, last = asyncio.run(run())
+    assert first == {
+        'event': 'playlist',
+        'op': 'delete',
+        'playlist-pos': 1,
+        'playlist-size': 2,
+    }
+    assert last == {
+        'event': 'playlist',
+        'op': 'delete',
+        'playlist-pos': None,
+        'playlist-size': 0,
+    }
+
+
+def test_subscription_filters_events():
+    async def run():
+        bus = events.EventBus(asyncio.get_running_loop())
+        playlist_queue = bus.subscribe(['playlist'])
+        all_queue = bus.subscribe()
+        bus.publish({'event': 'pause', 'paused': True})
+        bus.publish({'event': 'playlist', 'op': 'clear'})
+        await asyncio.sleep(0)
+        return (
+            [playlist_queue.get_nowait()
+             for _ in range(playlist_queue.qsize())],
+            [all_queue.get_nowait() for _ in range(all_queue.qsize())])
+
+    playlist_events, all_events = asyncio.run(run())
+    assert playlist_events == [{'event': 'playlist', 'op': 'clear'}]
+    assert [event['event'] for event in all_events] == ['pause', 'playlist']
+
+
+def test_unsubscribe():
+    async def run():
+        bus = events.EventBus(asyncio.get_running_loop())
+        queue = bus.subscribe()
+        bus.unsubscribe(queue)
+        bus.publish({'event': 'pause', 'paused': True})
+        await asyncio.sleep(0)
+        return queue.qsize()
+
+    assert asyncio.run(run()) == 0
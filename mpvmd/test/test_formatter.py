@@ -1,4 +1,7 @@
 from mpvmd import formatter
+import hypothesis
+import hypothesis.strategies
+import parsimonious
 import pytest
 
 
@@ -44,6 +47,56 @@ def test_format_templates_bad(format_str):
         formatter.format_templates(format_str, {})
 
 
+def test_compile_template_reuse():
+    template = formatter.compile_template('[%artist% - ]%title%')
+    assert formatter.compile_template('[%artist% - ]%title%') is template
+    assert template({'artist': 'a', 'title': 't'}) == 'a - t'
+    assert template({'title': 't'}) == 't'
+
+
+def test_compile_template_bad_is_not_cached():
+    for _ in range(2):
+        with pytest.raises(formatter.FormatError):
+            formatter.compile_template('[%var]')
+
+
+@pytest.mark.parametrize('format_str,expected', [
+    ('text', set()),
+    ('%title%', {'title'}),
+    ('[[%artist%|%albumartist%] - ]%title%[ (%time%)]', {
+        'artist', 'albumartist', 'title', 'time'}),
+])
+def test_template_variables(format_str, expected):
+    assert formatter.template_variables(format_str) == expected
+
+
+@pytest.mark.parametrize('format_str,expected_fields,expected_keys', [
+    ('text', [], []),
+    ('%title%', ['metadata'], ['icy-title', 'title']),
+    ('%name%[ %time%/%duration%]', ['duration', 'path', 'time-pos'], []),
+    ('%artist% %unknown%', ['metadata'], ['artist']),
+])
+def test_info_projection(format_str, expected_fields, expected_keys):
+    assert formatter.info_projection(format_str) == (
+        expected_fields, expected_keys)
+
+
+def test_build_templates():
+    templates = formatter.build_templates({
+        'path': '/music/track.flac',
+        'time-pos': 65,
+        'metadata': {'ARTIST': 'a', 'icy-title': 'stream'},
+    })
+    assert templates['artist'] == 'a'
+    assert templates['title'] == 'stream'
+    assert templates['album'] is None
+    assert templates['time'] == '01:05'
+    assert templates['duration'] is None
+    assert templates['file'] == '/music/track.flac'
+    assert templates['name'] == 'track.flac'
+    assert formatter.build_templates({})['name'] is None
+
+
 @pytest.mark.parametrize('seek_str,expected_time,expected_mode', [
     ('0',         0,     formatter.SeekMode.ABSOLUTE),
     ('0.5',       0.5,   formatter.SeekMode.ABSOLUTE),
@@ -107,3 +160,102 @@ def test_parse_seek_good(seek_str, expected_time, expected_mode):
 def test_parse_seek_bad(seek_str):
     with pytest.raises(formatter.FormatError):
         formatter.parse_seek(seek_str)
+
+
+def _parse_seek_with_grammar(seek_str):
+    grammar = r'''
+        seek_mode  = sign? (time/fraction/integer) percent?
+        time       = integer colon (integer colon)? (fraction/integer)
+
+        fraction   = integer point integer
+        integer    = ~"[0-9]+"
+        sign       = "+"/"-"
+        point      = "."
+        percent    = "%"
+        colon      = ":"
+    '''
+
+    class EntryParser(parsimonious.nodes.NodeVisitor):
+        def visit_seek_mode(self, node, visited_children):
+            is_relative = False
+            is_percent = False
+            multiplier = 1
+            if visited_children[0]:
+                is_relative = True
+                multiplier = visited_children[0][0]
+            value = visited_children[1][0]
+            if visited_children[2]:
+                is_percent = True
+            mode = {
+                (False, False): formatter.SeekMode.ABSOLUTE,
+                (True, False): formatter.SeekMode.RELATIVE,
+                (False, True): formatter.SeekMode.ABSOLUTE_PERCENT,
+                (True, True): formatter.SeekMode.RELATIVE_PERCENT,
+            }[is_relative, is_percent]
+            if is_percent and value > 100:
+                raise formatter.FormatError('Invalid percentage value')
+            return (value * multiplier, mode)
+
+        def visit_integer(self, node, visited_children):
+            return int(node.text)
+
+        def visit_fraction(self, node, visited_children):
+            return float(node.text)
+
+        def visit_time(self, node, visited_children):
+            parts = node.text.split(':')
+            ret = 0
+            for part in parts:
+                ret *= 60
+                ret += float(part)
+            return ret
+
+        def visit_sign(self, node, visited_children):
+            return int(node.text + '1')
+
+        def generic_visit(self, _node, visited_children):
+            return visited_children
+
+    try:
+        ast = parsimonious.Grammar(grammar).parse(seek_str)
+        return EntryParser().visit(ast)
+    except parsimonious.VisitationError as error:
+        raise formatter.FormatError(str(error))
+    except (
+            parsimonious.exceptions.ParseError,
+            parsimonious.exceptions.IncompleteParseError):
+        raise formatter.FormatError('Bad format string')
+
+
+def _assert_parse_seek_matches_grammar(seek_str):
+    try:
+        expected = _parse_seek_with_grammar(seek_str)
+    except formatter.FormatError:
+        with pytest.raises(formatter.FormatError):
+            formatter.parse_seek(seek_str)
+        return
+    actual = formatter.parse_seek(seek_str)
+    assert actual == expected
+    assert type(actual[0]) is type(expected[0])
+
+
+_seek_integers = hypothesis.strategies.from_regex(r'\A[0-9]{1,4}\Z')
+
+
+@hypothesis.given(hypothesis.strategies.builds(
+    lambda sign, parts, fraction, percent:
+    sign + ':'.join(parts) + fraction + percent,
+    hypothesis.strategies.sampled_from(['', '+', '-']),
+    hypothesis.strategies.lists(_seek_integers, min_size=1, max_size=4),
+    hypothesis.strategies.one_of(
+        hypothesis.strategies.just(''),
+        _seek_integers.map(lambda digits: '.' + digits)),
+    hypothesis.strategies.sampled_from(['', '%'])))
+def test_parse_seek_matches_grammar_structured(seek_str):
+    _assert_parse_seek_matches_grammar(seek_str)
+
+
+@hypothesis.given(hypothesis.strategies.text(
+    alphabet='0123456789+-.:% a', max_size=12))
+def test_parse_seek_matches_grammar_arbitrary(seek_str):
+    _assert_parse_seek_matches_grammar(seek_str)
@@ -0,0 +1,131 @@
+import asyncio
+from mpvmd.server import jobs
+
+
+def test_job_runs_to_completion():
+    async def run():
+        manager = jobs.JobManager()
+        events = []
+        manager.listeners.append(lambda job: events.append(job.state))
+
+        async def work(job):
+            job.progress = {'added': 1}
+            await asyncio.sleep(0)
+            return {'added': 2}
+
+        job = manager.start('playlist-add', '/music', work)
+        await job.task
+        return job, events
+
+    job, events = asyncio.run(run())
+    assert events == ['pending', 'running', 'done']
+    assert job.as_dict() == {
+        'id': 1,
+        'name': 'playlist-add',
+        'description': '/music',
+        'state': 'done',
+        'progress': {'added': 1},
+        'result': {'added': 2},
+        'error': None,
+    }
+
+
+def test_job_failure():
+    async def run():
+        manager = jobs.JobManager()
+
+        async def work(job):
+            raise OSError('boom')
+
+        job = manager.start('playlist-add', '/music', work)
+        await job.task
+        return job
+
+    job = asyncio.run(run())
+    assert job.state == 'failed'
+    assert job.error == 'boom'
+
+
+def test_job_cancel():
+    async def run():
+        manager = jobs.JobManager()
+        started = asyncio.Event()
+
+        async def work(job):
+            started.set()
+            await asyncio.sleep(60)
+
+        job = manager.start('playlist-add', '/music', work)
+        await started.wait()
+        assert manager.cancel(job.id) is job
+        await job.task
+        return job
+
+    assert asyncio.run(run()).state == 'cancelled'
+
+
+def test_unknown_job():
+    async def run():
+        manager = jobs.JobManager()
+        try:
+            manager.get(1)
+        except ValueError:
+            return True
+        return False
+
+    assert asyncio.run(run())
+
+
+def test_concurrency_is_bounded():
+    async def run():
+        manager = jobs.JobManager(concurrency=2)
+        running = 0
+        peak = 0
+
+        async def work(job):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {}
+
+        started = [manager.start('job', str(i), work) for i in range(5)]
+        await asyncio.sleep(0)
+        states = [job.state for job in started]
+        await asyncio.gather(*(job.task for job in started))
+        return peak, states
+
+    peak, states = asyncio.run(run())
+    assert peak == 2
+    assert states.count('running') == 2
+    assert states.count('pending') == 3
+
+
+def test_history_is_pruned():
+    async def run():
+        manager = jobs.JobManager(history_size=2)
+
+        async def work(job):
+            return {}
+
+        for i in range(4):
+            await manager.start('job', str(i), work).task
+        return [job.id for job in manager]
+
+    assert asyncio.run(run()) == [3, 4]
+
+
+def test_shutdown_cancels_jobs():
+    async def run():
+        manager = jobs.JobManager()
+
+        async def work(job):
+            await asyncio.sleep(60)
+
+        job = manager.start('job', '', work)
+        await asyncio.sleep(0)
+        await manager.shutdown()
+        return job
+
+    assert asyncio.run(run()).state == 'cancelled'
@@ -0,0 +1,106 @@
+import os
+from mpvmd.server import journal
+
+
+def test_replay(tmp_path):
+    base_path = str(tmp_path / 'db.dat.journal')
+    log = journal.Journal(base_path, 0)
+    log.append('add', ('a',))
+    log.append('insert_many', (['b', 'c'], 0))
+    log.close()
+    assert list(journal.replay(base_path, 0)) == [
+        ('add', ('a',)),
+        ('insert_many', (['b', 'c'], 0)),
+    ]
+
+
+def test_replay_missing(tmp_path):
+    assert list(journal.replay(str(tmp_path / 'db.dat.journal'), 0)) == []
+
+
+def test_replay_ignores_truncated_record(tmp_path):
+    base_path = str(tmp_path / 'db.dat.journal')
+    log = journal.Journal(base_path, 0)
+    log.append('add', ('a',))
+    log.append('add', ('b',))
+    log.close()
+    path = base_path + '.0'
+    os.truncate(path, os.path.getsize(path) - 1)
+    assert list(journal.replay(base_path, 0)) == [('add', ('a',))]
+
+
+def test_replay_ignores_corrupt_tail(tmp_path):
+    base_path = str(tmp_path / 'db.dat.journal')
+    log = journal.Journal(base_path, 0)
+    log.append('add', ('a',))
+    log.close()
+    path = base_path + '.0'
+    with open(path, 'ab') as handle:
+        handle.write(bytes(4096))
+    assert list(journal.replay(base_path, 0)) == [('add', ('a',))]
+
+    log = journal.Journal(base_path, 1)
+    log.append('add', ('b',))
+    log.close()
+    with open(base_path + '.1', 'ab') as handle:
+        handle.write(journal._HEADER.pack(5) + b'junk!' + bytes(16))
+    assert list(journal.replay(base_path, 1)) == [('add', ('b',))]
+
+
+def test_rotate_and_discard(tmp_path):
+    base_path = str(tmp_path / 'db.dat.journal')
+    log = journal.Journal(base_path, 3)
+    log.append('add', ('a',))
+    assert log.records == 1
+    assert log.rotate() == 4
+    assert log.records == 0
+    log.append('add', ('b',))
+    log.sync()
+    assert journal.generations(base_path) == [3, 4]
+    assert list(journal.replay(base_path, 3)) == [
+        ('add', ('a',)),
+        ('add', ('b',)),
+    ]
+    assert list(journal.replay(base_path, 4)) == [('add', ('b',))]
+    log.discard(4)
+    assert journal.generations(base_path) == [4]
+    log.close()
+
+
+def test_generations_ignores_other_files(tmp_path):
+    base_path = str(tmp_path / 'db.dat.journal')
+    (tmp_path / 'db.dat.journal.2').write_bytes(b'')
+    (tmp_path / 'db.dat.journal.10').write_bytes(b'')
+    (tmp_path / 'db.dat.journal.tmp').write_bytes(b'')
+    (tmp_path / 'db.dat').write_bytes(b'')
+    assert journal.generations(base_path) == [2, 10]
+
+
+def test_fsync_batching(tmp_path, monkeypatch):
+    synced = []
+    monkeypatch.setattr(journal.os, 'fsync', synced.append)
+    log = journal.Journal(str(tmp_path / 'journal'), 0, fsync_interval=0)
+    log.append('add', ('a',))
+    log.append('add', ('b',))
+    assert len(synced) == 2
+    log.close()
+
+    synced.clear()
+    log = journal.Journal(str(tmp_path / 'journal'), 1, fsync_interval=60)
+    log.append('add', ('a',))
+    log.append('add', ('b',))
+    assert synced == []
+    log.sync()
+    assert len(synced) == 1
+    log.sync()
+    assert len(synced) == 1
+    log.close()
+
+
+def test_write_atomically(tmp_path):
+    path = str(tmp_path / 'data' / 'db.dat')
+    journal.write_atomically(path, b'first')
+    journal.write_atomically(path, b'second')
+    with open(path, 'rb') as handle:
+        assert handle.read() == b'second'
+    assert os.listdir(str(tmp_path / 'data')) == ['db.dat']
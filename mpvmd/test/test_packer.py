@@ -0,0 +1,87 @@
+from mpvmd import packer
+import pytest
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+VALUES = [
+    None,
+    True,
+    False,
+    0,
+    1,
+    127,
+    128,
+    255,
+    256,
+    65535,
+    65536,
+    2 ** 32,
+    2 ** 64 - 1,
+    -1,
+    -32,
+    -33,
+    -128,
+    -129,
+    -32768,
+    -32769,
+    -2 ** 31 - 1,
+    -2 ** 63,
+    0.5,
+    -1e300,
+    '',
+    'ascii',
+    'żółw',
+    'x' * 31,
+    'x' * 32,
+    'x' * 256,
+    'x' * 65536,
+    [],
+    list(range(15)),
+    list(range(16)),
+    list(range(65536)),
+    {},
+    {'status': 'ok', 'metadata': {'title': 'żółw'}, 'time-pos': 1.5},
+    {str(i): i for i in range(16)},
+]
+
+
+@pytest.mark.parametrize('value', VALUES)
+def test_round_trip(value):
+    assert packer.unpack(packer.pack(value)) == value
+
+
+def test_tuple_and_bytes():
+    assert packer.unpack(packer.pack((1, b'raw'))) == [1, 'raw']
+
+
+@pytest.mark.skipif(msgpack is None, reason='msgpack is not installed')
+@pytest.mark.parametrize('value', VALUES)
+def test_msgpack_compatibility(value):
+    assert msgpack.unpackb(packer.pack(value), raw=False) == value
+    assert packer.unpack(msgpack.packb(value, use_bin_type=True)) == value
+
+
+@pytest.mark.parametrize('data', [
+    b'',
+    b'\xa5abc',
+    b'\xc1',
+    b'\x01\x02',
+])
+def test_unpack_bad(data):
+    with pytest.raises(packer.UnpackError):
+        packer.unpack(data)
+
+
+def test_surrogate_escapes():
+    path = b'/music/caf\xe9.mp3'.decode('utf-8', 'surrogateescape')
+    assert packer.pack(path) == b'\xaf/music/caf\xe9.mp3'
+    assert packer.unpack(packer.pack(path)) == path
+
+
+def test_pack_bad():
+    with pytest.raises(TypeError):
+        packer.pack(object())
@@ -0,0 +1,47 @@
+import pytest
+from mpvmd.server.permutation import Permutation
+
+
+def _walk(permutation, size):
+    ret = []
+    index = None
+    for _ in range(size):
+        index = permutation.next(index, size)
+        ret.append(index)
+    return ret
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 4, 5, 17, 64, 1000, 4097])
+def test_visits_every_index_once(size):
+    order = _walk(Permutation(1), size)
+    assert sorted(order) == list(range(size))
+    assert Permutation(1).next(order[-1], size) == order[0]
+
+
+@pytest.mark.parametrize('size', [1, 2, 5, 1000])
+def test_prev_inverts_next(size):
+    permutation = Permutation(2)
+    for index in range(size):
+        assert permutation.prev(permutation.next(index, size), size) == index
+
+
+def test_seed_determines_order():
+    assert _walk(Permutation(3), 100) == _walk(Permutation(3), 100)
+    assert _walk(Permutation(3), 100) != _walk(Permutation(4), 100)
+
+
+def test_append_keeps_order():
+    permutation = Permutation(5)
+    small = _walk(permutation, 40)
+    large = _walk(permutation, 60)
+    assert [index for index in large if index < 40] == small
+
+
+def test_out_of_range_index_restarts():
+    permutation = Permutation(6)
+    assert permutation.next(10, 5) == permutation.next(None, 5)
+
+
+def test_empty():
+    with pytest.raises(ValueError):
+        Permutation(7).next(None, 0)
@@ -0,0 +1,179 @@
+import asyncio
+import collections
+import threading
+import pytest
+from mpvmd.server import player
+
+
+Event = collections.namedtuple('Event', ['id', 'data'])
+
+
+class FakeContext:
+    def __init__(self) -> None:
+        self.threads = []
+        self.events = collections.deque()
+        self.shut_down = False
+        self._wakeup = None
+
+    def set_wakeup_callback(self, callback) -> None:
+        self._wakeup = callback
+
+    def get_property(self, name):
+        self.threads.append(threading.current_thread().name)
+        return {'volume': 50}[name]
+
+    def emit(self, data) -> None:
+        self.events.append(Event('event', data))
+        self._wakeup()
+
+    def wait_event(self, timeout):
+        self.threads.append(threading.current_thread().name)
+        if self.events:
+            return self.events.popleft()
+        return Event('none', None)
+
+    def shutdown(self) -> None:
+        self.shut_down = True
+
+
+def _is_empty(event) -> bool:
+    return event.id == 'none'
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_call_runs_on_the_mpv_thread():
+    async def run():
+        ctx = FakeContext()
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), lambda: ctx, lambda event: None,
+            _is_empty)
+        mpv_player.start()
+        try:
+            results = await asyncio.gather(*(
+                mpv_player.call('get_property', 'volume')
+                for _ in range(3)))
+        finally:
+            mpv_player.stop()
+        return ctx, results
+
+    ctx, results = _run(run())
+    assert results == [50, 50, 50]
+    assert ctx.threads == ['mpv'] * 3
+
+
+def test_call_forwards_exceptions():
+    async def run():
+        ctx = FakeContext()
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), lambda: ctx, lambda event: None,
+            _is_empty)
+        mpv_player.start()
+        try:
+            with pytest.raises(KeyError):
+                await mpv_player.call('get_property', 'missing')
+            with pytest.raises(AttributeError):
+                await mpv_player.call('no_such_method')
+            return await mpv_player.call('get_property', 'volume')
+        finally:
+            mpv_player.stop()
+
+    assert _run(run()) == 50
+
+
+def test_events_are_delivered_on_the_loop_thread():
+    async def run():
+        ctx = FakeContext()
+        received = []
+        done = asyncio.Event()
+
+        def on_event(event):
+            received.append((event.data, threading.current_thread().name))
+            if len(received) == 2:
+                done.set()
+
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), lambda: ctx, on_event, _is_empty)
+        mpv_player.start()
+        try:
+            emitter = threading.Thread(
+                target=lambda: [ctx.emit(data) for data in ('a', 'b')],
+                name='emitter')
+            emitter.start()
+            emitter.join()
+            await asyncio.wait_for(done.wait(), 5)
+        finally:
+            mpv_player.stop()
+        return ctx, received
+
+    ctx, received = _run(run())
+    loop_thread = threading.current_thread().name
+    assert received == [('a', loop_thread), ('b', loop_thread)]
+    assert set(ctx.threads) == {'mpv'}
+
+
+def test_event_errors_do_not_stop_the_thread():
+    async def run():
+        ctx = FakeContext()
+        received = []
+        done = asyncio.Event()
+
+        def wait_event(timeout):
+            if ctx.events and ctx.events[0].data == 'bad':
+                ctx.events.popleft()
+                raise RuntimeError('bad event')
+            return FakeContext.wait_event(ctx, timeout)
+
+        def on_event(event):
+            received.append(event.data)
+            done.set()
+
+        ctx.wait_event = wait_event
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), lambda: ctx, on_event, _is_empty)
+        mpv_player.start()
+        try:
+            ctx.emit('bad')
+            ctx.emit('good')
+            await asyncio.wait_for(done.wait(), 5)
+            result = await asyncio.wait_for(
+                mpv_player.call('get_property', 'volume'), 5)
+        finally:
+            mpv_player.stop()
+        return received, result
+
+    assert _run(run()) == (['good'], 50)
+
+
+def test_stop_shuts_the_context_down():
+    async def run():
+        ctx = FakeContext()
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), lambda: ctx, lambda event: None,
+            _is_empty)
+        mpv_player.start()
+        thread = mpv_player._thread
+        await mpv_player.call('get_property', 'volume')
+        mpv_player.stop()
+        mpv_player.stop()
+        return ctx, thread
+
+    ctx, thread = _run(run())
+    assert ctx.shut_down
+    assert not thread.is_alive()
+
+
+def test_start_reports_factory_errors():
+    def factory():
+        raise RuntimeError('no audio device')
+
+    async def run():
+        mpv_player = player.Player(
+            asyncio.get_event_loop(), factory, lambda event: None,
+            _is_empty)
+        with pytest.raises(RuntimeError):
+            mpv_player.start()
+
+    _run(run())
@@ -1,4 +1,7 @@
-from mpvmd.server.playlist import Playlist, Randomizer
+from mpvmd import settings
+from mpvmd.server.playlist import (
+    InsertionPoint, Playlist, RandomOrder, Randomizer)
+import pytest
 
 
 def test_randomizer():
@@ -163,3 +166,339 @@ def test_delete_next_when_playing_deleted():
     assert playlist.current_path == '789'
     playlist.jump_next()
     assert playlist.current_path == '123'
+
+
+def test_listeners():
+    events = []
+    playlist = Playlist()
+    playlist.listeners.append(lambda op, args: events.append((op, args)))
+    playlist.add('123')
+    playlist.insert('456', 0)
+    playlist.jump_next()
+    playlist.delete(1)
+    playlist.random = True
+    playlist.loop = False
+    playlist.clear()
+    assert events == [
+        ('add', ('123',)),
+        ('insert', ('456', 0)),
+        ('jump', (0,)),
+        ('delete', (1,)),
+        ('random', (True,)),
+        ('loop', (False,)),
+        ('clear', ()),
+    ]
+
+
+def test_insert_before_current():
+    playlist = Playlist()
+    playlist.add('123')
+    playlist.add('456')
+    playlist.jump_next()
+    playlist.jump_next()
+    playlist.insert('789', 0)
+    assert playlist.current_path == '456'
+    playlist.jump_next()
+    assert playlist.current_path == '789'
+
+
+def test_insert_many():
+    playlist = Playlist()
+    playlist.add('123')
+    playlist.add('456')
+    playlist.jump_next()
+    playlist.jump_next()
+    playlist.insert_many(['a', 'b'], 1)
+    assert list(playlist.items) == ['123', 'a', 'b', '456']
+    assert playlist.current_path == '456'
+    playlist.insert_many(['c'], 4)
+    assert playlist.current_path == '456'
+    playlist.jump_next()
+    assert playlist.current_path == 'c'
+
+
+def test_insert_many_at_deleted():
+    playlist = Playlist()
+    playlist.add('123')
+    playlist.add('456')
+    playlist.add('789')
+    playlist.jump_next()
+    playlist.jump_next()
+    playlist.delete(1)
+    playlist.insert_many(['a', 'b'], 1)
+    assert playlist.current_path == '456'
+    playlist.jump_next()
+    assert playlist.current_path == 'a'
+
+
+@pytest.mark.parametrize('start,end,index,expected_items,expected_path', [
+    (0, 1, 3, ['1', '2', '3', '0', '4'], '2'),
+    (3, 5, 0, ['3', '4', '0', '1', '2'], '2'),
+    (1, 3, 3, ['0', '3', '4', '1', '2'], '2'),
+    (2, 3, 0, ['2', '0', '1', '3', '4'], '2'),
+    (0, 2, 3, ['2', '3', '4', '0', '1'], '2'),
+    (0, 0, 5, ['0', '1', '2', '3', '4'], '2'),
+])
+def test_move(start, end, index, expected_items, expected_path):
+    playlist = Playlist()
+    playlist.insert_many(['0', '1', '2', '3', '4'], 0)
+    playlist.jump_to(2)
+    playlist.move(start, end, index)
+    assert list(playlist.items) == expected_items
+    assert playlist.current_path == expected_path
+    playlist.jump_next()
+    position = expected_items.index(expected_path)
+    assert playlist.current_path == expected_items[(position + 1) % 5]
+
+
+@pytest.mark.parametrize('start,end,index', [
+    (-1, 1, 0),
+    (0, 6, 0),
+    (2, 1, 0),
+    (0, 2, 4),
+    (0, 2, -1),
+])
+def test_move_out_of_bounds(start, end, index):
+    playlist = Playlist()
+    playlist.insert_many(['0', '1', '2', '3', '4'], 0)
+    with pytest.raises(IndexError):
+        playlist.move(start, end, index)
+
+
+def test_shuffle_is_reproducible_from_seed():
+    records = []
+    playlist = Playlist()
+    playlist.listeners.append(lambda op, args: records.append((op, args)))
+    playlist.items = [str(i) for i in range(100)]
+    playlist.shuffle()
+    assert records[-1][0] == 'shuffle'
+    other = Playlist()
+    other.items = [str(i) for i in range(100)]
+    other.shuffle(*records[-1][1])
+    assert other.items == playlist.items
+
+
+def test_randomizer_history_is_capped():
+    values = iter(range(100))
+    randomizer = Randomizer(lambda: next(values), size=3)
+    assert [randomizer.next() for _ in range(5)] == [0, 1, 2, 3, 4]
+    assert list(randomizer.history) == [2, 3, 4]
+    assert randomizer.prev() == 3
+    assert randomizer.prev() == 2
+    assert randomizer.prev() == 5
+    assert list(randomizer.history) == [5, 2, 3]
+    assert randomizer.next() == 2
+
+
+def test_random_history_round_trip():
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c', 'd']
+    playlist.random = True
+    for _ in range(5):
+        playlist.jump_next()
+    playlist.jump_prev()
+    random_state = playlist.random_state
+
+    restored = Playlist()
+    restored.items = ['a', 'b', 'c', 'd']
+    restored.random = True
+    restored.random_state = random_state
+    playlist.jump_prev()
+    restored.jump_prev()
+    assert restored.current_index == playlist.current_index
+    assert restored.random_history == playlist.random_history
+
+
+def test_random_jumps_can_be_replayed():
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c', 'd']
+    playlist.random = True
+    events = []
+    playlist.listeners.append(lambda op, args: events.append((op, args)))
+    for _ in range(3):
+        playlist.jump_next()
+    playlist.jump_prev()
+    playlist.jump_prev()
+    playlist.jump_prev()
+
+    replayed = Playlist()
+    replayed.items = ['a', 'b', 'c', 'd']
+    replayed.random = True
+    for op, args in events:
+        assert op == 'jump'
+        replayed.jump_to(*args)
+    assert replayed.current_index == playlist.current_index
+    assert replayed.random_history == playlist.random_history
+
+
+def test_clear_resets_random_history():
+    playlist = Playlist()
+    playlist.items = ['a', 'b']
+    playlist.random = True
+    playlist.jump_next()
+    playlist.clear()
+    assert playlist.random_history == ([], None)
+
+
+def test_random_playback_does_not_repeat():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(50)]
+    playlist.random = True
+    seen = []
+    for _ in range(50):
+        playlist.jump_next()
+        seen.append(playlist.current_index)
+    assert sorted(seen) == list(range(50))
+    for expected in reversed(seen[:-1]):
+        playlist.jump_prev()
+        assert playlist.current_index == expected
+
+
+def test_random_history_survives_edits():
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c', 'd', 'e']
+    playlist.random = True
+    for _ in range(3):
+        playlist.jump_next()
+    history = [playlist.items[i] for i in playlist.random_history[0]]
+    playlist.insert_many(['x', 'y'], 0)
+    playlist.move(0, 2, 3)
+    assert [playlist.items[i] for i in playlist.random_history[0]] == history
+    playlist.delete(playlist.items.index(history[0]))
+    indexes = playlist.random_history[0]
+    assert indexes[0] is None
+    assert [playlist.items[i] for i in indexes[1:]] == history[1:]
+    playlist.jump_prev()
+    assert playlist.current_path == history[1]
+
+
+def _play_round(playlist, count):
+    heard = []
+    for _ in range(count):
+        playlist.jump_next()
+        heard.append(playlist.current_path)
+    return heard
+
+
+def test_random_playback_does_not_repeat_across_edits():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(100)]
+    playlist.random = True
+    heard = _play_round(playlist, 50)
+    playlist.delete(playlist.items.index(heard[10]))
+    unheard = [path for path in playlist.items if path not in heard]
+    playlist.delete(playlist.items.index(unheard[0]))
+    playlist.insert_many(['x', 'y'], 3)
+    playlist.add('z')
+    playlist.move(0, 10, 40)
+    heard += _play_round(playlist, 52)
+    assert len(set(heard)) == len(heard)
+    assert set(playlist.items) <= set(heard)
+    playlist.jump_next()
+    assert playlist.current_path in heard
+
+
+def test_random_playback_searches_for_unheard_tracks(monkeypatch):
+    monkeypatch.setattr(RandomOrder, 'walk_limit', 0)
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(100)]
+    playlist.random = True
+    heard = _play_round(playlist, 40)
+    playlist.delete(playlist.items.index(heard[3]))
+    playlist.insert_many(['x', 'y'], 20)
+    playlist.move(50, 60, 0)
+    heard += _play_round(playlist, 62)
+    assert len(set(heard)) == len(heard)
+    assert set(playlist.items) <= set(heard)
+
+
+def test_random_playback_does_not_repeat_past_domain_growth():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(64)]
+    playlist.random = True
+    heard = _play_round(playlist, 30)
+    playlist.add('64')
+    heard += _play_round(playlist, 35)
+    assert sorted(heard) == sorted(playlist.items)
+
+
+def test_random_prev_skips_deleted_first_entry():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(10)]
+    playlist.random = True
+    heard = _play_round(playlist, 3)
+    playlist.jump_prev()
+    playlist.jump_prev()
+    assert playlist.random_history[1] == 0
+    playlist.delete(playlist.items.index(heard[0]))
+    playlist.jump_next()
+    assert playlist.current_path == heard[1]
+    playlist.jump_prev()
+    assert playlist.random_history[1] == 0
+    assert playlist.current_path not in heard
+
+
+def test_random_history_resolves_past_the_edit_log():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(10)]
+    playlist.random = True
+    heard = _play_round(playlist, 5)
+    for i in range(settings.RANDOM_EDIT_LOG_SIZE + 1):
+        playlist.insert('new{}'.format(i), 0)
+    assert [playlist.items[i] for i in playlist.random_history[0]] == heard
+
+
+def test_reseed():
+    playlist = Playlist()
+    playlist.items = [str(i) for i in range(20)]
+    records = []
+    playlist.listeners.append(lambda op, args: records.append((op, args)))
+    playlist.random = True
+    playlist.reseed()
+    op, args = records[-1]
+    assert op == 'reseed'
+    for _ in range(5):
+        playlist.jump_next()
+
+    other = Playlist()
+    other.items = [str(i) for i in range(20)]
+    other.random = True
+    other.reseed(*args)
+    for _ in range(5):
+        other.jump_next()
+    assert other.random_history == playlist.random_history
+
+
+def test_insertion_point_follows_other_edits():
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c', 'd']
+    point = InsertionPoint(playlist, 2)
+    playlist.insert_many(['1', '2'], point.index)
+    assert point.index == 4
+    playlist.delete(0)
+    assert point.index == 3
+    playlist.insert('x', 0)
+    assert point.index == 4
+    playlist.delete(5)
+    assert point.index == 4
+    playlist.insert_many(['3'], point.index)
+    assert list(playlist.items) == ['x', 'b', '1', '2', '3', 'c']
+    playlist.move(0, 2, 4)
+    assert list(playlist.items)[:point.index] == ['1', '2', '3']
+    playlist.clear()
+    assert point.index == 0
+    point.close()
+    assert playlist.listeners == []
+
+
+def test_insertion_point_is_clamped():
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c']
+    point = InsertionPoint(playlist, 3)
+    playlist.add('d')
+    assert point.index == 4
+    playlist.delete(3)
+    playlist.delete(2)
+    assert point.index == 2
+    with pytest.raises(IndexError):
+        InsertionPoint(playlist, 3)
@@ -0,0 +1,140 @@
+import asyncio
+import concurrent.futures
+import os
+from mpvmd import settings
+from mpvmd.server import scanner
+import pytest
+
+
+TREE = [
+    'a.mp3',
+    'B.MP3',
+    'cover.jpg',
+    'b/x.flac',
+    'b-1.mp3',
+    'b c/y.ogg',
+    'b/c/z.opus',
+    'b/c/ignored.txt',
+    'empty/',
+    'nested/deeper/deepest/track.wav',
+    'nested/track.m4a',
+    'żółw/track.mp3',
+]
+
+
+def _scan_reference(dir):
+    for entry in os.scandir(dir):
+        if entry.is_dir(follow_symlinks=False):
+            yield from _scan_reference(entry.path)
+        elif entry.name.lower().endswith(settings.EXTENSIONS):
+            yield entry.path
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for path in TREE:
+        full_path = tmp_path / path
+        if path.endswith('/'):
+            full_path.mkdir(parents=True)
+        else:
+            full_path.parent.mkdir(parents=True, exist_ok=True)
+            full_path.touch()
+    return str(tmp_path)
+
+
+@pytest.fixture(params=[1, 4])
+def executor(request):
+    with concurrent.futures.ThreadPoolExecutor(request.param) as executor:
+        yield executor
+
+
+def test_walk_matches_sorted_scan(tree, executor):
+    actual = list(scanner.Scanner(executor).walk(tree))
+    assert actual == sorted(_scan_reference(tree))
+    assert len(actual) == 9
+
+
+def test_scan_batches(tree, executor):
+    async def run():
+        return [
+            batch
+            async for batch in scanner.scan(tree, executor, batch_size=2)
+        ]
+
+    batches = asyncio.run(run())
+    assert [len(batch) for batch in batches] == [2, 2, 2, 2, 1]
+    assert sum(batches, []) == sorted(_scan_reference(tree))
+
+
+def test_walk_missing_dir(tmp_path, executor):
+    with pytest.raises(FileNotFoundError):
+        list(scanner.Scanner(executor).walk(str(tmp_path / 'missing')))
+
+
+def test_cache_reuses_unchanged_dirs(tree, executor, monkeypatch):
+    monkeypatch.setattr(settings, 'SCAN_CACHE_MTIME_SLACK', -10 ** 12)
+    cache = scanner.ScanCache()
+    expected = list(scanner.Scanner(executor, cache).walk(tree))
+    assert len(cache) == 9
+
+    listed = []
+    original_list_dir = scanner._list_dir
+    monkeypatch.setattr(
+        scanner,
+        '_list_dir',
+        lambda path: listed.append(path) or original_list_dir(path))
+    assert list(scanner.Scanner(executor, cache).walk(tree)) == expected
+    assert listed == []
+
+    os.mkdir(os.path.join(tree, 'b', 'new'))
+    with open(os.path.join(tree, 'b', 'new', 'new.mp3'), 'w'):
+        pass
+    stat = os.stat(os.path.join(tree, 'b'))
+    os.utime(
+        os.path.join(tree, 'b'),
+        ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    actual = list(scanner.Scanner(executor, cache).walk(tree))
+    assert actual == sorted(_scan_reference(tree))
+    assert sorted(listed) == [
+        os.path.join(tree, 'b'), os.path.join(tree, 'b', 'new')]
+
+
+def test_cache_skips_recently_modified_dirs(tree, executor):
+    cache = scanner.ScanCache()
+    list(scanner.Scanner(executor, cache).walk(tree))
+    assert len(cache) == 0
+
+
+def test_cache_invalidate(tree, executor, monkeypatch):
+    monkeypatch.setattr(settings, 'SCAN_CACHE_MTIME_SLACK', -10 ** 12)
+    cache = scanner.ScanCache()
+    list(scanner.Scanner(executor, cache).walk(tree))
+    assert cache.invalidate([os.path.join(tree, 'b')]) == 2
+    assert cache.invalidate([os.path.join(tree, 'nested') + os.sep]) == 3
+    assert cache.invalidate() == 4
+    assert len(cache) == 0
+
+
+def test_cache_persistence(tree, executor, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SCAN_CACHE_MTIME_SLACK', -10 ** 12)
+    path = str(tmp_path / 'cache' / 'scan.dat')
+    cache = scanner.ScanCache(path)
+
+    async def run():
+        return [
+            batch
+            async for batch in scanner.scan(tree, executor, cache)
+        ]
+
+    asyncio.run(run())
+    cache.save()
+
+    loaded = scanner.ScanCache(path)
+    loaded.load()
+    assert len(loaded) == len(cache) == 9
+    assert loaded.roots == {tree}
+
+    monkeypatch.setattr(settings, 'EXTENSIONS', ('.mp3',))
+    outdated = scanner.ScanCache(path)
+    outdated.load()
+    assert len(outdated) == 0
@@ -0,0 +1,224 @@
+import asyncio
+import pytest
+from mpvmd.server import scheduler
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_round_robin_between_clients():
+    async def run():
+        sched = scheduler.Scheduler(concurrency=1, reserved=0)
+        order = []
+        gate = asyncio.Event()
+
+        def work(label):
+            async def run_work():
+                await gate.wait()
+                order.append(label)
+            return run_work
+
+        futures = [sched.submit('a', scheduler.BULK, work('a1'))]
+        futures += [
+            sched.submit('a', scheduler.BULK, work('a{}'.format(i)))
+            for i in range(2, 5)
+        ]
+        futures += [
+            sched.submit('b', scheduler.BULK, work('b{}'.format(i)))
+            for i in range(1, 3)
+        ]
+        gate.set()
+        await asyncio.gather(*futures)
+        return order
+
+    assert _run(run()) == ['a1', 'a2', 'b1', 'a3', 'b2', 'a4']
+
+
+def test_interactive_jumps_ahead():
+    async def run():
+        sched = scheduler.Scheduler(concurrency=1, reserved=0)
+        order = []
+        gate = asyncio.Event()
+
+        def work(label):
+            async def run_work():
+                await gate.wait()
+                order.append(label)
+            return run_work
+
+        futures = [
+            sched.submit('flood', scheduler.BULK, work(i))
+            for i in range(5)
+        ]
+        futures.append(
+            sched.submit('hotkey', scheduler.INTERACTIVE, work('pause')))
+        gate.set()
+        await asyncio.gather(*futures)
+        return order
+
+    assert _run(run()) == [0, 'pause', 1, 2, 3, 4]
+
+
+def test_reserved_slots_are_kept_for_interactive():
+    async def run():
+        sched = scheduler.Scheduler(concurrency=3, reserved=1)
+        gate = asyncio.Event()
+
+        async def block():
+            await gate.wait()
+
+        async def pause():
+            return 'paused'
+
+        bulk = [sched.submit('flood', scheduler.BULK, block) for _ in range(5)]
+        assert sched.running == 2
+        result = await sched.submit('hotkey', scheduler.INTERACTIVE, pause)
+        gate.set()
+        await asyncio.gather(*bulk)
+        return result
+
+    assert _run(run()) == 'paused'
+
+
+def test_result_and_exception_are_forwarded():
+    async def run():
+        sched = scheduler.Scheduler()
+
+        async def fail():
+            raise ValueError('boom')
+
+        async def succeed():
+            return 5
+
+        assert await sched.submit('a', scheduler.BULK, succeed) == 5
+        with pytest.raises(ValueError):
+            await sched.submit('a', scheduler.BULK, fail)
+        assert sched.in_flight == 0
+        assert sched.running == 0
+
+    _run(run())
+
+
+def test_client_limit():
+    async def run():
+        sched = scheduler.Scheduler(max_client_in_flight=2)
+        gate = asyncio.Event()
+
+        async def block():
+            await gate.wait()
+
+        futures = [sched.submit('a', scheduler.BULK, block) for _ in range(2)]
+        with pytest.raises(scheduler.Busy):
+            sched.submit('a', scheduler.INTERACTIVE, block)
+        futures.append(sched.submit('b', scheduler.BULK, block))
+        gate.set()
+        await asyncio.gather(*futures)
+        futures = [sched.submit('a', scheduler.BULK, block)]
+        await asyncio.gather(*futures)
+
+    _run(run())
+
+
+def test_global_limit_spares_interactive():
+    async def run():
+        sched = scheduler.Scheduler(max_in_flight=3)
+        gate = asyncio.Event()
+
+        async def block():
+            await gate.wait()
+
+        futures = [
+            sched.submit(client, scheduler.BULK, block)
+            for client in 'abc'
+        ]
+        with pytest.raises(scheduler.Busy):
+            sched.submit('d', scheduler.BULK, block)
+        futures.append(sched.submit('d', scheduler.INTERACTIVE, block))
+        gate.set()
+        await asyncio.gather(*futures)
+
+    _run(run())
+
+
+def test_exclusive_items_do_not_hold_slots():
+    async def run():
+        sched = scheduler.Scheduler(concurrency=3, reserved=1)
+        gate = asyncio.Event()
+        order = []
+
+        def work(label):
+            async def run_work():
+                order.append(label)
+                await gate.wait()
+            return run_work
+
+        futures = [
+            sched.submit('a', scheduler.BULK, work('a{}'.format(i)), True)
+            for i in range(6)
+        ]
+        futures.append(sched.submit('b', scheduler.BULK, work('b')))
+        await asyncio.sleep(0)
+        running = sched.running
+        gate.set()
+        await asyncio.gather(*futures)
+        return running, order
+
+    running, order = _run(run())
+    assert running == 2
+    assert order[:2] == ['a0', 'b']
+    assert [label for label in order if label != 'b'] == [
+        'a{}'.format(i) for i in range(6)]
+
+
+def test_exclusive_items_run_one_at_a_time():
+    async def run():
+        sched = scheduler.Scheduler()
+        active = 0
+        peak = 0
+
+        async def mutate():
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.001)
+            active -= 1
+
+        await asyncio.gather(*(
+            sched.submit('a', scheduler.BULK, mutate, True)
+            for _ in range(5)))
+        return peak
+
+    assert _run(run()) == 1
+
+
+def test_exclusive_items_keep_order_across_classes():
+    async def run():
+        sched = scheduler.Scheduler(concurrency=2, reserved=1)
+        gate = asyncio.Event()
+        order = []
+
+        def work(label):
+            async def run_work():
+                order.append(label)
+                await gate.wait()
+            return run_work
+
+        futures = [sched.submit('flood', scheduler.BULK, work('flood'))]
+        futures.append(
+            sched.submit('a', scheduler.BULK, work('remove'), True))
+        futures.append(
+            sched.submit('a', scheduler.INTERACTIVE, work('jump'), True))
+        futures.append(
+            sched.submit('a', scheduler.INTERACTIVE, work('info')))
+        futures.append(
+            sched.submit('b', scheduler.INTERACTIVE, work('pause')))
+        await asyncio.sleep(0)
+        started = list(order)
+        gate.set()
+        await asyncio.gather(*futures)
+        return started, order
+
+    started, order = _run(run())
+    assert started == ['flood', 'pause']
+    assert order == ['flood', 'pause', 'remove', 'jump', 'info']
@@ -0,0 +1,345 @@
+import asyncio
+import os
+import pytest
+from mpvmd import connection, settings, transport
+from mpvmd.client import __main__ as client
+from mpvmd.server import player, scanner, scheduler
+from mpvmd.server import __main__ as server
+
+
+class FakePlayer:
+    def __init__(self, loop, factory, on_event, is_empty) -> None:
+        self.loop = loop
+        self.calls = []
+        self.properties = {}
+        self.error = None
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def call(self, name, *args) -> asyncio.Future:
+        self.calls.append((name, *args))
+        future = self.loop.create_future()
+        if self.error is not None:
+            future.set_exception(self.error)
+        elif name == 'get_property':
+            future.set_result(self.properties.get(args[0]))
+        else:
+            future.set_result(None)
+        return future
+
+
+@pytest.fixture
+def make_state(monkeypatch, tmp_path):
+    monkeypatch.setattr(player, 'Player', FakePlayer)
+    states = []
+
+    def make_state():
+        state = server.State(
+            asyncio.get_event_loop(),
+            scanner.ScanCache(str(tmp_path / 'scan.dat')))
+        states.append(state)
+        return state
+
+    yield make_state
+    for state in states:
+        state.scan_executor.shutdown()
+
+
+def test_waiters_are_dropped_after_load(make_state):
+    async def run():
+        state = make_state()
+        for _ in range(5):
+            task = asyncio.ensure_future(state.play('a.mp3'))
+            while not state._waiters:
+                await asyncio.sleep(0)
+            state._resolve('file-loaded')
+            await task
+        return state._waiters
+
+    assert asyncio.run(run()) == {}
+
+
+def test_waiters_are_dropped_after_timeout(make_state, monkeypatch):
+    monkeypatch.setattr(settings, 'MPV_EVENT_TIMEOUT', 0.01)
+
+    async def run():
+        state = make_state()
+        await state.play('a.mp3')
+        await state.seek('10', 'absolute')
+        state.properties['path'] = 'a.mp3'
+        await state.stop_playback()
+        return state._waiters
+
+    assert asyncio.run(run()) == {}
+
+
+def test_waiters_are_dropped_after_failure(make_state):
+    async def run():
+        state = make_state()
+        state._player.error = RuntimeError('mpv is gone')
+        with pytest.raises(RuntimeError):
+            await state.play('a.mp3')
+        with pytest.raises(RuntimeError):
+            await state.seek('10', 'absolute')
+        return state._waiters
+
+    assert asyncio.run(run()) == {}
+
+
+class RecordingConnection:
+    def __init__(self) -> None:
+        self.sent = []
+
+    async def write(self, message) -> None:
+        self.sent.append(message)
+
+    async def read(self):
+        return {'status': 'error', 'code': 'Test', 'msg': 'stop here'}
+
+
+def _mpvmc_batch(request):
+    conn = RecordingConnection()
+
+    async def run():
+        with pytest.raises(client.ApiError):
+            await client.run_with_info(conn, request)
+
+    asyncio.run(run())
+    return conn.sent[0]
+
+
+@pytest.mark.parametrize('request_,expected', [
+    ({'msg': 'pause'}, scheduler.INTERACTIVE),
+    ({'msg': 'playlist-next'}, scheduler.INTERACTIVE),
+    ({'msg': 'seek', 'where': '+5'}, scheduler.INTERACTIVE),
+    ({'msg': 'playlist-add', 'files': ['a.mp3']}, scheduler.BULK),
+    ({'msg': 'info'}, scheduler.BULK),
+])
+def test_mpvmc_batch_priority(request_, expected):
+    batch = _mpvmc_batch(request_)
+    assert batch['msg'] == 'batch'
+    assert server._priority(batch) == expected
+
+
+def test_batch_priority_is_not_raised_by_one_command():
+    assert server._priority({'msg': 'batch', 'requests': [
+        {'msg': 'pause'}, {'msg': 'playlist-info'}, {'msg': 'info'},
+    ]}) == scheduler.BULK
+
+
+class FrameConnection(connection.Connection):
+    def __init__(self, codec=transport.JSON) -> None:
+        super().__init__(None, None)
+        self.codec = codec
+        self.frames = []
+
+    async def write_frame(self, frame: bytes) -> None:
+        self.frames.append(frame)
+
+    def messages(self):
+        return [
+            self.codec.decode(memoryview(frame)[4:]) for frame in self.frames]
+
+
+SURROGATE_PATH = os.fsdecode(b'/music/caf\xe9.mp3')
+
+
+def test_info_keeps_surrogate_paths(make_state):
+    async def run():
+        state = make_state()
+        state._property_changed('path', SURROGATE_PATH)
+        conn = FrameConnection(transport.MSGPACK)
+        await server._serve_info(conn, state, {'msg': 'info', 'id': 1})
+        return conn.messages()
+
+    [response] = asyncio.run(run())
+    assert response['status'] == 'ok'
+    assert response['path'] == SURROGATE_PATH
+
+
+@pytest.mark.parametrize('codec', [transport.JSON, transport.MSGPACK])
+def test_info_answers_encode_failures(make_state, codec):
+    async def run():
+        state = make_state()
+        state._property_changed('metadata', {'title': object()})
+        conn = FrameConnection(codec)
+        await server._serve_info(conn, state, {'msg': 'info', 'id': 7})
+        return conn.messages()
+
+    [response] = asyncio.run(run())
+    assert response['status'] == 'error'
+    assert response['id'] == 7
+
+
+def test_playlist_stream_keeps_surrogate_paths(make_state):
+    async def run():
+        state = make_state()
+        state.playlist.add(SURROGATE_PATH)
+        conn = FrameConnection(transport.MSGPACK)
+        await server._stream_playlist(
+            conn, state, {'msg': 'playlist-info', 'id': 1})
+        return conn.messages()
+
+    [chunk] = asyncio.run(run())
+    assert chunk['paths'] == [SURROGATE_PATH]
+
+
+def test_playlist_stream_answers_encode_failures(make_state):
+    async def run():
+        state = make_state()
+        state.playlist.add('a.mp3')
+        # a lone high surrogate is not a surrogate escape of any byte
+        state.playlist.add('b\ud800.mp3')
+        conn = FrameConnection(transport.MSGPACK)
+        await server._stream_playlist(conn, state, {
+            'msg': 'playlist-info', 'id': 3, 'chunk-size': 1})
+        return conn.messages()
+
+    first, error = asyncio.run(run())
+    assert first['paths'] == ['a.mp3'] and first['more']
+    assert error['status'] == 'error'
+    assert error['id'] == 3
+
+
+async def _info(state, conn, request=None):
+    await server._serve_info(conn, state, request or {'msg': 'info'})
+    return conn.messages()[-1]
+
+
+def test_info_cache_follows_playlist_changes(make_state):
+    async def run():
+        state = make_state()
+        conn = FrameConnection()
+        assert (await _info(state, conn))['playlist-size'] == 0
+        state.playlist.add('a.mp3')
+        state.playlist.add('b.mp3')
+        assert (await _info(state, conn))['playlist-size'] == 2
+        state.playlist.jump_to(1)
+        assert (await _info(state, conn))['playlist-pos'] == 1
+        state.playlist.delete(0)
+        info = await _info(state, conn)
+        assert (info['playlist-size'], info['playlist-pos']) == (1, 0)
+        state.playlist.random = True
+        assert (await _info(state, conn))['random'] is True
+
+    asyncio.run(run())
+
+
+def test_info_cache_follows_property_changes(make_state):
+    async def run():
+        state = make_state()
+        conn = FrameConnection()
+        projected = {'msg': 'info', 'fields': ['volume', 'metadata']}
+        assert (await _info(state, conn))['volume'] is None
+        assert await _info(state, conn, projected) == {
+            'status': 'ok', 'volume': None, 'metadata': {}}
+        state._property_changed('volume', 30.0)
+        assert (await _info(state, conn))['volume'] == 30.0
+        assert (await _info(state, conn, projected))['volume'] == 30.0
+        state._property_changed('metadata', {'title': 'Song'})
+        assert (await _info(state, conn))['metadata'] == {'title': 'Song'}
+        assert (await _info(state, conn, projected))['metadata'] == {
+            'title': 'Song'}
+        state._property_changed('pause', True)
+        assert (await _info(state, conn))['paused'] is True
+
+    asyncio.run(run())
+
+
+def test_info_cache_follows_time_pos(make_state, monkeypatch):
+    monkeypatch.setattr(settings, 'TIME_POS_MAX_AGE', -1)
+
+    async def run():
+        state = make_state()
+        state._property_changed('path', 'a.mp3')
+        state._property_changed('pause', False)
+        conn = FrameConnection()
+        state._player.properties['time-pos'] = 2.5
+        assert (await _info(state, conn))['time-pos'] == 2
+        # the frame is reused while the position stays within the second
+        state._player.properties['time-pos'] = 2.9
+        assert (await _info(state, conn))['time-pos'] == 2
+        assert conn.frames[1] is conn.frames[0]
+        state._player.properties['time-pos'] = 3.1
+        assert (await _info(state, conn))['time-pos'] == 3
+        # a paused player is not asked again
+        state._property_changed('pause', True)
+        state._player.properties['time-pos'] = 10.0
+        assert (await _info(state, conn))['time-pos'] == 3
+        state._property_changed('time-pos', 4.0)
+        assert (await _info(state, conn))['time-pos'] == 4
+
+    asyncio.run(run())
+
+
+def _playlist_state(state):
+    playlist = state.playlist
+    random_state = dict(playlist.random_state)
+    random_state['played'] = list(random_state['played'])
+    return {
+        'items': list(playlist.items),
+        'index': playlist.current_index,
+        'random': playlist.random,
+        'loop': playlist.loop,
+        'random-state': random_state,
+        'random-history': playlist.random_history,
+    }
+
+
+def _next_paths(state, count):
+    paths = []
+    for _ in range(count):
+        state.playlist.jump_next()
+        paths.append(state.playlist.current_path)
+    return paths
+
+
+def test_journal_replay_restores_the_playlist(make_state, tmp_path):
+    db_path = str(tmp_path / 'db' / 'mpvmd.db')
+
+    async def start():
+        state = make_state()
+        await server.open_journal(
+            state, db_path, await server.load_db(state, db_path))
+        return state
+
+    async def run():
+        state = await start()
+        playlist = state.playlist
+        for name in 'abcdefgh':
+            playlist.add(name + '.mp3')
+        await server.snapshot_db(state, db_path)
+        # everything below lives only in the journal
+        playlist.random = True
+        playlist.reseed(7)
+        playlist.insert('x.mp3', 2)
+        playlist.insert_many(['y.mp3', 'z.mp3'], 0)
+        _next_paths(state, 4)
+        playlist.delete(3)
+        playlist.move(1, 3, 6)
+        playlist.jump_prev()
+        playlist.jump_to(5)
+        playlist.loop = True
+        _next_paths(state, 2)
+        expected = _playlist_state(state)
+        # the daemon dies in the middle of writing the next record
+        state.journal.close()
+        path = '{}.journal.{}'.format(db_path, state.journal.generation)
+        state.journal = None
+        with open(path, 'ab') as handle:
+            handle.write(b'\x40\x00\x00\x00\x80\x05')
+
+        recovered = await start()
+        assert _playlist_state(recovered) == expected
+        # the replay was saved as a snapshot, so a second start agrees
+        reloaded = await start()
+        assert _playlist_state(reloaded) == expected
+        expected_paths = _next_paths(state, 12)
+        assert _next_paths(recovered, 12) == expected_paths
+        assert _next_paths(reloaded, 12) == expected_paths
+
+    asyncio.run(run())
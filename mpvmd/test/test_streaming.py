@@ -0,0 +1,45 @@
+import asyncio
+from mpvmd.server import streaming
+from mpvmd.server.playlist import Playlist
+
+
+class FakeConnection:
+    def __init__(self):
+        self.messages = []
+
+    async def write(self, message):
+        self.messages.append(message)
+
+
+def _stream(request_id=None):
+    playlist = Playlist()
+    playlist.items = ['a', 'b', 'c', 'd', 'e']
+    conn = FakeConnection()
+    asyncio.run(streaming.stream_playlist(
+        conn, playlist, range(1, 5), 3, request_id))
+    return conn.messages
+
+
+def test_stream_playlist():
+    assert _stream() == [
+        {
+            'status': 'ok',
+            'offset': 1,
+            'playlist-size': 5,
+            'paths': ['b', 'c', 'd'],
+            'more': True,
+        },
+        {
+            'status': 'ok',
+            'offset': 4,
+            'playlist-size': 5,
+            'paths': ['e'],
+            'more': False,
+        },
+    ]
+
+
+def test_stream_playlist_echoes_id():
+    messages = _stream(request_id=7)
+    assert len(messages) == 2
+    assert all(message['id'] == 7 for message in messages)
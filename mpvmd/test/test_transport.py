@@ -0,0 +1,289 @@
+import asyncio
+import os
+import socket
+import struct
+from mpvmd import connection, settings, transport
+import pytest
+
+
+class FakeWriter:
+    def __init__(self):
+        self.calls = []
+
+    def write(self, data):
+        self.calls.append(bytes(data))
+
+    async def drain(self):
+        pass
+
+
+def _read(chunks, **kwargs):
+    async def run():
+        reader = asyncio.StreamReader()
+        for chunk in chunks:
+            reader.feed_data(chunk)
+        reader.feed_eof()
+        return await transport.read(reader, **kwargs)
+    return asyncio.run(run())
+
+
+def _frame(body: bytes) -> bytes:
+    return struct.pack('<I', len(body)) + body
+
+
+def test_write_single_call():
+    writer = FakeWriter()
+    asyncio.run(transport.write(writer, {'msg': 'info', 'raw': b'x'}))
+    assert writer.calls == [_frame(b'{"msg": "info", "raw": "x"}')]
+
+
+@pytest.mark.parametrize('codec', [transport.JSON, transport.MSGPACK])
+def test_write_frame(codec):
+    frame = transport.encode_frame({'status': 'ok', 'path': 'żółw'}, codec)
+    writer = FakeWriter()
+    asyncio.run(transport.write_frame(writer, frame))
+    assert writer.calls == [frame]
+    assert _read([frame], codec=codec) == {'status': 'ok', 'path': 'żółw'}
+
+
+def test_read_eof():
+    assert _read([]) is None
+
+
+def test_read_split_header_and_body():
+    frame = _frame('{"path": "żółw"}'.encode('utf-8'))
+    assert _read([frame[i:i + 1] for i in range(len(frame))]) == {
+        'path': 'żółw'}
+
+
+def test_read_consecutive_frames():
+    async def run():
+        reader = asyncio.StreamReader()
+        reader.feed_data(_frame(b'{"a": 1}') + _frame(b'{"b": 2}'))
+        reader.feed_eof()
+        return [
+            await transport.read(reader),
+            await transport.read(reader),
+            await transport.read(reader),
+        ]
+    assert asyncio.run(run()) == [{'a': 1}, {'b': 2}, None]
+
+
+@pytest.mark.parametrize('data', [
+    b'\x01',
+    b'\x01\x00\x00',
+    _frame(b'{"a": 1}')[:-1],
+])
+def test_read_truncated(data):
+    with pytest.raises(ConnectionResetError):
+        _read([data])
+
+
+def test_read_too_large():
+    with pytest.raises(transport.FrameError):
+        _read([_frame(b'{"a": 1}')], max_size=4)
+
+
+@pytest.mark.parametrize('codec', [transport.JSON, transport.MSGPACK])
+def test_codec_round_trip(codec):
+    message = {'status': 'ok', 'paths': ['a', 'żółw'], 'pos': None}
+
+    async def run():
+        writer = FakeWriter()
+        await transport.write(writer, message, codec=codec)
+        reader = asyncio.StreamReader()
+        reader.feed_data(b''.join(writer.calls))
+        reader.feed_eof()
+        return await transport.read(reader, codec=codec)
+
+    assert asyncio.run(run()) == message
+
+
+@pytest.mark.parametrize('offered,expected', [
+    ([], 'json'),
+    (['json'], 'json'),
+    (['unknown'], 'json'),
+    (['msgpack'], 'msgpack'),
+    (['msgpack', 'json'], 'msgpack'),
+    (['json', 'msgpack'], 'json'),
+    (['unknown', 'msgpack', 'json'], 'msgpack'),
+])
+def test_select_codec(offered, expected, monkeypatch):
+    monkeypatch.setattr(transport, 'PREFERRED_CODECS', ['msgpack', 'json'])
+    assert transport.select_codec(offered).name == expected
+
+
+def test_select_codec_without_msgpack(monkeypatch):
+    monkeypatch.setattr(transport, 'PREFERRED_CODECS', ['json'])
+    assert transport.select_codec(['msgpack', 'json']).name == 'json'
+    assert transport.select_codec(['msgpack']).name == 'msgpack'
+
+
+def test_msgpack_codec_fallback(monkeypatch):
+    monkeypatch.setattr(transport, 'msgpack', None)
+    message = {'status': 'ok', 'volume': 50.0}
+    data = transport.MSGPACK.encode(message)
+    assert transport.MSGPACK.decode(memoryview(data)) == message
+
+
+@pytest.mark.parametrize('fallback', [False, True])
+@pytest.mark.parametrize('codec', [transport.JSON, transport.MSGPACK])
+def test_codec_keeps_surrogate_escapes(codec, fallback, monkeypatch):
+    if fallback:
+        monkeypatch.setattr(transport, 'msgpack', None)
+    path = os.fsdecode(b'/music/caf\xe9.mp3')
+    data = codec.encode({'paths': [path]})
+    assert codec.decode(memoryview(data)) == {'paths': [path]}
+
+
+@pytest.mark.parametrize('hello_response,expected', [
+    ({'status': 'error', 'code': 'ValueError', 'msg': 'Invalid operation'},
+     'json'),
+    ({'status': 'ok', 'codec': 'msgpack'}, 'msgpack'),
+])
+def test_negotiate(hello_response, expected):
+    async def handler(reader, writer):
+        request = await transport.read(reader)
+        assert request['msg'] == 'hello'
+        assert request['codecs'] == transport.PREFERRED_CODECS
+        await transport.write(writer, hello_response)
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        conn = connection.Connection(
+            *await asyncio.open_connection('127.0.0.1', port))
+        await conn.negotiate()
+        conn.close()
+        server.close()
+        await server.wait_closed()
+        return conn.codec.name
+
+    assert asyncio.run(run()) == expected
+
+
+def test_negotiate_requested_codec():
+    async def handler(reader, writer):
+        request = await transport.read(reader)
+        codec = transport.select_codec(request['codecs'])
+        await transport.write(writer, {'status': 'ok', 'codec': codec.name})
+        writer.close()
+
+    async def run():
+        server = await asyncio.start_server(handler, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        conn = connection.Connection(
+            *await asyncio.open_connection('127.0.0.1', port))
+        await conn.negotiate(['msgpack'])
+        conn.close()
+        server.close()
+        await server.wait_closed()
+        return conn.codec.name
+
+    assert asyncio.run(run()) == 'msgpack'
+
+
+@pytest.mark.parametrize('codec', [transport.JSON, transport.MSGPACK])
+def test_blocking_round_trip(codec):
+    left, right = socket.socketpair()
+    with left, right:
+        transport.write_blocking(left, {'msg': 'info', 'path': 'żółw'}, codec)
+        transport.write_blocking(left, {'msg': 'stop'}, codec)
+        left.shutdown(socket.SHUT_WR)
+        assert transport.read_blocking(right, codec=codec) == {
+            'msg': 'info', 'path': 'żółw'}
+        assert transport.read_blocking(right, codec=codec) == {
+            'msg': 'stop'}
+        assert transport.read_blocking(right, codec=codec) is None
+
+
+def test_blocking_read_truncated():
+    left, right = socket.socketpair()
+    with left, right:
+        left.sendall(_frame(b'{"a": 1}')[:-1])
+        left.shutdown(socket.SHUT_WR)
+        with pytest.raises(ConnectionResetError):
+            transport.read_blocking(right)
+
+
+def test_connect_blocking_prefers_unix_socket(tmp_path):
+    path = str(tmp_path / 'mpvmd.sock')
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(path)
+    listener.listen(1)
+    with listener:
+        with transport.connect_blocking(path, '127.0.0.1', 1) as sock:
+            assert sock.family == socket.AF_UNIX
+
+
+def test_connect_blocking_falls_back_to_tcp(tmp_path):
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1)
+    with listener:
+        with transport.connect_blocking(
+                str(tmp_path / 'missing.sock'),
+                '127.0.0.1',
+                listener.getsockname()[1]) as sock:
+            assert sock.family == socket.AF_INET
+
+
+def test_prepare_socket_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SOCKET_DIR', str(tmp_path / 'mpvmd'))
+    path = str(tmp_path / 'mpvmd' / 'mpvmd.sock')
+    assert transport.prepare_socket_path(path) == path
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    transport.prepare_socket_path(path)
+    assert not os.path.exists(path)
+
+    listener = socket.socket(socket.AF_UNIX)
+    listener.bind(path)
+    listener.listen(1)
+    with listener:
+        with pytest.raises(FileExistsError):
+            transport.prepare_socket_path(path)
+
+
+def test_prepare_socket_path_leaves_other_directories_alone(
+        tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SOCKET_DIR', str(tmp_path / 'mpvmd'))
+    os.chmod(str(tmp_path), 0o755)
+    path = str(tmp_path / 'x.sock')
+    assert transport.prepare_socket_path(path) == path
+    assert os.stat(str(tmp_path)).st_mode & 0o777 == 0o755
+    assert not os.path.exists(str(tmp_path / 'mpvmd'))
+
+
+def test_prepare_socket_path_absolutizes(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, 'SOCKET_DIR', None)
+    monkeypatch.chdir(str(tmp_path))
+    assert transport.prepare_socket_path('x.sock') == str(tmp_path / 'x.sock')
+
+
+def test_connection_serializes_drain():
+    class SlowWriter(FakeWriter):
+        draining = False
+
+        async def drain(self):
+            assert not self.draining
+            self.draining = True
+            await asyncio.sleep(0)
+            self.draining = False
+
+    async def run():
+        writer = SlowWriter()
+        conn = connection.Connection(None, writer)
+        await asyncio.gather(*(
+            conn.write({'id': i, 'status': 'ok'}) for i in range(10)))
+        return writer.calls
+
+    calls = asyncio.run(run())
+    assert calls == [
+        _frame('{{"id": {}, "status": "ok"}}'.format(i).encode())
+        for i in range(10)
+    ]
@@ -1,6 +1,21 @@
 import json
+import os
+import socket
 import struct
-from typing import Any, Optional, Dict
+from typing import Any, Optional, Dict, List
+from mpvmd import settings
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+_HEADER = struct.Struct('<I')
+
+
+class FrameError(ValueError):
+    pass
 
 
 def _serializer(obj: Any) -> Any:
@@ -9,22 +24,184 @@ def _serializer(obj: Any) -> Any:
     raise TypeError('Type not serializable')
 
 
-async def read(reader) -> Optional[Dict]:
-    data_size_raw = await reader.read(4)
-    if not data_size_raw:
-        return None
-    data_size = struct.unpack('<I', data_size_raw)[0]
-    data = b''
-    while len(data) < data_size:
-        chunk = await reader.read(data_size)
+class Codec:
+    name = ''
+
+    def encode(self, message: Dict) -> bytes:
+        raise NotImplementedError()
+
+    def decode(self, data: memoryview) -> Dict:
+        raise NotImplementedError()
+
+
+class JsonCodec(Codec):
+    name = 'json'
+
+    def encode(self, message: Dict) -> bytes:
+        return json.dumps(message, default=_serializer).encode('utf-8')
+
+    def decode(self, data: memoryview) -> Dict:
+        return json.loads(str(data, 'utf-8'))
+
+
+class MsgpackCodec(Codec):
+    # paths that are not valid UTF-8 arrive with surrogate escapes; keep
+    # them through a round trip, as the JSON codec does
+    name = 'msgpack'
+
+    def encode(self, message: Dict) -> bytes:
+        if msgpack:
+            return msgpack.packb(
+                message, use_bin_type=False, unicode_errors='surrogateescape')
+        from mpvmd import packer
+        return packer.pack(message)
+
+    def decode(self, data: memoryview) -> Dict:
+        if msgpack:
+            return msgpack.unpackb(
+                data, raw=False, unicode_errors='surrogateescape')
+        from mpvmd import packer
+        return packer.unpack(data)
+
+
+JSON = JsonCodec()
+MSGPACK = MsgpackCodec()
+
+CODECS: Dict[str, Codec] = {codec.name: codec for codec in [JSON, MSGPACK]}
+
+# the pure Python msgpack fallback is slower than the C json module, so
+# only offer msgpack when the C extension is available
+PREFERRED_CODECS: List[str] = ['msgpack', 'json'] if msgpack else ['json']
+
+
+def select_codec(offered: List[str]) -> Codec:
+    for name in offered:
+        if name in PREFERRED_CODECS:
+            return CODECS[name]
+    # a peer that asks only for codecs this side would not offer, such as
+    # msgpack without the C extension, still gets one it can be spoken to in
+    for name in offered:
+        if name in CODECS:
+            return CODECS[name]
+    return JSON
+
+
+async def _read_into(reader, view: memoryview) -> int:
+    pos = 0
+    while pos < len(view):
+        chunk = await reader.read(len(view) - pos)
         if not chunk:
-            raise ConnectionResetError()
-        data += chunk
-    return json.loads(data.decode('utf-8'))
+            break
+        view[pos:pos + len(chunk)] = chunk
+        pos += len(chunk)
+    return pos
+
+
+def _check_frame_size(header: memoryview, max_size: Optional[int]) -> int:
+    if max_size is None:
+        max_size = settings.MAX_FRAME_SIZE
+    data_size = _HEADER.unpack(header)[0]
+    if data_size > max_size:
+        raise FrameError(
+            'Frame too large ({} > {} bytes)'.format(data_size, max_size))
+    return data_size
+
+
+async def read(
+        reader,
+        max_size: Optional[int] = None,
+        codec: Codec = JSON) -> Optional[Dict]:
+    header = memoryview(bytearray(_HEADER.size))
+    received = await _read_into(reader, header)
+    if not received:
+        return None
+    if received < len(header):
+        raise ConnectionResetError()
+
+    data_size = _check_frame_size(header, max_size)
+    data = memoryview(bytearray(data_size))
+    if await _read_into(reader, data) < data_size:
+        raise ConnectionResetError()
+    return codec.decode(data)
+
+
+def _recv_into(sock, view: memoryview) -> int:
+    pos = 0
+    while pos < len(view):
+        received = sock.recv_into(view[pos:])
+        if not received:
+            break
+        pos += received
+    return pos
+
+
+def read_blocking(
+        sock,
+        max_size: Optional[int] = None,
+        codec: Codec = JSON) -> Optional[Dict]:
+    header = memoryview(bytearray(_HEADER.size))
+    received = _recv_into(sock, header)
+    if not received:
+        return None
+    if received < len(header):
+        raise ConnectionResetError()
 
+    data_size = _check_frame_size(header, max_size)
+    data = memoryview(bytearray(data_size))
+    if _recv_into(sock, data) < data_size:
+        raise ConnectionResetError()
+    return codec.decode(data)
 
-async def write(writer, message: Dict):
-    data = json.dumps(message, default=_serializer).encode('utf-8')
-    writer.write(struct.pack('<I', len(data)))
-    writer.write(data)
+
+def write_blocking(sock, message: Dict, codec: Codec = JSON) -> None:
+    sock.sendall(encode_frame(message, codec))
+
+
+def connect_blocking(
+        socket_path: Optional[str], host: str, port: int) -> socket.socket:
+    if socket_path and hasattr(socket, 'AF_UNIX'):
+        sock = socket.socket(socket.AF_UNIX)
+        try:
+            sock.connect(socket_path)
+            return sock
+        except OSError:
+            sock.close()
+    return socket.create_connection((host, port))
+
+
+def prepare_socket_path(path: str) -> str:
+    path = os.path.abspath(path)
+    directory = os.path.dirname(path)
+    # only the daemon's own runtime directory is made private; any other
+    # directory is left alone and the socket relies on its own mode
+    if settings.SOCKET_DIR \
+            and directory == os.path.abspath(settings.SOCKET_DIR):
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        os.chmod(directory, 0o700)
+    if not os.path.lexists(path):
+        return path
+    probe = socket.socket(socket.AF_UNIX)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.unlink(path)
+    else:
+        raise FileExistsError(
+            'Another daemon is listening on {}'.format(path))
+    finally:
+        probe.close()
+    return path
+
+
+def encode_frame(message: Dict, codec: Codec = JSON) -> bytes:
+    data = codec.encode(message)
+    return _HEADER.pack(len(data)) + data
+
+
+async def write_frame(writer, frame: bytes):
+    writer.write(frame)
     await writer.drain()
+
+
+async def write(writer, message: Dict, codec: Codec = JSON):
+    await write_frame(writer, encode_frame(message, codec))
@@ -12,7 +12,7 @@ setup(
     entry_points={
         'console_scripts': [
             'mpvmd = mpvmd.server.__main__:main',
-            'mpvmc = mpvmd.client.__main__:main'
+            'mpvmc = mpvmd.client.fast:main'
         ]
     },
 
@@ -21,6 +21,18 @@ setup(
         'parsimonious',
     ],
 
+    tests_require=[
+        'pytest',
+        'hypothesis',
+    ],
+
+    extras_require={
+        'test': [
+            'pytest',
+            'hypothesis',
+        ],
+    },
+
     classifiers=[
         'Environment :: Console',
         'Development Status :: 4 - Beta',